@@ -0,0 +1,71 @@
+"""aio_engine.py — Boucle asyncio unique pour les E/S réseau de tout le processus.
+
+Streamlit fait tourner chaque session dans son propre thread de script : une
+boucle `asyncio.run()` par appel serait recréée à chaque rerun et ne
+partagerait rien. Ici, UNE boucle tourne dans un thread daemon et toutes les
+sessions y soumettent leurs coroutines (`submit` / `run`) :
+
+  - des centaines de tâches légères peuvent être en vol (une par observation
+    importée, une par paquet de dédoublonnage…) sans un thread chacune ;
+  - le débit reste réglé par le limiteur partagé (`ratelimit`), attendu de
+    façon asynchrone (`TokenBucketScheduler.acquire_async`).
+
+Pas de client HTTP asynchrone dans les dépendances : l'appel bloquant
+lui-même (`requests.Session` poolée de `notion_http`, `pyinaturalist`) passe
+par `to_thread()`, un pool borné à la taille du pool de connexions. Les
+threads ne servent qu'au temps passé sur le socket, jamais à attendre un
+jeton ou une tâche sœur.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Appels bloquants simultanés (= pool_maxsize du client Notion).
+DEFAULT_IO_THREADS = 16
+
+
+class IOEngine:
+    """Boucle asyncio dans un thread daemon + pool borné pour les appels bloquants."""
+
+    def __init__(self, io_threads: int = DEFAULT_IO_THREADS):
+        self.io_pool = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix="io-engine")
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="io-engine-loop", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro) -> Future:
+        """Planifie `coro` sur la boucle partagée ; retourne un `Future` thread-safe."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """Exécute `coro` sur la boucle partagée et attend son résultat (depuis un autre thread)."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("IOEngine.run() appelé depuis la boucle : utiliser `await`.")
+        return self.submit(coro).result(timeout)
+
+    async def to_thread(self, fn, *args, **kwargs):
+        """Appel bloquant `fn(*args, **kwargs)` dans le pool d'E/S, attendu sans bloquer la boucle."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.io_pool, functools.partial(fn, *args, **kwargs)
+        )
+
+
+_ENGINE: IOEngine | None = None
+_ENGINE_LOCK = threading.Lock()
+
+
+def get_engine() -> IOEngine:
+    """Moteur partagé par toutes les sessions Streamlit (créé au premier appel)."""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            _ENGINE = IOEngine()
+        return _ENGINE
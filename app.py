@@ -2,21 +2,27 @@ import streamlit as st
 import pandas as pd
 import requests
 from pyinaturalist import get_observations, get_places_autocomplete, get_taxa_autocomplete
-from notion_client import Client
-from notion_client.errors import APIResponseError
 from datetime import date, timedelta
 from labels import generate_label_pdf
 from database import get_user_by_email, create_user_profile, update_user_profile, get_taken_fongarium_prefixes
 from inat_validation import validate_inat_username, resolve_inat_identity, looks_like_invalid_inat_username, resolve_search_user_id
 from fongarium import suggest_fongarium_prefix, compute_next_fongarium
 
+import asyncio
+import functools
 import re
 import time
-import random
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import quote
 import csv_cleaner
 import enricher
+import import_jobs
+import importer
+import inat_search
+import obs_index
+from obs_store import OBS_COLUMN, ObservationStore
+from aio_engine import get_engine
+from notion_http import get_async_client as get_async_notion_client, get_client as get_notion_client
+from ratelimit import PRIORITY_INTERACTIVE
 
 
 # --- SECRETS MANAGEMENT ---
@@ -118,16 +124,11 @@ def fetch_notion_schema(token, db_id):
     """
     if not token or not db_id:
         return {}
-    
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    
-    api_url_db = f"https://api.notion.com/v1/databases/{db_id}"
+
     try:
-        resp = requests.get(api_url_db, headers=headers, timeout=10)
+        resp = get_notion_client(token).request(
+            "GET", f"databases/{db_id}", timeout=10, raise_for_status=False,
+        )
         if resp.status_code == 200:
             return resp.json().get("properties", {})
         else:
@@ -141,18 +142,12 @@ def fetch_notion_schema(token, db_id):
 def _cached_check_notion_duplicates(ids_tuple, token, db_id, url_property_name):
     """
     Vérifie quels IDs iNaturalist parmi la liste fournie existent déjà dans Notion, en utilisant l'URL.
-    Fait des requêtes par paquets de 100 en parallèle pour optimiser la performance.
+    Fait des requêtes par paquets de 100, en coroutines concurrentes (aio_engine).
     """
 
-    existing_ids = set()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    api_url = f"https://api.notion.com/v1/databases/{db_id}/query"
-    
-    def query_chunk(chunk):
+    client = get_async_notion_client(token)
+
+    async def query_chunk(chunk):
         chunk_existing = set()
         payload = {
             "filter": {
@@ -166,60 +161,46 @@ def _cached_check_notion_duplicates(ids_tuple, token, db_id, url_property_name):
                 ]
             }
         }
-        
-        try:
-            with requests.Session() as session:
-                session.headers.update(headers)
-                has_more = True
-                while has_more:
-                    last_resp = None
-                    for attempt in range(5):
-                        try:
-                            resp = session.post(api_url, json=payload, timeout=60)
-                            last_resp = resp
-                            if resp.status_code == 200:
-                                break
-                            if resp.status_code == 429 or 500 <= resp.status_code < 600:
-                                retry_after = resp.headers.get("Retry-After")
-                                wait = float(retry_after) if retry_after else (2 ** attempt + random.random())
-                                time.sleep(wait)
-                                continue
-                            break
-                        except requests.RequestException:
-                            if attempt < 4:
-                                time.sleep(2 ** attempt + random.random())
-                                continue
-                            break
 
-                    if last_resp and last_resp.status_code == 200:
-                        data = last_resp.json()
-                        for r in data.get("results", []):
-                            url_val = r.get("properties", {}).get(url_property_name, {}).get("url")
-                            if url_val:
-                                match = re.search(r'/(\d+)', url_val)
-                                if match:
-                                    chunk_existing.add(match.group(1))
-                        
-                        has_more = data.get("has_more", False)
-                        if has_more:
-                            payload["start_cursor"] = data.get("next_cursor")
-                    else:
-                        if last_resp is not None:
-                            last_resp.raise_for_status()
-                        raise RuntimeError("Échec de la requête Notion après plusieurs tentatives.")
-        except Exception as e:
-            raise e
+        # Retries 429/5xx/réseau gérés par le client poolé ; une erreur
+        # persistante remonte (requests.RequestException) vers l'appelant.
+        async for batch in client.iter_query(db_id, payload):
+            for r in batch:
+                url_val = r.get("properties", {}).get(url_property_name, {}).get("url")
+                if url_val:
+                    match = re.search(r'/(\d+)', url_val)
+                    if match:
+                        chunk_existing.add(match.group(1))
         return chunk_existing
 
-    # Notion limits 'or' filters to 100 conditions.
+    async def query_all(chunks):
+        return await asyncio.gather(*(query_chunk(c) for c in chunks))
+
+    # Notion limits 'or' filters to 100 conditions. Tous les paquets partent
+    # ensemble sur la boucle partagée ; le limiteur règle le débit.
     chunks = [ids_tuple[i:i+100] for i in range(0, len(ids_tuple), 100)]
-    
-    with ThreadPoolExecutor(max_workers=min(len(chunks), 8)) as executor:
-        futures = [executor.submit(query_chunk, c) for c in chunks]
-        for fut in as_completed(futures):
-            existing_ids.update(fut.result())
-            
-    return existing_ids
+    return set().union(*get_engine().run(query_all(chunks)))
+
+
+# Snapshot disque des référentiels : survit aux redémarrages du conteneur.
+MAPS_SNAPSHOT_PATH = enricher.DEFAULT_SNAPSHOT_PATH
+# En deçà de cet âge, un snapshot chargé n'est pas rafraîchi en arrière-plan.
+MAPS_SNAPSHOT_FRESH_SECONDS = 600
+# Plafond de la concurrence adaptative de l'import (cf. ratelimit.AdaptiveConcurrency) :
+# coroutines sur la boucle partagée, pas des threads.
+IMPORT_MAX_IN_FLIGHT = 32
+# Aperçu provisoire pendant une recherche : seules les dernières lignes reçues
+# sont affichées (coût de rendu constant par lot, quelle que soit la taille).
+STREAM_PREVIEW_ROWS = 200
+
+
+def _clear_maps_cache_if_refreshed(maps):
+    """Fin du rafraîchissement en arrière-plan : vide le cache seulement si le
+    snapshot a été réécrit. En cas d'erreur, le vider ferait relire le même
+    snapshot (toujours périmé) et relancerait aussitôt un rafraîchissement —
+    en boucle tant qu'une BD échoue."""
+    if not maps.get("_errors"):
+        cached_build_lookup_maps.clear()
 
 
 @st.cache_data(ttl=3600, show_spinner="Chargement des référentiels taxonomiques...")
@@ -228,13 +209,79 @@ def cached_build_lookup_maps(token):
 
     Les IDs des BDs Notion sont passés depuis la config (st.secrets) plutôt
     que hardcodés — voir NOTION_DB_IDS plus haut.
+
+    Démarrage à chaud : si un snapshot disque valide existe, il est renvoyé
+    immédiatement et un rafraîchissement incrémental depuis Notion part en
+    arrière-plan (s'il aboutit, il réécrit le snapshot puis vide ce cache). Sinon,
+    chargement complet.
     """
-    return enricher.build_lookup_maps(token, db_ids=NOTION_DB_IDS)
+    snapshot = enricher.load_maps_snapshot(MAPS_SNAPSHOT_PATH, NOTION_DB_IDS)
+    if snapshot is not None:
+        age = time.time() - snapshot.get("_snapshot_saved_at", 0.0)
+        print(f"[Notion] Référentiels chargés depuis le snapshot disque (âge {age:.0f}s)")
+        if age > MAPS_SNAPSHOT_FRESH_SECONDS:
+            enricher.refresh_maps_snapshot_async(
+                token, NOTION_DB_IDS, MAPS_SNAPSHOT_PATH,
+                on_done=_clear_maps_cache_if_refreshed,
+                base_maps=snapshot,
+            )
+        return snapshot
+    return enricher.build_lookup_maps(token, db_ids=NOTION_DB_IDS, snapshot_path=MAPS_SNAPSHOT_PATH)
+
+
+def rebuild_lookup_maps(token, full_sweep=False):
+    """Rechargement forcé (bouton « Rafraîchir ») : synchrone, snapshot réécrit.
+
+    Incrémental (pages modifiées depuis le dernier sync → quelques requêtes)
+    à partir des maps de la session ou du snapshot disque ; chargement
+    complet s'il n'y a ni l'un ni l'autre. Les boutons passent
+    `full_sweep=True` : toutes les BDs sont balayées (pages archivées /
+    supprimées retirées, Mycoliste et Végétation comprises).
+    """
+    base = st.session_state.get("enricher_maps") or enricher.load_maps_snapshot(MAPS_SNAPSHOT_PATH, NOTION_DB_IDS)
+    maps = enricher.refresh_lookup_maps(
+        token, base, db_ids=NOTION_DB_IDS, full_sweep=full_sweep, snapshot_path=MAPS_SNAPSHOT_PATH,
+    )
+    cached_build_lookup_maps.clear()
+    return maps
+
+
+def refresh_obs_index(token, db_id, props_schema, url_property_name, wait_delta=False):
+    """Lance la synchro due de l'index local des observations ; retourne l'index.
+
+    Synchro complète (1ʳᵉ fois, puis quotidienne) : toujours en arrière-plan.
+    Delta : synchrone si `wait_delta` (quelques requêtes — la vérification des
+    doublons veut un index à jour), sinon en arrière-plan.
+    """
+    index = obs_index.get_index(db_id)
+    myco_key = next((k for k, v in props_schema.items()
+                     if "mycologue" in k.lower() and v.get("type") == "select"), "Mycologue")
+    sync_kwargs = dict(
+        url_property_id=props_schema.get(url_property_name, {}).get("id"),
+        mycologue_property=myco_key,
+        mycologue_property_id=props_schema.get(myco_key, {}).get("id"),
+    )
+    due = index.sync_due()
+    if due == "full" or not index.ready:
+        index.sync_async(token, db_id, url_property_name, full=True, **sync_kwargs)
+    elif due == "delta":
+        if not wait_delta:
+            index.sync_async(token, db_id, url_property_name, **sync_kwargs)
+        else:
+            try:
+                index.sync(token, db_id, url_property_name, **sync_kwargs)
+            except requests.RequestException as e:
+                # Index un peu en retard : les imports de cette app y sont déjà.
+                print(f"[ObsIndex] Synchro delta impossible, index local utilisé tel quel : {e}")
+    return index
 
 
 def get_existing_notion_ids(ids, token, db_id, props_schema=None):
     """
     Vérifie quels IDs iNaturalist parmi la liste fournie existent déjà dans Notion, en utilisant l'URL.
+
+    Passe par l'index local `obs_index` dès qu'il est synchronisé ; sinon
+    interroge Notion directement (`_cached_check_notion_duplicates`).
     """
     if not ids or not token or not db_id:
         return set()
@@ -250,6 +297,13 @@ def get_existing_notion_ids(ids, token, db_id, props_schema=None):
         # Si aucune propriété URL valide n'est trouvée, on lève une exception pour stopper l'import
         raise RuntimeError("Impossible de vérifier les doublons : la colonne 'URL iNaturalist' est introuvable ou n'est pas de type URL dans Notion.")
     
+    # Index local (obs_index) : une intersection d'ensembles au lieu de
+    # centaines de requêtes. Tant que la 1ʳᵉ synchro complète n'est pas faite
+    # (en arrière-plan), on retombe sur la vérification distante.
+    index = refresh_obs_index(token, db_id, props_schema, url_property_name, wait_delta=True)
+    if index.ready:
+        return index.existing(ids)
+
     # Convert to tuple for caching
     all_existing_ids = _cached_check_notion_duplicates(tuple(ids), token, db_id, url_property_name)
         
@@ -306,26 +360,11 @@ def fetch_portail_pages(token):
     if not token or not PORTAIL_MYCOLOGUE_DB_ID:
         return []
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json",
-    }
-    url = f"https://api.notion.com/v1/databases/{PORTAIL_MYCOLOGUE_DB_ID}/query"
     results = []
-    cursor = None
 
     try:
-        while True:
-            body = {"page_size": 100}
-            if cursor:
-                body["start_cursor"] = cursor
-            resp = requests.post(url, headers=headers, json=body, timeout=60)
-            if resp.status_code != 200:
-                print(f"[Portail] HTTP {resp.status_code}: {resp.text[:200]}")
-                break
-            data = resp.json()
-            for p in data.get("results", []):
+        for batch in get_notion_client(token).iter_query(PORTAIL_MYCOLOGUE_DB_ID):
+            for p in batch:
                 props = p.get("properties", {})
                 # Nom complet (title)
                 nom = ""
@@ -365,9 +404,9 @@ def fetch_portail_pages(token):
                     "alias": alias,
                     "label": label,
                 })
-            if not data.get("has_more"):
-                break
-            cursor = data.get("next_cursor")
+    except requests.exceptions.HTTPError as e:
+        # On garde les pages déjà lues (comportement historique : arrêt sur HTTP != 200).
+        print(f"[Portail] {e}")
     except Exception as e:
         print(f"[Portail] Erreur fetch_portail_pages: {e}")
         return []
@@ -400,15 +439,10 @@ def create_portail_page(token, nom_complet, inat_login="", inat_user_id="", emai
     if email:
         props["Email"] = {"email": email}
     try:
-        resp = requests.post(
-            "https://api.notion.com/v1/pages",
-            headers={
-                "Authorization": f"Bearer {token}",
-                "Notion-Version": "2022-06-28",
-                "Content-Type": "application/json",
-            },
+        resp = get_notion_client(token).request(
+            "POST", "pages",
             json={"parent": {"database_id": PORTAIL_MYCOLOGUE_DB_ID}, "properties": props},
-            timeout=30,
+            timeout=30, raise_for_status=False,
         )
         if resp.status_code in (200, 201):
             return resp.json().get("id"), None
@@ -432,64 +466,117 @@ def find_portail_page_by_inat(token, inat_login):
     return None
 
 
-# Suffixes taxonomiques fongiques au-dessus du genre — détection auto de
-# l'État d'identification à l'import.
-_HIGHER_RANK_SUFFIXES = (
-    "aceae",      # famille (ex: Boletaceae)
-    "ales",       # ordre (ex: Boletales)
-    "mycetes",    # classe (ex: Agaricomycetes)
-    "mycetidae",  # sous-classe (ex: Agaricomycetidae)
-    "mycotina",   # sous-phylum (ex: Pucciniomycotina)
-    "mycota",     # phylum (ex: Basidiomycota)
-)
-
-
-def auto_etat_identification(taxon_name: str) -> str:
-    """
-    Détecte automatiquement l'`État d'identification` à partir du nom scientifique.
-
-    Règles :
-      - Suffixe famille/ordre/classe/phylum (-aceae, -ales, -mycetes, etc.)
-          → "Groupe identifié"
-      - Genre seul (1 mot sans suffixe supérieur) ou "Genre sp." / "Genre spp."
-          → "Genre identifié"
-      - Genre + épithète spécifique (même avec cf. / aff.)
-          → "Identifié"
-      - Vide / inconnu
-          → "Non identifié"
-
-    Exemples :
-      "Cronartium ribicola"   → "Identifié"
-      "Russula cf. emetica"   → "Identifié"
-      "Boletus sp."           → "Genre identifié"
-      "Russula"               → "Genre identifié"
-      "Boletaceae"            → "Groupe identifié"
-      "Agaricomycetes"        → "Groupe identifié"
-      ""                      → "Non identifié"
-    """
-    if not taxon_name or not taxon_name.strip():
-        return "Non identifié"
-
-    parts = [p for p in taxon_name.strip().split() if p]
-    if not parts:
-        return "Non identifié"
+# --- FILE D'IMPORT (import_jobs) ---
+# Libellés du suivi par observation.
+_IMPORT_STATUS_LABELS = {
+    import_jobs.STATUS_PENDING: "⏳ En attente",
+    import_jobs.STATUS_RUNNING: "🔄 Création…",
+    import_jobs.STATUS_CREATED: "🔳 QR code à faire",
+    import_jobs.STATUS_FINISHING: "🔳 QR code…",
+    import_jobs.STATUS_DONE: "✅ Importée",
+    import_jobs.STATUS_SKIPPED: "⏭️ Déjà présente",
+    import_jobs.STATUS_ERROR: "❌ Erreur",
+}
+# Au-delà, le dernier job terminé n'est plus affiché après un rechargement.
+IMPORT_JOB_DISPLAY_SECONDS = 24 * 3600
+
+
+def _import_job_owner():
+    """Propriétaire des jobs d'import : l'utilisateur connecté (stable d'une session à l'autre)."""
+    user_info = st.session_state.get("user_info") or {}
+    return str(user_info.get("id") or st.session_state.get("username") or "")
+
+
+def ensure_import_worker(queue, enricher_maps=None):
+    """Démarre le thread de la file d'import s'il reste du travail (ou le relance
+    après un redémarrage du conteneur). Sans effet s'il tourne déjà."""
+    if queue.active or not NOTION_TOKEN or not queue.has_work():
+        return
+    if enricher_maps is None:
+        enricher_maps = cached_build_lookup_maps(NOTION_TOKEN)
+    client = get_async_notion_client(NOTION_TOKEN)
+    queue.start(
+        functools.partial(importer.process_job_item, notion_instance=client, enricher_maps=enricher_maps),
+        functools.partial(importer.apply_followup, client),
+        limiter=client.limiter, key=client.token, max_in_flight=IMPORT_MAX_IN_FLIGHT,
+    )
 
-    first = parts[0]
-    # 1. Rang supérieur au genre (suffixe standardisé)
-    if any(first.lower().endswith(suf) for suf in _HIGHER_RANK_SUFFIXES):
-        return "Groupe identifié"
 
-    # 2. Genre seul
-    if len(parts) == 1:
-        return "Genre identifié"
+def _render_import_job_status(queue, job_id, auto_refresh):
+    items = queue.job_items(job_id)
+    if not items:
+        return
+    total = len(items)
+    by_status = {}
+    for item in items:
+        by_status.setdefault(item["status"], []).append(item)
+    n_final = sum(len(by_status.get(k, [])) for k in import_jobs.FINAL_STATUSES)
+
+    st.subheader("📦 Suivi de l'import")
+    st.progress(n_final / total)
+    if n_final < total:
+        progress_msg = f"Traitement en cours... ({n_final}/{total})"
+        if queue.active and queue.concurrency is not None:
+            progress_msg += f" — {queue.concurrency.limit} en parallèle ({queue.concurrency.reason})"
+        elif not queue.active:
+            progress_msg += " — en pause, reprise au prochain rafraîchissement"
+        st.caption(progress_msg)
+    elif auto_refresh:
+        # Job terminé : un dernier rendu complet, sans rafraîchissement automatique.
+        st.rerun()
+    else:
+        errors = by_status.get(import_jobs.STATUS_ERROR, [])
+        done = by_status.get(import_jobs.STATUS_DONE, [])
+        skipped = by_status.get(import_jobs.STATUS_SKIPPED, [])
+        if errors:
+            st.error(f"⚠️ Terminé avec {len(errors)} erreurs.")
+            with st.expander("Voir les erreurs"):
+                for item in errors:
+                    st.write(f"- {item['message']}")
+        if skipped:
+            st.info(f"⏭️ {len(skipped)} observation(s) déjà présente(s) sur Notion, ignorée(s).")
+        if done:
+            st.success(f"✅ {len(done)} observations importées avec succès !")
+            with st.expander("📋 Voir la liste des imports réussis", expanded=True):
+                # Display as a clean Markdown list with links
+                for item in done:
+                    url_md = f"[Ouvrir]({item['url']})" if item['url'] else "N/A"
+                    warn_md = f" — {item['message']}" if item['message'] else ""
+                    st.markdown(f"- **{item['payload']['row'].get('Taxon')}** (ID: {item['inat_id']}) — {url_md}{warn_md}")
+            if not errors and st.session_state.get("_import_job_celebrated") != job_id:
+                st.session_state._import_job_celebrated = job_id
+                st.balloons()
+
+    with st.expander("Détail par observation", expanded=n_final < total):
+        st.dataframe(
+            pd.DataFrame([{
+                "Taxon": item["payload"]["row"].get("Taxon"),
+                "ID": item["inat_id"],
+                "Statut": _IMPORT_STATUS_LABELS.get(item["status"], item["status"]),
+                "Message": item["message"] or "",
+                "Notion": item["url"],
+            } for item in items]),
+            column_config={"Notion": st.column_config.LinkColumn("Notion", display_text="Ouvrir")},
+            hide_index=True,
+            use_container_width=True,
+        )
 
-    # 3. "Genus sp." / "Genus spp." → genre seul aussi
-    second = parts[1].lower().rstrip(".")
-    if second in ("sp", "spp"):
-        return "Genre identifié"
 
-    # 4. Sinon : Genus + epithète (cf./aff. tolérés, l'épithète est présente)
-    return "Identifié"
+def _render_import_job_panel():
+    """Suivi du job d'import de l'utilisateur, lu dans la file persistante :
+    survit aux rechargements. Se rafraîchit toutes les 2 s tant que le job tourne."""
+    if not DATABASE_ID:
+        return
+    queue = import_jobs.get_queue(DATABASE_ID)
+    ensure_import_worker(queue)
+    job_id = st.session_state.get("import_job_id")
+    if not job_id:
+        job_id = queue.latest_job(_import_job_owner(), since=time.time() - IMPORT_JOB_DISPLAY_SECONDS)
+        if not job_id:
+            return
+        st.session_state.import_job_id = job_id
+    auto_refresh = queue.active
+    st.fragment(run_every=2 if auto_refresh else None)(_render_import_job_status)(queue, job_id, auto_refresh)
 
 
 # --- 3. FONCTION DE LOGIN / PORTAIL ---
@@ -934,13 +1021,8 @@ def sync_editor_changes():
         if not edited_rows:
             return
 
-        for row_idx_str, changes in edited_rows.items():
-            row_pos = int(row_idx_str)
-            if 0 <= row_pos < len(view_indices):
-                real_index = view_indices[row_pos]
-                # Update Master DF
-                for col, value in changes.items():
-                    st.session_state.main_import_df.at[real_index, col] = value
+        # Update Master store (positions de la vue → IDs iNat)
+        st.session_state.obs_store.apply_edits(view_indices, edited_rows)
                     
     except Exception as e:
         print(f"Sync Error: {e}")
@@ -974,9 +1056,10 @@ def show_details(obs_data):
         st.write(obs_data['Description'])
 
 @st.cache_data(ttl=300, show_spinner=False)
-def count_user_notion_obs(token, db_id, target_user):
+def _count_user_notion_obs_remote(token, db_id, target_user):
     """
-    Compte les observations Notion filtrées par utilisateur.
+    Compte les observations Notion filtrées par utilisateur, en paginant Notion
+    (repli de `count_user_notion_obs` tant que l'index local n'est pas prêt).
     
     Args:
         token (str): Token d'intégration Notion.
@@ -987,14 +1070,7 @@ def count_user_notion_obs(token, db_id, target_user):
         int: Nombre total d'observations trouvées.
     """
     if not token or not db_id or not target_user: return 0
-    
-    url = f"https://api.notion.com/v1/databases/{db_id}/query?filter_properties=title"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    
+
     # Payload: Filter by Mycologue
     # Optimisation: On ne récupère que l'ID pour aller plus vite (filter_properties)
     # Note: filter_properties réduit la payload reponse, mais on doit quand même paginer.
@@ -1004,42 +1080,47 @@ def count_user_notion_obs(token, db_id, target_user):
             "select": {
                 "equals": target_user
             }
-        },
-        "page_size": 100
+        }
     }
-    
-    total_count = 0
-    has_more = True
-    next_cursor = None
-    
-    try:
-        with requests.Session() as session:
-            session.headers.update(headers)
-            while has_more:
-                if next_cursor:
-                    payload["start_cursor"] = next_cursor
-                
-                resp = session.post(url, json=payload, timeout=60)
-                if resp.status_code != 200:
-                    print(f"Error Counting: {resp.status_code} {resp.text}")
-                    break
 
-                data = resp.json()
-                results = data.get("results", [])
-                total_count += len(results)
+    total_count = 0
 
-                has_more = data.get("has_more", False)
-                next_cursor = data.get("next_cursor")
-            
+    try:
+        # Lecture du tableau de bord → priorité interactive.
+        for batch in get_notion_client(token).iter_query(
+            db_id, payload, filter_properties=["title"], priority=PRIORITY_INTERACTIVE,
+        ):
+            total_count += len(batch)
+    except requests.exceptions.HTTPError as e:
+        print(f"Error Counting: {e}")
     except requests.RequestException as e:
         print(f"Network/HTTP error counting Notion observations: {e}")
         return 0
     except Exception as e:
         print(f"Count Error: {e}")
         return 0
-        
+
     return total_count
 
+def count_user_notion_obs(token, db_id, target_user):
+    """
+    Compte les observations Notion d'un mycologue — métrique du tableau de bord.
+
+    Lit le compteur de l'index local `obs_index` (un `COUNT(*)` SQLite, tenu à
+    jour par les imports et par une synchro delta en arrière-plan) ; pagination
+    Notion exacte seulement tant que l'index n'a pas fini sa 1ʳᵉ synchro.
+    """
+    if not token or not db_id or not target_user: return 0
+
+    props_schema = fetch_notion_schema(token, db_id)
+    url_property_name = next((k for k, v in props_schema.items()
+                              if v.get("type") == "url" and "inaturalist" in k.lower()), None)
+    if url_property_name:
+        index = refresh_obs_index(token, db_id, props_schema, url_property_name)
+        if index.ready:
+            return index.count_by_mycologue(target_user)
+    return _count_user_notion_obs_remote(token, db_id, target_user)
+
 @st.cache_data(ttl=600, show_spinner=False)
 def get_last_fongarium_number_v2(token, db_id, target_user, prefix, floor=0):
     """
@@ -1059,13 +1140,6 @@ def get_last_fongarium_number_v2(token, db_id, target_user, prefix, floor=0):
     """
     if not token or not db_id or not target_user or not prefix: return None, None
 
-    url = f"https://api.notion.com/v1/databases/{db_id}/query"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-
     # Payload
     payload = {
         "filter": {
@@ -1099,7 +1173,10 @@ def get_last_fongarium_number_v2(token, db_id, target_user, prefix, floor=0):
 
     try:
         # Sort queries in Notion can be slow on large databases, increasing timeout to 60s
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
+        resp = get_notion_client(token).request(
+            "POST", f"databases/{db_id}/query", json=payload,
+            priority=PRIORITY_INTERACTIVE, timeout=60, raise_for_status=False,
+        )
         if resp.status_code != 200:
             print(f"Sort Error: {resp.text}")
             raise RuntimeError(f"Notion fetch failed: {resp.status_code} {resp.text}")
@@ -1147,55 +1224,22 @@ def fetch_notion_data(token, db_id, notion_filter_and, max_fetch=50):
         list: Liste des résultats de la requête Notion.
     """
     if not token or not db_id: return []
-    
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    
-    api_url_query = f"https://api.notion.com/v1/databases/{db_id}/query"
-    
-    # Use a session for connection pooling
-    with requests.Session() as session:
-        session.headers.update(headers)
-        
-        all_results = []
-        has_more = True
-        next_cursor = None
-
-        # NOTE: Notion pagination is sequential (cursor-based).
-        # We fetch pages one by one to respect the API design.
-        while has_more and len(all_results) < max_fetch:
-            page_size = min(100, max_fetch - len(all_results))
-            query_payload = {
-                "page_size": page_size,
-                "sorts": [{"timestamp": "created_time", "direction": "descending"}]
-            }
-            
-            if notion_filter_and:
-                query_payload["filter"] = {"and": notion_filter_and}
-                
-            if next_cursor:
-                query_payload["start_cursor"] = next_cursor
-            
-            try:
-                resp_query = session.post(api_url_query, json=query_payload, timeout=60)
-                resp_query.raise_for_status()
-                
-                data = resp_query.json()
-                batch = data.get("results", [])
-                all_results.extend(batch)
-                
-                has_more = data.get("has_more", False)
-                next_cursor = data.get("next_cursor")
-                
-                if len(all_results) >= max_fetch:
-                    break
-            except Exception as e:
-                print(f"Fetch Error: {e}")
-                break
-                
+
+    query_payload = {"sorts": [{"timestamp": "created_time", "direction": "descending"}]}
+    if notion_filter_and:
+        query_payload["filter"] = {"and": notion_filter_and}
+
+    all_results = []
+    # NOTE: Notion pagination is sequential (cursor-based) — iter_query enchaîne
+    # les curseurs sur la connexion poolée et s'arrête à max_fetch.
+    try:
+        for batch in get_notion_client(token).iter_query(
+            db_id, query_payload, limit=max_fetch, priority=PRIORITY_INTERACTIVE,
+        ):
+            all_results.extend(batch)
+    except Exception as e:
+        print(f"Fetch Error: {e}")
+
     return all_results[:max_fetch]
 
 def constants_extract_text(prop_obj):
@@ -1223,8 +1267,8 @@ def constants_extract_text(prop_obj):
 
 
 # --- STATE MANAGEMENT ---
-if 'search_results' not in st.session_state:
-    st.session_state.search_results = []
+if 'obs_store' not in st.session_state:
+    st.session_state.obs_store = ObservationStore()
 if 'show_selection' not in st.session_state:
     st.session_state.show_selection = False
 if 'select_all' not in st.session_state:
@@ -1250,8 +1294,8 @@ supabase_client = None # Placeholder si le reste du code l'utilise encore, mais
 from database import supabase as supabase_client # Alias pour compatibilité rétroactive locale
 
 # --- NOTION CLIENT ---
-if NOTION_TOKEN:
-    notion = Client(auth=NOTION_TOKEN, notion_version="2022-06-28")
+# Client HTTP poolé partagé par tout le processus (cf. notion_http.py).
+notion = get_notion_client(NOTION_TOKEN) if NOTION_TOKEN else None
 
 # --- NAVIGATION SIDEBAR ---
 with st.sidebar:
@@ -1510,11 +1554,11 @@ elif nav_mode == "ℹ️ Aide & Codes":
         _c1, _c2 = st.columns([3, 1])
         with _c2:
             if st.button("🔄 Rafraîchir la liste"):
-                cached_build_lookup_maps.clear()
-                st.session_state.enricher_maps = cached_build_lookup_maps(NOTION_TOKEN)
+                with st.spinner("Rechargement des codes depuis Notion…"):
+                    st.session_state.enricher_maps = rebuild_lookup_maps(NOTION_TOKEN, full_sweep=True)
                 st.rerun()
         if not st.session_state.get("enricher_maps"):
-            with st.spinner("Chargement des codes depuis Notion… (1-2 min la 1ʳᵉ fois, instantané ensuite)"):
+            with st.spinner("Chargement des codes depuis Notion… (1-2 min au tout premier lancement, instantané ensuite)"):
                 st.session_state.enricher_maps = cached_build_lookup_maps(NOTION_TOKEN)
         _maps = st.session_state.enricher_maps or {}
 
@@ -1656,22 +1700,18 @@ elif nav_mode == "📊 Tableau de Bord":
     with tab3:        
         # Check if we have selected observations
         # We need "visible_obs" accessible here, but currently it's computed later in the script (lines 550+).
-        # OR we rely on st.session_state.selection_states AND st.session_state.search_results.
+        # OR we rely on st.session_state.selection_states AND st.session_state.obs_store.
         
         selected_ids = [oid for oid, is_sel in st.session_state.selection_states.items() if is_sel]
         
-        if not st.session_state.search_results:
+        if st.session_state.obs_store.empty:
              st.info("💡 Faites d'abord une recherche pour sélectionner des observations.")
         elif not selected_ids:
              st.warning("⚠️ Aucune observation sélectionnée. Cochez des cases dans l'onglet Résultats.")
         else:
-             # Match IDs to actual Obs objects
-             # Optimization: Create a dict map
-             obs_map = {o['id']: o for o in st.session_state.search_results}
-             
-             # Filter only those present in search results (safety)
-             valid_ids = [oid for oid in selected_ids if oid in obs_map]
-             selected_obs_objects = [obs_map[oid] for oid in valid_ids]
+             # Match IDs to actual Obs objects (lookup par index du magasin ;
+             # seuls les IDs présents dans la recherche sont gardés)
+             selected_obs_objects = st.session_state.obs_store.observations(selected_ids)
              
              count = len(selected_obs_objects)
              st.success(f"✅ {count} observation(s) prête(s) pour l'impression.")
@@ -1715,24 +1755,15 @@ elif nav_mode == "📊 Tableau de Bord":
                 st.rerun()
     
             if st.checkbox("🐞 Debug Notion"):
-                 st.write(f"Notion Lib: {notion}")
-                 st.write(f"Methods: {dir(notion.databases)}")
+                 st.write(f"Notion Client: {notion}")
                  try:
-                     dbg_schema = notion.databases.retrieve(DATABASE_ID)
+                     dbg_schema = notion.get_database(DATABASE_ID)
                      st.json(dbg_schema["properties"])
                  except Exception as e:
                      st.error(f"Debug Error: {e}")
     
-            # Fetch from Notion using direct HTTP to avoid library version issues
+            # Fetch from Notion using direct HTTP (client poolé notion_http)
             if NOTION_TOKEN and DATABASE_ID:
-                import requests # Ensure requests is imported
-                
-                headers = {
-                    "Authorization": f"Bearer {NOTION_TOKEN}",
-                    "Notion-Version": "2022-06-28", # Stable version
-                    "Content-Type": "application/json"
-                }
-                
                 try:
                     # 1. Fetch Schema (Cached)
                     props_schema = fetch_notion_schema(NOTION_TOKEN, DATABASE_ID)
@@ -1779,9 +1810,11 @@ elif nav_mode == "📊 Tableau de Bord":
                                     rel_db_id = p_conf["relation"]["database_id"]
                                     # Query the related DB to get Names (Titles)
                                     # Only need Title and ID.
-                                    url_rel = f"https://api.notion.com/v1/databases/{rel_db_id}/query"
                                     # Fetch all (or first 100)
-                                    resp_rel = requests.post(url_rel, headers=headers, json={"page_size": 100}, timeout=15)
+                                    resp_rel = notion.request(
+                                        "POST", f"databases/{rel_db_id}/query", json={"page_size": 100},
+                                        timeout=15, raise_for_status=False,
+                                    )
                                     
                                     if resp_rel.status_code == 200:
                                         results_rel = resp_rel.json().get("results", [])
@@ -2171,8 +2204,7 @@ elif nav_mode == "📊 Tableau de Bord":
                                 if page_id in relation_cache: return relation_cache[page_id]
                                 
                                 try:
-                                    r_url = f"https://api.notion.com/v1/pages/{page_id}"
-                                    r_resp = requests.get(r_url, headers=headers, timeout=15)
+                                    r_resp = notion.request("GET", f"pages/{page_id}", timeout=15, raise_for_status=False)
                                     if r_resp.status_code == 200:
                                         r_props = r_resp.json().get("properties", {})
                                         # Try to find Name/Title
@@ -2498,7 +2530,7 @@ elif nav_mode == "📊 Tableau de Bord":
             limit_option = c_limit.selectbox("Max à récupérer (iNat)", [50, 100, 200, 500, 1000, "Tout (Attention !)"], index=5)
             
             if st.button("🔄 Réinitialiser la recherche", type="secondary"):
-                st.session_state.search_results = []
+                st.session_state.obs_store = ObservationStore()
                 st.session_state.custom_dates = []
                 st.session_state.selected_users = []
                 st.session_state.selection_states = {}
@@ -2590,58 +2622,32 @@ elif nav_mode == "📊 Tableau de Bord":
     if run_search:
         with st.spinner("Recherche sur iNaturalist..."):
             try:
-                collected = []
-                total_available = 0
-                
-                if date_mode == "Multi-dates" and st.session_state.custom_dates:
-                     # Logic for multi-date (complex total)
-                     # We sum up totals? Or just show what we have.
-                     for d in st.session_state.custom_dates:
-                        p = params.copy()
-                        p['on'] = d 
-                        p.pop('d1', None); p.pop('d2', None)
-                        
-                        # Fetch batch
-                        p['page'] = 1
-                        p['per_page'] = min(200, fetch_limit)
-                        resp = get_observations(**p)
-                        total_available += resp.get('total_results', 0)
-                        
-                        # Pagination logic (simplified for multi-date: just grab up to limit per date?)
-                        # User asked for "Absolute result". 
-                        # If I sum total_results of all dates, that is correct.
-                        # Start with first batch
-                        batch = resp['results']
-                        collected.extend(batch)
-                        
-                        # Add more pages if needed? (Skipping for brevity/speed unless requested)
-                        # If fetch_limit > 200, we might need loop.
-                        while len(batch) == 200 and len(collected) < fetch_limit:
-                            p['page'] += 1
-                            batch = get_observations(**p)['results']
-                            collected.extend(batch)
-                            if not batch: break
-                else:
-                     # Standard Search (Single flow)
-                     page = 1
-                     while len(collected) < fetch_limit:
-                         remaining = fetch_limit - len(collected)
-                         p_size = min(200, remaining)
-                         params['page'] = page
-                         params['per_page'] = p_size
-                         
-                         resp = get_observations(**params)
-                         if page == 1:
-                             total_available = resp.get('total_results', 0)
-                             
-                         batch = resp['results']
-                         if not batch: break
-                         
-                         collected.extend(batch)
-                         if len(batch) < p_size: break
-                         page += 1
-                
-                results = collected
+                # Multi-dates : une requête par date, lancées en parallèle sur la
+                # boucle partagée (débit plafonné par `INAT_LIMITER`) ; le total
+                # disponible = somme des `total_results` des pages 1.
+                # Les lots s'affichent dès leur arrivée (aperçu provisoire,
+                # remplacé par le tableau complet une fois la recherche finie).
+                # Requête déjà faite il y a peu : seul le delta `updated_since`
+                # est demandé à iNat (`SEARCH_CACHE`).
+                dates = st.session_state.custom_dates if date_mode == "Multi-dates" else None
+                results, total_available, preview_rows = [], 0, []
+                stream_preview = st.empty()
+                for batch, total_available in inat_search.stream_search(
+                    params, fetch_limit, dates=dates, cache=inat_search.SEARCH_CACHE,
+                ):
+                    results.extend(batch)
+                    if not batch:
+                        continue
+                    preview_rows.extend({
+                        "ID": str(r['id']),
+                        "Taxon": (r.get('taxon') or {}).get('name') or "Inconnu",
+                        "Date": str(r.get('time_observed_at') or r.get('observed_on') or "")[:10] or "Inconnue",
+                        "Lieu": r.get('place_guess') or "Inconnu",
+                    } for r in batch)
+                    with stream_preview.container():
+                        st.caption(f"⏳ {len(results)} / {min(total_available, fetch_limit)} observations reçues…")
+                        st.dataframe(pd.DataFrame(preview_rows[-STREAM_PREVIEW_ROWS:]), hide_index=True, height=250)
+                stream_preview.empty()
                 
                 # Remove potential duplicates based on ID
                 seen_ids = set()
@@ -2657,7 +2663,6 @@ elif nav_mode == "📊 Tableau de Bord":
                     reverse=True
                 )
                 
-                st.session_state.search_results = unique_results
                 # Init selection state: Default All True
                 st.session_state.selection_states = {r['id']: True for r in unique_results}
                 
@@ -2694,74 +2699,11 @@ elif nav_mode == "📊 Tableau de Bord":
                         f"Détails technique : {e}"
                     )
                 
-                u_data = []
-                for r in unique_results:
-                    # Helper for Date extraction
-                    d_val = r.get('time_observed_at')
-                    date_str = str(d_val)[:10] if d_val else (str(r.get('observed_on') or "")[:10] or "Inconnue")
-                    
-                    # Helper for User
-                    user_name = r.get('user', {}).get('login') or "Inconnu"
-                    
-                    # Helper for Link
-                    # We can't put a functional link column easily in basic data_editor without using LinkColumn config.
-                    # We will store the full URL and format it in column_config.
-                    
-                    # Helper for Tags
-                    tags = r.get('tags', []) 
-                    tag_list = []
-                    if tags:
-                        for t in tags:
-                            if isinstance(t, dict): tag_list.append(t.get('tag', ''))
-                            elif isinstance(t, str): tag_list.append(t)
-                            else: tag_list.append(str(t))
-                    tag_str = ", ".join(tag_list)
-                    
-                    # Helper for GPS
-                    loc = r.get('location')
-                    gps_txt = ""
-                    if loc:
-                         try:
-                             # location is often "lat,lon" string or [lat, lon]
-                             if isinstance(loc, str): gps_txt = loc
-                             elif isinstance(loc, list): gps_txt = f"{loc[0]}, {loc[1]}"
-                         except: gps_txt = "Oui"
-                    
-                    # Helper for Description
-                    desc = r.get('description', '') or ""
-                    
-                    obs_url = r.get('uri') or f"https://www.inaturalist.org/observations/{r['id']}"
-                    obs_id_str = str(r['id'])
-                    is_new = obs_id_str not in existing_ids
-
-                    # Si le pre-check a échoué, on ne sait pas — coche par défaut à False
-                    # pour forcer une décision manuelle, et marque "?" au lieu de 🟢/🔴.
-                    if dedup_check_failed:
-                        default_import = False
-                        statut = "⚠️ Non vérifié"
-                    else:
-                        default_import = is_new
-                        statut = "🔴 Oui" if not is_new else "🟢 Non"
-
-                    u_data.append({
-                        "Import?": default_import,
-                        "Déjà importé": statut,
-                        "ID": str(r['id']),
-                        "Taxon": r.get('taxon', {}).get('name') or "Inconnu",
-                        "Date": date_str,
-                        "Lieu": r.get('place_guess') or "Inconnu",
-                        "Mycologue": user_name,
-                        "Tags": tag_str,
-                        "GPS": gps_txt,
-                        "Description": desc,
-                        "Collection": False,
-                        "No° Fongarium": "",
-                        "Identificateur": "",
-                        "Lien": obs_url,
-                        "_is_new": is_new  # Technical column for robust filtering
-                    })
-                
-                st.session_state.main_import_df = pd.DataFrame(u_data)
+                # Magasin de la session : colonnes de l'aperçu + observation iNat,
+                # indexés par ID iNat (cf. obs_store).
+                st.session_state.obs_store = ObservationStore.from_search(
+                    unique_results, existing_ids, dedup_check_failed
+                )
                 st.session_state.editor_key_version = 0 # Reset editor key
                 
                 st.session_state.total_results_count = total_available # NEW: Store total
@@ -2783,8 +2725,7 @@ elif nav_mode == "📊 Tableau de Bord":
                     )
                 else:
                     st.error(f"Erreur iNaturalist : {e}")
-                st.session_state.search_results = []
-                st.session_state.main_import_df = pd.DataFrame() # Empty fallback
+                st.session_state.obs_store = ObservationStore() # Empty fallback
     
     
     
@@ -2793,7 +2734,10 @@ elif nav_mode == "📊 Tableau de Bord":
     # trigger only a fragment rerun — scroll position is preserved between actions.
     @st.fragment
     def _render_table_section():
-        if 'main_import_df' not in st.session_state or st.session_state.main_import_df.empty:
+        store = st.session_state.obs_store
+        if store.empty:
+            # Après un rechargement, le tableau est perdu mais l'import continue.
+            _render_import_job_panel()
             return
         st.divider()
         
@@ -2801,8 +2745,8 @@ elif nav_mode == "📊 Tableau de Bord":
         c_title, c_stats = st.columns([2, 2])
         
         # Calculate unique dates for filter
-        df_main = st.session_state.main_import_df
-        all_dates = sorted(df_main['Date'].unique().tolist(), reverse=True)
+        df_main = store.frame
+        all_dates = store.dates()
         
         # Limit Options
         limit_options = [50, 100, 200, "Tout"]
@@ -2816,24 +2760,32 @@ elif nav_mode == "📊 Tableau de Bord":
         # corriger AVANT d'importer (sinon = relations non liées = « trous »).
         _lint_maps = st.session_state.get("enricher_maps")
         if _lint_maps:
-            # Itération colonne-par-colonne (zip) plutôt qu'iterrows() — plus léger
-            # à chaque rerun ; lint_description_codes tolère les valeurs non-texte.
-            _n = len(df_main)
-            _ids   = df_main["ID"]          if "ID" in df_main.columns          else [""] * _n
-            _taxa  = df_main["Taxon"]       if "Taxon" in df_main.columns       else [""] * _n
-            _descs = df_main["Description"] if "Description" in df_main.columns else [""] * _n
-            _bad_rows = []
-            _total_ok = 0
-            for _id, _taxon, _desc in zip(_ids, _taxa, _descs):
-                _lr = enricher.lint_description_codes(_desc, _lint_maps)
-                _total_ok += len(_lr["recognized"])
-                if _lr["has_issues"]:
-                    _bad_rows.append({
-                        "ID": _id,
-                        "Taxon": _taxon,
-                        "Codes non reconnus": ", ".join(u["token"] for u in _lr["unrecognized"]),
-                        "@ à éviter": ", ".join(_lr["at_warnings"]),
-                    })
+            # Lint de toute la colonne en un appel (notes dédupliquées, filtre
+            # vectorisé) et mémorisé en session : cocher une case relance le
+            # fragment mais ne re-linte pas tant que notes et référentiels
+            # n'ont pas changé.
+            _descs = df_main["Description"] if "Description" in df_main.columns else pd.Series([""] * len(df_main), index=df_main.index)
+            _lint_key = (
+                _lint_maps.get("_version"), len(df_main),
+                int(pd.util.hash_pandas_object(_descs.astype(str), index=False).sum()),
+            )
+            _cached_lint = st.session_state.get("_lint_cache")
+            if _cached_lint and _cached_lint[0] == _lint_key:
+                _lint_df = _cached_lint[1]
+            else:
+                _lint_df = enricher.lint_descriptions(_descs, _lint_maps)
+                st.session_state["_lint_cache"] = (_lint_key, _lint_df)
+            _total_ok = int(_lint_df["n_recognized"].sum())
+            _issues = _lint_df[_lint_df["has_issues"]]
+            _bad_rows = [
+                {
+                    "ID": df_main.at[_idx, "ID"] if "ID" in df_main.columns else "",
+                    "Taxon": df_main.at[_idx, "Taxon"] if "Taxon" in df_main.columns else "",
+                    "Codes non reconnus": _row.unrecognized,
+                    "@ à éviter": _row.at_warnings,
+                }
+                for _idx, _row in zip(_issues.index, _issues.itertuples(index=False))
+            ]
             if _bad_rows:
                 st.warning(
                     f"⚠️ **{len(_bad_rows)} observation(s)** ont des codes non reconnus "
@@ -2872,26 +2824,17 @@ elif nav_mode == "📊 Tableau de Bord":
         # Default to "Tout" (Index 3) to show all fetched results immediately
         selected_limit = col_limit.selectbox("Afficher", options=limit_options, index=3)
         
-        # Apply Filters
-        df_filtered = df_main.copy()
-        if selected_dates:
-            df_filtered = df_filtered[df_filtered['Date'].isin(selected_dates)]
-        
-        if hide_imported:
-            df_filtered = df_filtered[df_filtered['_is_new']]
-        
-        # Slice for Display (Limit)
-        if selected_limit != "Tout":
-             df_display = df_filtered.head(int(selected_limit))
-        else:
-             df_display = df_filtered
+        # Apply Filters + Slice for Display (Limit) : index des lignes visibles,
+        # sans copie du tableau
+        view_limit = None if selected_limit == "Tout" else int(selected_limit)
+        view_index = store.view_index(selected_dates, hide_imported, view_limit)
     
         # Update Stats Display
         total_available = st.session_state.get('total_results_count', '?')
         
         # Calculate Selection stats on VISIBLE rows
-        selection_count = df_display['Import?'].sum()
-        visible_count = len(df_display)
+        selection_count = df_main.loc[view_index, 'Import?'].sum()
+        visible_count = len(view_index)
         
         # Styled display
         c_stats.markdown(
@@ -2910,15 +2853,13 @@ elif nav_mode == "📊 Tableau de Bord":
         # 2. BULK ACTIONS
         col_bulk_l, col_bulk_r = st.columns([1, 1])
         if col_bulk_l.button("✅ Tout cocher (Visible)", help="Coche 'Importer' pour toutes les lignes affichées"):
-            # Update Master DF based on Visible Indices
-            visible_indices = df_display.index
-            st.session_state.main_import_df.loc[visible_indices, "Import?"] = True
+            # Update Master store based on Visible Indices
+            store.set_column(view_index, "Import?", True)
             st.session_state.editor_key_version = st.session_state.get('editor_key_version', 0) + 1
             st.rerun(scope="fragment")
             
         if col_bulk_r.button("🚫 Tout décocher (Visible)", help="Décoche 'Importer' pour toutes les lignes affichées"):
-            visible_indices = df_display.index
-            st.session_state.main_import_df.loc[visible_indices, "Import?"] = False
+            store.set_column(view_index, "Import?", False)
             st.session_state.editor_key_version = st.session_state.get('editor_key_version', 0) + 1
             st.rerun(scope="fragment")
     
@@ -2932,33 +2873,25 @@ elif nav_mode == "📊 Tableau de Bord":
              print(f"[DEBUG] Magic button — edited_rows: {edited_rows}")
 
              # Apply edits (Collection checkbox mainly) BEFORE logic
-             # CRITICAL: If we filter, 0-based index in editor refers to 0-th row of df_display.
-             # We must map 0 -> df_display.index[0].
+             # CRITICAL: If we filter, 0-based index in editor refers to 0-th visible row.
+             # We must map 0 -> view_index[0].
              
              user_info = st.session_state.get('user_info', {})
              prefix = user_info.get("fongarium_prefix")
              
              # Fallback Sync: Manually apply edits just in case callback missed
              # This handles cases where on_change didn't fire or view indices were stale
-             for row_idx_str, changes in edited_rows.items():
-                  try:
-                      row_pos = int(row_idx_str)
-                      if row_pos < len(df_display):
-                          real_index = df_display.index[row_pos]
-                          for col, val in changes.items():
-                              st.session_state.main_import_df.at[real_index, col] = val
-                  except Exception as e:
-                      pass
+             store.apply_edits(view_index, edited_rows)
     
              # DEBUG: Check count
-             count_coll = st.session_state.main_import_df.loc[df_display.index, "Collection"].sum()
+             count_coll = df_main.loc[view_index, "Collection"].sum()
              # st.write(f"DEBUG: 'Collection' checked count: {count_coll}")
              
              if count_coll == 0:
                  st.warning("Aucune ligne cochée 'Collection'. Veuillez cocher la case Collection.")
     
              # Check how many are collected
-             # count_coll = st.session_state.main_import_df.loc[df_display.index, "Collection"].sum()
+             # count_coll = df_main.loc[view_index, "Collection"].sum()
              # st.write(f"Collection Count in Scope: {count_coll}")
              if not prefix: 
                  st.error("Configurez votre préfixe dans 'Mon Profil' !")
@@ -2987,13 +2920,12 @@ elif nav_mode == "📊 Tableau de Bord":
     
                      processed_count = 0
                      # Iterate on visible indices
-                     target_indices = df_display.index
+                     target_indices = view_index
                      
                      for idx in target_indices:
-                         row = st.session_state.main_import_df.loc[idx]
-                         if row["Collection"] and not row["No° Fongarium"]:
+                         if df_main.at[idx, "Collection"] and not df_main.at[idx, "No° Fongarium"]:
                              code = f"{current_prefix}{current_num:0{num_len}d}"
-                             st.session_state.main_import_df.at[idx, "No° Fongarium"] = code
+                             df_main.at[idx, "No° Fongarium"] = code
                              current_num += 1
                              processed_count += 1
                      
@@ -3018,10 +2950,10 @@ elif nav_mode == "📊 Tableau de Bord":
             if st.button("Appliquer", key="bulk_ident_apply", use_container_width=True):
                 if bulk_ident:
                     sync_editor_changes()
-                    mask = st.session_state.main_import_df["Import?"].eq(True).fillna(False)
+                    mask = store.selected_mask()
                     n_updated = int(mask.sum())
                     if n_updated > 0:
-                        st.session_state.main_import_df.loc[mask, "Identificateur"] = bulk_ident
+                        store.set_column(mask, "Identificateur", bulk_ident)
                         st.session_state.editor_key_version = st.session_state.get("editor_key_version", 0) + 1
                         st.success(f"✅ « {bulk_ident} » appliqué à {n_updated} observation(s).")
                         st.rerun(scope="fragment")
@@ -3036,8 +2968,8 @@ elif nav_mode == "📊 Tableau de Bord":
 
         # --- BOUTON RESTAURER DESCRIPTIONS ---
         # Permet de récupérer la description originale iNat pour les obs où l'utilisateur
-        # a effacé / modifié par erreur. Lit depuis st.session_state.search_results (cache
-        # iNat de la dernière recherche), pas depuis Notion.
+        # a effacé / modifié par erreur. Lit l'observation iNat gardée dans le magasin
+        # de la session (dernière recherche), pas depuis Notion.
         st.markdown("##### 📝 Description")
         col_restore_lbl, col_restore_btn = st.columns([3, 1])
         with col_restore_lbl:
@@ -3050,19 +2982,8 @@ elif nav_mode == "📊 Tableau de Bord":
             st.markdown("&nbsp;", unsafe_allow_html=True)
             if st.button("Restaurer depuis iNat", key="restore_descriptions", use_container_width=True):
                 sync_editor_changes()
-                inat_by_id = {str(o.get("id")): o for o in (st.session_state.get("search_results") or [])}
-                df = st.session_state.main_import_df
-                mask = df["Import?"].eq(True).fillna(False)
-                n_restored = 0
-                for idx in df.index[mask]:
-                    obs_id_str = str(df.at[idx, "ID"])
-                    inat_obs = inat_by_id.get(obs_id_str)
-                    if inat_obs is None:
-                        continue
-                    original_desc = inat_obs.get("description") or ""
-                    if df.at[idx, "Description"] != original_desc:
-                        df.at[idx, "Description"] = original_desc
-                        n_restored += 1
+                mask = store.selected_mask()
+                n_restored = store.restore_descriptions(mask)
                 if n_restored > 0:
                     st.session_state.editor_key_version = st.session_state.get("editor_key_version", 0) + 1
                     st.success(f"✅ Description restaurée pour {n_restored} observation(s) cochée(s).")
@@ -3089,14 +3010,14 @@ elif nav_mode == "📊 Tableau de Bord":
                 token = (bulk_desc_token or "").strip()
                 if token:
                     sync_editor_changes()
-                    mask = st.session_state.main_import_df["Import?"].eq(True).fillna(False)
+                    mask = store.selected_mask()
                     n = int(mask.sum())
                     if n > 0:
                         def _prepend_desc(val, _tok=token):
                             s = val if isinstance(val, str) else ""
                             return (_tok + " " + s).strip() if s else _tok
-                        st.session_state.main_import_df.loc[mask, "Description"] = (
-                            st.session_state.main_import_df.loc[mask, "Description"].apply(_prepend_desc)
+                        store.frame.loc[mask, "Description"] = (
+                            store.frame.loc[mask, "Description"].apply(_prepend_desc)
                         )
                         st.session_state.editor_key_version = st.session_state.get("editor_key_version", 0) + 1
                         st.success(f"✅ « {token} » ajouté en tête de {n} observation(s).")
@@ -3111,14 +3032,14 @@ elif nav_mode == "📊 Tableau de Bord":
                 token = (bulk_desc_token or "").strip()
                 if token:
                     sync_editor_changes()
-                    mask = st.session_state.main_import_df["Import?"].eq(True).fillna(False)
+                    mask = store.selected_mask()
                     n = int(mask.sum())
                     if n > 0:
                         def _append_desc(val, _tok=token):
                             s = val if isinstance(val, str) else ""
                             return (s + " " + _tok).strip() if s else _tok
-                        st.session_state.main_import_df.loc[mask, "Description"] = (
-                            st.session_state.main_import_df.loc[mask, "Description"].apply(_append_desc)
+                        store.frame.loc[mask, "Description"] = (
+                            store.frame.loc[mask, "Description"].apply(_append_desc)
                         )
                         st.session_state.editor_key_version = st.session_state.get("editor_key_version", 0) + 1
                         st.success(f"✅ « {token} » ajouté en fin de {n} observation(s).")
@@ -3135,22 +3056,14 @@ elif nav_mode == "📊 Tableau de Bord":
         if 'editor_key_version' not in st.session_state: st.session_state.editor_key_version = 0
         
         # We must reset the dataframe to be displayed to reflect updates from buttons/generations
-        # Re-calc df_display from fresh master state
-        df_filtered_fresh = st.session_state.main_import_df.copy()
-        if selected_dates:
-             df_filtered_fresh = df_filtered_fresh[df_filtered_fresh['Date'].isin(selected_dates)]
-        if hide_imported:
-             df_filtered_fresh = df_filtered_fresh[df_filtered_fresh['_is_new']]
-        if selected_limit != "Tout":
-             df_display_fresh = df_filtered_fresh.head(int(selected_limit))
-        else:
-             df_display_fresh = df_filtered_fresh
+        # Re-calc visible rows from fresh master state
+        view_index_fresh = store.view_index(selected_dates, hide_imported, view_limit)
              
         # Store indices for callback to reference
-        st.session_state.current_view_indices = df_display_fresh.index
+        st.session_state.current_view_indices = view_index_fresh
              
         edited_df = st.data_editor(
-            df_display_fresh,
+            store.editor_frame(view_index_fresh),
             key=f"main_editor_{st.session_state.editor_key_version}",
             on_change=sync_editor_changes,
             use_container_width=True,
@@ -3194,8 +3107,8 @@ elif nav_mode == "📊 Tableau de Bord":
         # CRITICAL: SYNC EDITS BACK TO MASTER
         # `edited_df` contains the state of the editor. 
         # Because we are filtering, `edited_df` is a subset. 
-        # We must update `main_import_df` using the indices from `edited_df`.
-        # Since `df_display` preserved the original indices, `edited_df` (which is returned by data_editor) 
+        # We must update the store using the indices from `edited_df`.
+        # Since the editor frame preserved the original indices, `edited_df` (which is returned by data_editor) 
         # SHOULD preserve them IF we don't mess it up. 
         # Wait, `edited_df` is a Pandas DataFrame returning the data in the editor.
         # If the input had an index, the output HAS THE SAME INDEX.
@@ -3206,12 +3119,11 @@ elif nav_mode == "📊 Tableau de Bord":
         # --- IMPORT BUTTON ---
         col_dup, col_imp = st.columns([1, 1])
         
-        # We need to map `main_import_df` (Master) where Import?=True for the final action
+        # We need to map the store (Master) where Import?=True for the final action
         if col_imp.button("📤 Importer vers Notion", type="primary"):
             sync_editor_changes()
             # Filter Master, not just visible
-            master_df = st.session_state.main_import_df
-            to_import_df = master_df[master_df["Import?"].eq(True).fillna(False)]
+            to_import_df = store.selected()
             
             if to_import_df.empty:
                 st.warning("Aucune observation cochée pour l'import.")
@@ -3233,334 +3145,6 @@ elif nav_mode == "📊 Tableau de Bord":
                     if not found:
                          fong_col_imp_name = next((k for k,v in import_props_schema.items() if "fongarium" in k.lower() and v["type"] not in ["checkbox", "formula"]), "No° fongarium")
                 
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Map back to full objects for details not in table (like Photos, Desc, raw Coords)
-                # We assume search_results is still available and parallel.
-                # Ideally we should have stored everything in DF, but Objects/Lists in DF are tricky in Editor.
-                # So looking up by ID in search_results is safer.
-                obs_map = {str(obs['id']): obs for obs in st.session_state.search_results}
-                
-                # Containers for logs
-                success_log = []
-                error_log = []
-                
-                # --- WORKER FUNCTION FOR MULTI-THREADING ---
-                def import_worker(row, obs_obj, current_inat, real_name_notion, fmt_db_id, db_props_schema, notion_instance, fong_col_name, enricher_maps=None, session=None, current_user_portail_page_id=None):
-                    """
-                    Import a single iNaturalist observation into the configured Notion database as a new page.
-
-                    Parameters:
-                        row (Mapping): A row from the import dataframe containing at least "Taxon", "ID", and "No° Fongarium".
-                        obs_obj (Mapping): The full iNaturalist observation object used to populate Notion properties (user, dates, photos, location, description, uri, tags, etc.).
-                        current_inat (str | None): Current iNaturalist username for the authenticated user; used to map to a Notion display name when matching the observation's user.
-                        real_name_notion (str | None): The display name to set in the Notion "Mycologue" select property when current_inat matches the observation's user.
-                        fmt_db_id (str): Notion database ID where the new page will be created.
-                        db_props_schema (dict): Notion database properties schema for dynamic key detection.
-                        notion_instance (Client): Authenticated Notion Client instance.
-                        fong_col_name (str): The name of the Notion property for Fongarium code.
-                        current_user_portail_page_id (str | None): Notion page ID of the current user's "Portail du mycologue" entry. When the observation's iNat user matches the current Streamlit user, this is used to populate the "Mycologue (relation)" column.
-
-                    Returns:
-                        tuple:
-                            - success (dict | None): If successful, a dict with keys "name" (scientific name), "id" (iNaturalist observation id), and "url" (Notion page url); otherwise None.
-                            - error_or_warning (str | None): If the import failed, an error message; if the import succeeded but QR code update failed, a warning message; otherwise None.
-
-                    Side effects:
-                        - Creates a new page in Notion with mapped properties, optional photo children blocks, and attempts to update QR code file properties.
-                    """
-                    sci_name = row["Taxon"]
-                    obs_id = str(row["ID"])
-                    _t_worker_start = time.time()
-
-                    # --- DOUBLE SECURITY ---
-                    if not row.get("_is_new", True):
-                        return None, "⚠️ Importation ignorée (déjà présent sur Notion)"
-                    
-                    try:
-                        # --- DATA EXTRACTION & MAPPING ---
-                        inat_login = obs_obj.get('user', {}).get('login') or "Inconnu"
-                        user_name = inat_login
-                        is_self_import = bool(current_inat) and inat_login.lower() == current_inat.lower()
-                        if is_self_import:
-                            if real_name_notion:
-                                user_name = real_name_notion
-
-                        observed_on = obs_obj.get('time_observed_at')
-                        if not observed_on:
-                            obs_date_raw = obs_obj.get('observed_on')
-                            if obs_date_raw:
-                                date_iso = obs_date_raw.isoformat() if hasattr(obs_date_raw, 'isoformat') else str(obs_date_raw)
-                            else:
-                                date_iso = None
-                        else:
-                            date_iso = observed_on.isoformat()
-                        
-                        obs_url = obs_obj.get('uri')
-                        tags = obs_obj.get('tags', []) 
-                        tag_string = ""
-                        if tags:
-                            extracted_tags = []
-                            for t in tags:
-                                if isinstance(t, dict): extracted_tags.append(t.get('tag', ''))
-                                elif isinstance(t, str): extracted_tags.append(t)
-                                else: extracted_tags.append(str(t))
-                            tag_string = ", ".join(filter(None, extracted_tags))
-
-                        fong_code = row["No° Fongarium"]
-                        photos = obs_obj.get('photos', [])
-                        photo_files_payload = []
-                        for p in photos:
-                            photo_files_payload.append({
-                                "name": f"iNat {p['id']}",
-                                "type": "external",
-                                "external": {"url": p['url'].replace("square", "original")}
-                            })
-
-                        children = []
-                        if photos:
-                            children.append({"object": "block", "type": "heading_3", "heading_3": {"rich_text": [{"text": {"content": "Galerie Photo"}}]}})
-                            for p in photos:
-                                children.append({
-                                    "object": "block", 
-                                    "type": "image", 
-                                    "image": {"type": "external", "external": {"url": p['url'].replace("square", "large")}}
-                                })
-
-                        # Construct Props
-                        props = {
-                            "Titre": {"title": [{"text": {"content": sci_name}}]}
-                        }
-                        if date_iso: props["Date"] = {"date": {"start": date_iso}}
-                        if user_name: props["Mycologue"] = {"select": {"name": user_name}}
-                        # Mycologue (relation) — uniquement pour self-import et si page_id configuré
-                        if is_self_import and current_user_portail_page_id:
-                            # Détecter dynamiquement le nom exact dans le schéma de la BD.
-                            # Si aucune colonne relation Mycologue n'existe, on skip plutôt
-                            # que de défauter sur un nom hardcodé qui ferait rejeter la page
-                            # par Notion (400 "is not a property that exists").
-                            relation_key = next(
-                                (k for k, v in db_props_schema.items()
-                                 if "mycologue" in k.lower() and "relation" in k.lower() and v.get("type") == "relation"),
-                                None,
-                            )
-                            if relation_key:
-                                props[relation_key] = {"relation": [{"id": current_user_portail_page_id}]}
-
-                        # Identificateur (select) — alimenté par le sélecteur bulk ou la colonne éditable.
-                        # Détection dynamique du nom exact pour gérer les variantes de casse.
-                        ident_value = (row.get("Identificateur") or "").strip()
-                        if ident_value:
-                            ident_key = next(
-                                (k for k, v in db_props_schema.items()
-                                 if k.lower() == "identificateur" and v.get("type") == "select"),
-                                None,
-                            )
-                            if ident_key:
-                                props[ident_key] = {"select": {"name": ident_value}}
-
-                        # État d'identification (status) — auto-détecté depuis le nom scientifique.
-                        # Évite à l'utilisateur de cliquer manuellement après chaque import.
-                        etat_value = auto_etat_identification(sci_name)
-                        if etat_value:
-                            etat_key = next(
-                                (k for k, v in db_props_schema.items()
-                                 if "identification" in k.lower() and "tat" in k.lower() and v.get("type") == "status"),
-                                None,
-                            )
-                            if etat_key:
-                                props[etat_key] = {"status": {"name": etat_value}}
-
-                        if obs_url: props["URL Inaturalist"] = {"url": obs_url}
-                        if photo_files_payload: props["Photo macro"] = {"files": photo_files_payload}
-                        
-                        if fong_code:
-                            props[fong_col_name] = {"rich_text": [{"text": {"content": str(fong_code)}}]}
-                        elif tag_string:
-                            props[fong_col_name] = {"rich_text": [{"text": {"content": tag_string}}]}
-                            
-                        # Set Fongarium checkbox if Collection is selected
-                        if row.get("Collection"):
-                            fong_checkbox_key = next((k for k, v in db_props_schema.items() if "fongarium" in k.lower() and v["type"] == "checkbox"), None)
-                            
-                            # Fallback if the user named it exactly 'Fongarium'
-                            if not fong_checkbox_key and "Fongarium" in db_props_schema:
-                                fong_checkbox_key = "Fongarium"
-                            
-                            if fong_checkbox_key:
-                                if db_props_schema.get(fong_checkbox_key, {}).get("type") == "checkbox":
-                                    props[fong_checkbox_key] = {"checkbox": True}
-                                else:
-                                    print(f"Warning: Property '{fong_checkbox_key}' found but is not a checkbox type.")
-                        
-                        # iNat Taxon ID
-                        inat_taxon_id = obs_obj.get("taxon", {}).get("id")
-                        if inat_taxon_id:
-                            taxon_id_key = next((k for k, v in db_props_schema.items() if "taxon" in k.lower() and "id" in k.lower() and v["type"] == "number"), None)
-                            if not taxon_id_key and "Inat Taxon ID" in db_props_schema:
-                                taxon_id_key = "Inat Taxon ID"
-                            
-                            if taxon_id_key:
-                                props[taxon_id_key] = {"number": int(inat_taxon_id)}
-
-                        # Description : la version éditée dans le tableau prime — permet d'ajouter
-                        # ou corriger les codes (*FSL01, #BOJ, !BOM, $BMC, etc.) juste avant l'import
-                        # sans devoir modifier l'obs côté iNat. Si l'utilisateur a effacé volontairement,
-                        # on respecte (utiliser le bouton « Restaurer depuis iNat » pour récupérer).
-                        description = (row.get("Description") or "").strip()
-                        if description:
-                            props["Description rapide"] = {"rich_text": [{"text": {"content": description[:2000]}}]}
-                        
-                        place_guess = obs_obj.get('place_guess', '')
-                        if place_guess: props["Repère"] = {"rich_text": [{"text": {"content": place_guess}}]}
-                        
-                        coords = obs_obj.get('location')
-                        if coords:
-                            try:
-                                lat_val = None
-                                lng_val = None
-                                if isinstance(coords, str):
-                                    parts = coords.split(',')
-                                    if len(parts) >= 2:
-                                        lat_val = parts[0].strip()
-                                        lng_val = parts[1].strip()
-                                elif isinstance(coords, list) and len(coords) >= 2:
-                                    lat_val = str(coords[0])
-                                    lng_val = str(coords[1])
-                                
-                                if lat_val and lng_val:
-                                    lat_key = "Latitude (sexadécimal)"
-                                    if lat_key not in db_props_schema:
-                                        lat_key = next((k for k in db_props_schema if "lat" in k.lower() and "re" not in k.lower()), "Latitude")
-                                        
-                                    lng_key = "Longitude (sexadécimal)"
-                                    if lng_key not in db_props_schema:
-                                        lng_key = next((k for k in db_props_schema if "long" in k.lower()), "Longitude")
-
-                                    if lat_key in db_props_schema:
-                                        if db_props_schema[lat_key]["type"] == "number":
-                                            props[lat_key] = {"number": float(lat_val)}
-                                        else:
-                                            props[lat_key] = {"rich_text": [{"text": {"content": str(lat_val)}}]}
-                                    else:
-                                        props["Latitude (sexadécimal)"] = {"rich_text": [{"text": {"content": str(lat_val)}}]}
-
-                                    if lng_key in db_props_schema:
-                                        if db_props_schema[lng_key]["type"] == "number":
-                                            props[lng_key] = {"number": float(lng_val)}
-                                        else:
-                                            props[lng_key] = {"rich_text": [{"text": {"content": str(lng_val)}}]}
-                                    else:
-                                        props["Longitude (sexadécimal)"] = {"rich_text": [{"text": {"content": str(lng_val)}}]}
-
-                            except Exception as coord_err:
-                                print(f"Coord parse warning for {obs_id}: {coord_err}")
-
-                        # --- SEND TO NOTION WITH RETRY ---
-                        def call_notion_with_retry(func, **kwargs):
-                            max_retries = 5
-                            for attempt in range(max_retries):
-                                try:
-                                    return func(**kwargs)
-                                except APIResponseError as e:
-                                    # Status 429 is Rate Limit
-                                    if e.status == 429:
-                                        if attempt == max_retries - 1:
-                                            raise e
-                                        
-                                        # Use Retry-After header if available, otherwise exponential backoff
-                                        retry_after = e.headers.get("Retry-After")
-                                        try:
-                                            wait_time = float(retry_after) if retry_after else (2 ** attempt) + random.uniform(0, 1)
-                                        except ValueError:
-                                            wait_time = (2 ** attempt) + random.uniform(0, 1)
-                                            
-                                        time.sleep(wait_time)
-                                    else:
-                                        raise e
-                                except Exception as e:
-                                    # For broad network errors, we might still want a basic retry?
-                                    # But let's follow the recommendation to check specifically for APIResponseError.
-                                    raise e
-
-                        _t_create_start = time.time()
-                        new_page = call_notion_with_retry(
-                            notion_instance.pages.create,
-                            parent={"database_id": fmt_db_id, "type": "database_id"},
-                            properties=props,
-                            children=children
-                        )
-                        _t_create_elapsed = time.time() - _t_create_start
-                        print(f"[TIMING] obs_id={obs_id} step=pages.create took={_t_create_elapsed:.2f}s")
-
-                        p_url = new_page.get('url')
-                        page_id = new_page.get('id')
-                        
-                        # QR Codes
-                        if page_id:
-                            qr_props = {}
-                            # Detect keys dynamically
-                            qr_notion_key = next((k for k in db_props_schema if "qr" in k.lower() and "notion" in k.lower()), "Code QR (Notion)")
-                            qr_inat_key = next((k for k in db_props_schema if "qr" in k.lower() and "inat" in k.lower()), "Code QR (Inat)")
-
-                            if p_url:
-                                encoded_p_url = quote(p_url, safe='')
-                                qr_api_url = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={encoded_p_url}"
-                                qr_props[qr_notion_key] = {"files": [{"name": "notion_qr.png", "type": "external", "external": {"url": qr_api_url}}]}
-                            
-                            if obs_url:
-                                encoded_obs_url = quote(obs_url, safe='')
-                                inat_qr_url = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={encoded_obs_url}"
-                                qr_props[qr_inat_key] = {"files": [{"name": "inat_qr.png", "type": "external", "external": {"url": inat_qr_url}}]}
-
-                            if qr_props:
-                                try:
-                                    _t_qr_start = time.time()
-                                    call_notion_with_retry(notion_instance.pages.update, page_id=page_id, properties=qr_props)
-                                    _t_qr_elapsed = time.time() - _t_qr_start
-                                    print(f"[TIMING] obs_id={obs_id} step=qr_codes_patch took={_t_qr_elapsed:.2f}s")
-                                except Exception as qr_err:
-                                    warning_msg = f"⚠️ Importation réussie mais échec de la mise à jour des QR Codes pour {sci_name} (ID: {obs_id}). Erreur : {qr_err!s}"
-                                    return ({"name": sci_name, "id": obs_id, "url": p_url}, warning_msg)
-
-                        # --- ENRICHISSEMENT RELATIONS ---
-                        if enricher_maps and page_id:
-                            try:
-                                inat_taxon_id = obs_obj.get("taxon", {}).get("id")
-                                _t_enrich_start = time.time()
-                                ok_enrich, msg_enrich = enricher.resolve_and_update_relations(
-                                    page_id,
-                                    sci_name,
-                                    description or "",
-                                    enricher_maps,
-                                    NOTION_TOKEN,
-                                    db_props_schema,
-                                    taxon_id=inat_taxon_id,
-                                    session=session,
-                                )
-                                _t_enrich_elapsed = time.time() - _t_enrich_start
-                                print(f"[TIMING] obs_id={obs_id} step=enricher_relations took={_t_enrich_elapsed:.2f}s")
-                                if not ok_enrich:
-                                    if msg_enrich != "Rien à résoudre":
-                                        # Non-fatal warning if enrichment couldn't find a match
-                                        warning_msg = f"⚠️ Importation réussie mais enrichissement partiel pour {sci_name} (ID: {obs_id}) : {msg_enrich}"
-                                        return ({"name": sci_name, "id": obs_id, "url": p_url}, warning_msg)
-                            except Exception as enrich_err:
-                                # Log as a warning but don't fail the whole import for this observation
-                                print(f"Erreur enrichissement pour {sci_name}: {enrich_err}")
-                                warning_msg = f"⚠️ Importation réussie mais échec de l'enrichissement taxonomique pour {sci_name} (ID: {obs_id}). Erreur : {enrich_err!s}"
-                                return ({"name": sci_name, "id": obs_id, "url": p_url}, warning_msg)
-
-                        _t_worker_total = time.time() - _t_worker_start
-                        print(f"[TIMING] obs_id={obs_id} step=WORKER_TOTAL took={_t_worker_total:.2f}s")
-                        return ({"name": sci_name, "id": obs_id, "url": p_url}, None)
-
-                    except Exception as e:
-                        _t_worker_total = time.time() - _t_worker_start
-                        print(f"[TIMING] obs_id={obs_id} step=WORKER_TOTAL took={_t_worker_total:.2f}s status=ERROR")
-                        return (None, f"{sci_name} (ID: {obs_id}) : {e!s}")
-
                 # --- CHARGEMENT DES MAPS D'ENRICHISSEMENT (Cache 1h) ---
                 if NOTION_TOKEN:
                     _t_maps_start = time.time()
@@ -3572,11 +3156,6 @@ elif nav_mode == "📊 Tableau de Bord":
                     if errs:
                         st.warning(f"⚠️ Référentiels partiellement chargés : {', '.join(errs)}")
 
-                # --- EXECUTION WITH THREADPOOL ---
-                futures = []
-
-                current_inat_val = st.session_state.get('inat_username', "")
-                real_name_val = st.session_state.get('username', "")
                 current_portail_page_id = (st.session_state.get('user_info') or {}).get('notion_portail_page_id')
 
                 # Filet de sécurité : ne pas importer si le user n'a pas configuré sa page Portail.
@@ -3598,59 +3177,32 @@ elif nav_mode == "📊 Tableau de Bord":
                     )
                     st.stop()
 
-                with requests.Session() as s:
-                    with ThreadPoolExecutor(max_workers=2) as executor:
-                        for _, row in to_import_df.iterrows():
-                            obs_id = str(row["ID"])
-                            obs = obs_map.get(obs_id)
-                            if not obs:
-                                error_log.append(f"{row['Taxon']} (ID: {obs_id}) : Données iNat introuvables (obs_map)")
-                                continue
-
-                            futures.append(executor.submit(
-                                import_worker, row, obs, current_inat_val, real_name_val,
-                                formatted_db_id, import_props_schema, notion, fong_col_imp_name,
-                                st.session_state.enricher_maps, session=s,
-                                current_user_portail_page_id=current_portail_page_id,
-                            ))
-
-                        total_tasks = len(futures)
-                        if total_tasks > 0:
-                            for i, future in enumerate(as_completed(futures)):
-                                try:
-                                    success_item, error_msg = future.result()
-                                    if success_item:
-                                        success_log.append(success_item)
-                                    if error_msg:
-                                        error_log.append(error_msg)
-                                except Exception as fut_err:
-                                    error_log.append(f"Erreur système durant l'import : {fut_err!s}")
-                                
-                                progress_bar.progress((i + 1) / total_tasks)
-                                status_text.text(f"Traitement en cours... ({i+1}/{total_tasks})")
-                        else:
-                            progress_bar.progress(1.0)
-                            status_text.text("Aucune observation valide à importer.")
-                
-                status_text.empty()
-                
-                # --- FINAL REPORT ---
-                if error_log:
-                    st.error(f"⚠️ Terminé avec {len(error_log)} erreurs.")
-                    with st.expander("Voir les erreurs"):
-                        for err in error_log:
-                            st.write(f"- {err}")
-                
-                if success_log:
-                    st.success(f"✅ {len(success_log)} observations importées avec succès !")
-                    with st.expander("📋 Voir la liste des imports réussis", expanded=True):
-                        # Display as a clean Markdown list with links
-                        for s in success_log:
-                            url_md = f"[Ouvrir]({s['url']})" if s['url'] else "N/A"
-                            st.markdown(f"- **{s['name']}** (ID: {s['id']}) — {url_md}")
-                
-                if success_log and not error_log:
-                    st.balloons()
+                # --- SOUMISSION À LA FILE D'IMPORT ---
+                # L'import tourne dans le thread d'arrière-plan de `import_jobs` : il
+                # survit à un rechargement de l'onglet ou à une coupure du websocket,
+                # et le suivi (_render_import_job_panel) se met à jour tout seul.
+                # Chaque ligne porte son observation iNat (colonne `_obs` du magasin) :
+                # photos, coordonnées brutes… sans reconstruire de table ID → obs.
+                job_items = [
+                    (int(inat_id), importer.job_payload(row, row[OBS_COLUMN]))
+                    for inat_id, row in to_import_df.iterrows()
+                ]
+
+                if job_items:
+                    queue = import_jobs.get_queue(DATABASE_ID)
+                    job_context = {
+                        "current_inat": st.session_state.get('inat_username', ""),
+                        "real_name_notion": st.session_state.get('username', ""),
+                        "fmt_db_id": formatted_db_id,
+                        "db_props_schema": import_props_schema,
+                        "fong_col_name": fong_col_imp_name,
+                        "current_user_portail_page_id": current_portail_page_id,
+                    }
+                    st.session_state.import_job_id = queue.submit(job_items, job_context, owner=_import_job_owner())
+                    ensure_import_worker(queue, st.session_state.enricher_maps)
+
+        # Suivi du job d'import (en cours ou dernier terminé).
+        _render_import_job_panel()
 
     # Appel du fragment — chaque action dans le tableau ne recharge que cette section,
     # ce qui préserve la position du scroll dans la page.
@@ -3787,8 +3339,8 @@ elif nav_mode == "📊 Tableau de Bord":
 
             with col_reset:
                 if st.button("🔄 Forcer le rafraîchissement"):
-                    cached_build_lookup_maps.clear()
-                    st.session_state.enricher_maps = cached_build_lookup_maps(NOTION_TOKEN)
+                    with st.spinner("Rechargement des référentiels depuis Notion…"):
+                        st.session_state.enricher_maps = rebuild_lookup_maps(NOTION_TOKEN, full_sweep=True)
                     st.success("Référentiels rechargés !")
                     st.rerun()
 
@@ -3801,6 +3353,20 @@ elif nav_mode == "📊 Tableau de Bord":
                 help="Décocher pour forcer la résolution sur toutes les observations (plus long)."
             )
 
+            # Reprise : les pages déjà traitées par une résolution interrompue
+            # (bouton Stop de Streamlit, page quittée…) sont mémorisées en session
+            # et sautées au prochain lancement.
+            done_ids = st.session_state.setdefault("resolve_done_page_ids", set())
+            if done_ids:
+                col_resume, col_forget = st.columns([3, 1])
+                col_resume.info(
+                    f"⏸️ Résolution précédente interrompue ou incomplète : {len(done_ids)} observation(s) déjà "
+                    f"traitée(s) seront ignorées au prochain lancement."
+                )
+                if col_forget.button("Tout reprendre à zéro"):
+                    done_ids.clear()
+                    st.rerun()
+
             if st.button("▶️ Lancer la résolution", type="primary"):
                 st.session_state.enricher_maps = cached_build_lookup_maps(NOTION_TOKEN)
 
@@ -3831,6 +3397,7 @@ elif nav_mode == "📊 Tableau de Bord":
                             db_props_schema=props_schema,
                             filter_unresolved=filter_unresolved,
                             progress_callback=_progress,
+                            done_page_ids=done_ids,
                         )
                     except Exception as e:
                         status_text.empty()
@@ -3842,10 +3409,12 @@ elif nav_mode == "📊 Tableau de Bord":
 
                 status_text.empty()
                 progress_bar.progress(1.0)
+                if not result["cancelled"] and not result["errors"]:
+                    done_ids.clear()
 
                 st.success(
                     f"✅ {result['success']} observations enrichies sur {result['total']} traitées "
-                    f"({result['skipped']} ignorées)."
+                    f"({result['skipped']} ignorées, dont {result.get('unchanged', 0)} déjà à jour)."
                 )
 
                 if result["errors"]:
@@ -25,15 +25,27 @@ stations afin que `#` soit libéré pour les plantes (codes courts plus nombreux
 
 Les maps sont construites dynamiquement depuis Notion au démarrage de session —
 aucune modification de code requise quand une nouvelle station ou un nouveau code est créé.
+Un snapshot disque (`save_maps_snapshot` / `load_maps_snapshot`) évite de les
+reconstruire à froid après un redémarrage.
 """
 
+import gzip
+import hashlib
+import itertools
+import json
+import os
 import re
+import threading
 import time
-import random
 import requests
+from collections.abc import Iterable
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 
-NOTION_VERSION = "2022-06-28"
+import pandas as pd
+
+from notion_http import NOTION_VERSION, get_client  # noqa: F401 — NOTION_VERSION ré-exporté
+from ratelimit import PRIORITY_BULK, PRIORITY_NORMAL
 
 # Les IDs des bases de données Notion sont fournis par l'appelant (app.py) qui
 # les charge depuis `.streamlit/secrets.toml` (clé [notion]). Cela permet de
@@ -62,129 +74,78 @@ PROP_PROJET          = "Projet d'inventaire"
 # Helpers bas niveau
 # ---------------------------------------------------------------------------
 
-def _headers(token: str) -> dict:
-    return {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": NOTION_VERSION,
-        "Content-Type": "application/json",
-    }
+def _iter_query_db(
+    token: str,
+    db_id: str,
+    filter_properties: list[str] | None = None,
+    priority: int = PRIORITY_NORMAL,
+    body: dict | None = None,
+):
+    """Requête paginée sur une DB Notion — générateur de lots (≤ 100 pages) au fil de l'eau.
+
+    Seul le lot courant est en mémoire : l'appelant le consomme (construit ses
+    maps, soumet ses PATCH…) avant que le suivant ne soit demandé. Pour Mycoliste
+    ou la DB Observations, le pic mémoire ne dépend plus de la taille de la DB.
+
+    Passe par le client poolé `notion_http` : retries 429/5xx via l'ordonnanceur
+    partagé `ratelimit.NOTION_LIMITER` (priorité `priority`), back-off réseau.
+
+    Si `filter_properties` est fourni et que l'API renvoie 400 sur la première
+    requête (typiquement parce qu'un property ID encodé est devenu obsolète
+    après recréation de propriété côté Notion), la requête repart UNE fois sans
+    `filter_properties` pour récupérer toutes les propriétés. Cela évite de
+    casser silencieusement le chargement quand Notion recycle des IDs.
+
+    `body` : filtre / tri Notion optionnel (ex. delta `last_edited_time`).
+    """
+    client = get_client(token)
+    fetched = 0
+    started = False
+    try:
+        for batch in client.iter_query(db_id, body, filter_properties=filter_properties, priority=priority):
+            started = True
+            fetched += len(batch)
+            # Log progress to terminal
+            print(f"  [Notion] DB {db_id[:8]}... : {fetched} pages récupérées...")
+            yield batch
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        # 400 + filter_properties actif → IDs probablement obsolètes.
+        # Fallback : re-tente UNE fois sans filter_properties (rien n'a encore
+        # été renvoyé à l'appelant : pas de doublon possible).
+        if status == 400 and filter_properties and not started:
+            print(
+                f"[Notion] DB {db_id[:8]}... : HTTP 400 avec filter_properties "
+                f"(IDs probablement obsolètes). Re-tentative sans filter_properties.\n"
+                f"  Réponse Notion : {e}"
+            )
+            yield from _iter_query_db(token, db_id, None, priority=priority, body=body)
+            return
+        # 4xx (sauf 429) → re-raise, mais log d'abord pour faciliter le debug
+        if status and 400 <= status < 500 and status != 429:
+            print(f"[Notion] HTTPError {status} for DB {db_id}\n  Body: {e}")
+        raise
+
+
+def _iter_pages(token: str, db_id: str, **kw):
+    """Comme `_iter_query_db`, mais page par page."""
+    for batch in _iter_query_db(token, db_id, **kw):
+        yield from batch
 
 
 def _query_db_all(
     token: str,
     db_id: str,
-    session: requests.Session | None = None,
     filter_properties: list[str] | None = None,
-    _fallback_attempted: bool = False,
+    priority: int = PRIORITY_NORMAL,
+    body: dict | None = None,
 ) -> list:
-    """Requête paginée sur une DB Notion — retourne toutes les pages avec retry robuste.
-
-    Si `filter_properties` est fourni et que l'API renvoie 400 (typiquement
-    parce qu'un property ID encodé est devenu obsolète après recréation de
-    propriété côté Notion), la fonction se rappelle elle-même UNE fois sans
-    `filter_properties` pour récupérer toutes les propriétés. Cela évite de
-    casser silencieusement le chargement quand Notion recycle des IDs.
+    """Toutes les pages d'une requête, en liste (cf. `_iter_query_db`).
 
-    Param interne `_fallback_attempted` : évite la récursion infinie.
+    À réserver aux petits résultats (deltas, petites BDs) : préférer les
+    générateurs dès que la DB peut être grosse.
     """
-    results = []
-    cursor = None
-
-    # URL avec filtrage de propriétés si spécifié
-    url = f"https://api.notion.com/v1/databases/{db_id}/query"
-    if filter_properties:
-        params = "&".join([f"filter_properties={p}" for p in filter_properties])
-        url = f"{url}?{params}"
-
-    requester = session if session else requests
-    
-    while True:
-        body = {"page_size": 100}
-        if cursor:
-            body["start_cursor"] = cursor
-            
-        # Retry loop for the POST request
-        last_resp = None
-        for attempt in range(5):
-            try:
-                # Increased timeout to 60s for stability with large Notion databases
-                resp = requester.post(url, headers=_headers(token), json=body, timeout=60)
-                last_resp = resp
-                
-                # Success
-                if resp.status_code == 200:
-                    break
-                    
-                # Retry on 429 (Rate Limit) or 5xx (Server Error)
-                if resp.status_code == 429 or 500 <= resp.status_code < 600:
-                    # Exponential backoff + jitter
-                    retry_after = resp.headers.get("Retry-After")
-                    try:
-                        wait = float(retry_after) if retry_after else (2 ** attempt + random.random())
-                    except (ValueError, TypeError):
-                        wait = 2 ** attempt + random.random()
-                    time.sleep(wait)
-                    continue
-                
-                # Other errors: raise immediately
-                resp.raise_for_status()
-                
-            except requests.exceptions.HTTPError as e:
-                if e.response is not None:
-                    status = e.response.status_code
-                    # 400 + filter_properties actif → IDs probablement obsolètes.
-                    # Fallback : re-tente UNE fois sans filter_properties.
-                    if (
-                        status == 400
-                        and filter_properties
-                        and not _fallback_attempted
-                    ):
-                        body = (e.response.text or "")[:200]
-                        print(
-                            f"[Notion] DB {db_id[:8]}... : HTTP 400 avec filter_properties "
-                            f"(IDs probablement obsolètes). Re-tentative sans filter_properties.\n"
-                            f"  Réponse Notion : {body}"
-                        )
-                        return _query_db_all(
-                            token, db_id, session=session,
-                            filter_properties=None, _fallback_attempted=True,
-                        )
-                    # 4xx (sauf 429) → re-raise, mais log d'abord pour faciliter le debug
-                    if 400 <= status < 500 and status != 429:
-                        body = (e.response.text or "")[:300]
-                        print(
-                            f"[Notion] HTTPError {status} for {url}\n"
-                            f"  Body: {body}"
-                        )
-                        raise
-                if attempt < 4:
-                    time.sleep(2 ** attempt + random.random())
-                    continue
-                raise
-            except requests.exceptions.RequestException as e:
-                # Retry on network errors
-                if attempt < 4:
-                    time.sleep(2 ** attempt + random.random())
-                    continue
-                raise
-        
-        if last_resp is None or last_resp.status_code != 200:
-            if last_resp:
-                last_resp.raise_for_status()
-            raise Exception("Impossible de contacter l'API Notion après plusieurs tentatives.")
-            
-        data = last_resp.json()
-        batch_size = len(data.get("results", []))
-        results.extend(data.get("results", []))
-        
-        # Log progress to terminal
-        print(f"  [Notion] DB {db_id[:8]}... : {len(results)} pages récupérées...")
-        
-        if not data.get("has_more"):
-            break
-        cursor = data.get("next_cursor")
-        
-    return results
+    return list(_iter_pages(token, db_id, filter_properties=filter_properties, priority=priority, body=body))
 
 
 def _get_title(props: dict) -> str:
@@ -213,34 +174,20 @@ def extract_taxon_id_from_props(props: dict) -> int | None:
     return None
 
 
-def _notion_patch_with_retry(token: str, page_id: str, properties: dict, session: requests.Session | None = None) -> requests.Response:
-    """PATCH Notion avec retry exponentiel sur 429 et erreurs réseau."""
-    url = f"https://api.notion.com/v1/pages/{page_id}"
-    requester = session if session else requests
-    
-    last_resp = None
-    for attempt in range(5):
-        try:
-            resp = requester.patch(url, headers=_headers(token), json={"properties": properties}, timeout=30)
-            last_resp = resp
-            if resp.status_code not in {429, 500, 502, 503, 504}:
-                return resp
-            
-            retry_after = resp.headers.get("Retry-After")
-            try:
-                wait = float(retry_after) if retry_after else (2 ** attempt + random.random())
-            except (ValueError, TypeError):
-                wait = 2 ** attempt + random.random()
-            time.sleep(wait)
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.RequestException) as e:
-            if attempt < 4:
-                time.sleep(2 ** attempt + random.random())
-                continue
-            raise
-            
-    if last_resp:
-        raise requests.exceptions.HTTPError(f"Échec après 5 tentatives (Status: {last_resp.status_code}): {last_resp.text}", response=last_resp)
-    raise Exception("Échec PATCH après 5 tentatives pour cause d'erreurs réseau.")
+def _notion_patch_with_retry(
+    token: str,
+    page_id: str,
+    properties: dict,
+    priority: int = PRIORITY_NORMAL,
+) -> requests.Response:
+    """PATCH Notion via le client poolé (retry 429/5xx par `NOTION_LIMITER`, back-off réseau).
+
+    Retourne la réponse finale (y compris un 4xx : l'appelant lit le statut).
+    """
+    return get_client(token).request(
+        "PATCH", f"pages/{page_id}", json={"properties": properties},
+        priority=priority, timeout=30, raise_for_status=False,
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -259,8 +206,210 @@ def _strip_infraspecific(name: str) -> str:
 # ---------------------------------------------------------------------------
 # 1. build_lookup_maps
 # ---------------------------------------------------------------------------
+#
+# Chaque BD de référence a un parseur pur `pages → {nom_map: {clé: page_id}}`.
+# Le même parseur sert au chargement complet (`build_lookup_maps`) et à la
+# fusion incrémentale (`refresh_lookup_maps`) : une page modifiée est retirée
+# de toutes les maps de sa BD puis re-parsée.
+
+def _split_names(raw: str) -> list[str]:
+    """'Bouleau jaune; merisier' → ['bouleau jaune', 'merisier'] (normalisés)."""
+    return [_normalize(part) for part in re.split(r"[,;]", raw) if part.strip()]
+
+
+def _parse_mycoliste(pages: Iterable) -> dict:
+    s_map, t_map, o_map = {}, {}, {}
+    for p in pages:
+        pid = p["id"]
+        props = p["properties"]
+        name = _get_title(props)
+        if name: s_map[_normalize(name)] = pid
+        tid = extract_taxon_id_from_props(props)
+        if tid is not None: t_map[tid] = pid
+        for part in _split_names(_get_rich_text(props.get("Ancien(s) Nom", {}))):
+            o_map[part] = pid
+    return {"species_map": s_map, "taxon_id_map": t_map, "old_names_map": o_map}
+
+
+def _parse_stations(pages: Iterable) -> dict:
+    st_map, st_names = {}, {}
+    for p in pages:
+        props = p["properties"]
+        title = _get_title(props)
+        code = _get_rich_text(props.get("Code de la station", {}))
+        if not code:
+            code = title.split()[0] if title else ""
+        if code:
+            st_map[code.upper()] = p["id"]
+            st_names[code.upper()] = title or code
+    return {"station_map": st_map, "station_names": st_names}
+
+
+def _parse_code_terrain(pages: Iterable, map_key: str, names_key: str, code_prop: str = "Code terrain") -> dict:
+    """Habitats / Substrats / Projets : `code_prop` (rich_text) → page, titre → nom lisible."""
+    c_map, c_names = {}, {}
+    for p in pages:
+        props = p["properties"]
+        code = _get_rich_text(props.get(code_prop, {}))
+        if code:
+            c_map[code.upper()] = p["id"]
+            c_names[code.upper()] = _get_title(props) or code
+    return {map_key: c_map, names_key: c_names}
+
+
+def _parse_habitats(pages: Iterable) -> dict:
+    return _parse_code_terrain(pages, "habitat_codes", "habitat_names")
+
+
+def _parse_substrats(pages: Iterable) -> dict:
+    return _parse_code_terrain(pages, "substrat_codes", "substrat_names")
+
+
+def _parse_projets(pages: Iterable) -> dict:
+    # Champ "Code" : acronyme officiel (ex: FSL, RNFCT, LT)
+    return _parse_code_terrain(pages, "projet_map", "projet_names", code_prop="Code")
+
+
+def _parse_vegetation(pages: Iterable) -> dict:
+    v_latin, v_code, v_fr, v_en = {}, {}, {}, {}
+    v_code_names = {}
+    for p in pages:
+        props = p["properties"]
+        pid = p["id"]
+        # Nom latin (title)
+        latin = _get_title(props)
+        if latin:
+            v_latin[_normalize(latin)] = pid
+        # code_plante (rich_text) — clé en majuscules pour comparaison @CODE
+        code = _get_rich_text(props.get("code_plante", {}))
+        if code:
+            v_code[code.upper()] = pid
+            # Toujours peupler le nom (repli sur le code si pas de latin)
+            # pour ne pas afficher un nom vide dans le référentiel.
+            v_code_names[code.upper()] = latin or code
+        # nom_vernaculaire_fr / _en — peuvent contenir plusieurs noms séparés par ; ou ,
+        for part in _split_names(_get_rich_text(props.get("nom_vernaculaire_fr", {}))):
+            v_fr[part] = pid
+        for part in _split_names(_get_rich_text(props.get("nom_vernaculaire_en", {}))):
+            v_en[part] = pid
+        # synonymes_fr — alimente la même map fr (priorité au nom canonique
+        # déjà inséré, mais on overwrite si plusieurs synonymes pointent ici —
+        # acceptable car un synonyme unique pointe vers une seule espèce)
+        for part in _split_names(_get_rich_text(props.get("synonymes_fr", {}))):
+            v_fr[part] = pid
+    return {
+        "vegetation_map": v_latin,
+        "vegetation_code_map": v_code,
+        "vegetation_fr_map": v_fr,
+        "vegetation_en_map": v_en,
+        "vegetation_code_names": v_code_names,
+    }
+
+
+class _MapSource:
+    """Une BD de référence : où la lire, comment la parser, quelles maps elle alimente."""
+    __slots__ = ("key", "label", "filter_properties", "parse", "map_keys", "always_sweep")
+
+    def __init__(self, key, label, parse, map_keys, filter_properties=None, always_sweep=True):
+        self.key = key
+        self.label = label
+        self.parse = parse
+        self.map_keys = map_keys
+        self.filter_properties = filter_properties
+        # Détection des suppressions à chaque rafraîchissement incrémental ?
+        # (liste titre-seul de toutes les pages : ~1 requête pour une petite BD,
+        # ~50 pour Mycoliste → réservé au `full_sweep`).
+        self.always_sweep = always_sweep
+
+
+_MAP_SOURCES = (
+    # Optimisation : Mycoliste contient 4700+ taxons. Récupérer toutes les
+    # propriétés ferait ~10× la bande passante pour 50+ colonnes morphologiques
+    # inutilisées par enricher. On filtre donc sur 3 IDs :
+    #   - title    : Nom Latin
+    #   - NmF%3F   : Inat Taxon ID (= `NmF?` décodé)
+    #   - %3C~w%5C : Ancien(s) Nom (= `<~w\` décodé)
+    # Si Notion recycle ces IDs → _iter_query_db fait automatiquement un fallback
+    # sans filter_properties (cf. docstring de _iter_query_db).
+    _MapSource("mycoliste", "Mycoliste", _parse_mycoliste,
+               ("species_map", "taxon_id_map", "old_names_map"),
+               filter_properties=["title", "NmF%3F", "%3C~w%5C"], always_sweep=False),
+    # Stations / Habitats / Substrats / Projets : pas de filter_properties — les
+    # property IDs Notion changent quand la colonne est recréée. Robustesse > perf
+    # sur ces petites BDs.
+    _MapSource("stations", "Stations", _parse_stations, ("station_map", "station_names")),
+    _MapSource("habitats", "Habitats", _parse_habitats, ("habitat_codes", "habitat_names")),
+    _MapSource("substrats", "Substrats", _parse_substrats, ("substrat_codes", "substrat_names")),
+    # Property IDs : title (Nom latin), hNJw (code_plante),
+    #                oZxm (nom_vernaculaire_fr), %3AUtU (nom_vernaculaire_en),
+    #                %5Esso (synonymes_fr — séparés par , ou ;)
+    _MapSource("vegetation", "Végétation", _parse_vegetation,
+               ("vegetation_map", "vegetation_code_map", "vegetation_fr_map",
+                "vegetation_en_map", "vegetation_code_names"),
+               filter_properties=["title", "hNJw", "oZxm", "%3AUtU", "%5Esso"], always_sweep=False),
+    _MapSource("projets", "Projets", _parse_projets, ("projet_map", "projet_names")),
+)
+
+
+def _empty_maps() -> dict:
+    maps: dict = {k: {} for src in _MAP_SOURCES for k in src.map_keys}
+    maps["_errors"] = []
+    return maps
+
+
+# Numéro de version des jeux de maps du processus (jamais réutilisé).
+_MAPS_VERSIONS = itertools.count(1)
 
-def build_lookup_maps(token: str, db_ids: dict | None = None) -> dict:
+
+def _finalize_maps(maps: dict) -> dict:
+    """Ajoute (en place) les structures dérivées des maps brutes.
+
+    Clés préfixées `_` : non écrites dans le snapshot, recalculées à chaque
+    chargement / rafraîchissement.
+      - `_plant_trie` : trie des noms de plantes pour le texte libre.
+      - `_species_index` : index de résolution des espèces (`SpeciesIndex`).
+      - `_version` : numéro unique de ce jeu de maps, pour les caches qui
+        en dépendent (contrairement à `id()`, jamais réutilisé).
+    """
+    maps["_plant_trie"] = build_plant_trie(
+        maps.get("vegetation_map"), maps.get("vegetation_fr_map"), maps.get("vegetation_en_map"),
+    )
+    maps["_species_index"] = SpeciesIndex(maps.get("species_map"), maps.get("old_names_map"))
+    maps["_version"] = next(_MAPS_VERSIONS)
+    return maps
+
+
+def _notion_timestamp(ts: float) -> str:
+    """Horodatage ISO 8601 UTC au format des filtres `last_edited_time` de Notion."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ts))
+
+
+# Notion arrondit `last_edited_time` à la minute : on recule le point de
+# reprise d'autant (re-lire une page déjà vue est sans effet).
+_SYNC_OVERLAP_SECONDS = 120
+# Au-delà, le rafraîchissement incrémental balaie aussi Mycoliste et
+# Végétation (pages archivées / supprimées) — cf. `refresh_lookup_maps`.
+FULL_SWEEP_INTERVAL = 24 * 3600
+
+
+def _load_source(token: str, db_ids: dict, src: _MapSource) -> dict:
+    db_id = db_ids.get(src.key)
+    if not db_id:
+        return {"error": f"{src.label}: ID manquant en config (clé `{src.key}_db_id`)"}
+    print(f"[Notion] Chargement de {src.label} ({db_id})...")
+    start_t = time.time()
+    try:
+        # Les parseurs consomment les pages au fil de la pagination.
+        res = src.parse(_iter_pages(token, db_id, filter_properties=src.filter_properties))
+        counts = ", ".join(f"{k}={len(v)}" for k, v in res.items())
+        print(f"[Notion] {src.label} chargé(e) : {counts} en {time.time()-start_t:.1f}s")
+        return res
+    except Exception as e:
+        print(f"[Notion] Erreur {src.label}: {e}")
+        return {"error": f"{src.label}: {e}"}
+
+
+def build_lookup_maps(token: str, db_ids: dict | None = None, snapshot_path: str | None = None) -> dict:
     """
     Charge les maps de résolution depuis Notion en parallèle.
 
@@ -270,272 +419,257 @@ def build_lookup_maps(token: str, db_ids: dict | None = None) -> dict:
             'mycoliste', 'stations', 'habitats', 'substrats', 'vegetation',
             'projets'. Chargé par l'appelant depuis la config — voir le
             commentaire en haut du module pour le format.
+        snapshot_path : si fourni, les maps sont écrites sur disque à la fin
+            (voir `save_maps_snapshot`) — uniquement si aucune BD n'a échoué.
 
     Si `db_ids` est None/vide, retourne un dict avec uniquement des maps vides
     et un message dans `_errors` (n'aboie pas, ne crash pas).
+
+    `_synced_at` (timestamp) marque le début du chargement : point de reprise
+    de `refresh_lookup_maps`. Il n'est posé que si toutes les BDs ont été
+    chargées : une BD en échec (restée vide) est ainsi rechargée en entier au
+    prochain rafraîchissement, au lieu de ne recevoir que des deltas.
+    `_full_swept_at` : même instant (un chargement complet vaut un balayage).
     """
+    maps = _empty_maps()
     if not db_ids:
-        return {
-            "species_map": {},
-            "taxon_id_map": {},
-            "old_names_map": {},
-            "station_map": {},
-            "habitat_codes": {},
-            "substrat_codes": {},
-            "vegetation_map": {},
-            "vegetation_code_map": {},
-            "vegetation_fr_map": {},
-            "vegetation_en_map": {},
-            "projet_map": {},
-            "station_names": {},
-            "habitat_names": {},
-            "substrat_names": {},
-            "projet_names": {},
-            "vegetation_code_names": {},
-            "_errors": ["Configuration manquante : db_ids vide. Vérifie ton secrets.toml."],
-        }
-
-    maps: dict = {
-        "species_map": {},
-        "taxon_id_map": {},
-        "old_names_map": {},
-        "station_map": {},
-        "habitat_codes": {},
-        "substrat_codes": {},
-        "vegetation_map": {},          # Nom latin (rétrocompat #Latin_name)
-        "vegetation_code_map": {},     # code_plante (@CODE et @@CODE)
-        "vegetation_fr_map": {},       # nom_vernaculaire_fr (bare-text)
-        "vegetation_en_map": {},       # nom_vernaculaire_en (bare-text)
-        "projet_map": {},
-        # Noms lisibles {CODE: nom} — additif, pour le référentiel de codes in-app.
-        "station_names": {},
-        "habitat_names": {},
-        "substrat_names": {},
-        "projet_names": {},
-        "vegetation_code_names": {},
-        "_errors": []
+        maps["_errors"].append("Configuration manquante : db_ids vide. Vérifie ton secrets.toml.")
+        return maps
+
+    started_at = time.time()
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(_load_source, token, db_ids, src) for src in _MAP_SOURCES]
+        for fut in as_completed(futures):
+            res = fut.result()
+            if "error" in res:
+                maps["_errors"].append(res["error"])
+            else:
+                maps.update(res)
+    if not maps["_errors"]:
+        maps["_synced_at"] = maps["_full_swept_at"] = started_at
+    _finalize_maps(maps)
+
+    if snapshot_path and not maps["_errors"]:
+        save_maps_snapshot(maps, snapshot_path, db_ids)
+
+    return maps
+
+
+def _refresh_source(token: str, db_ids: dict, src: _MapSource, maps: dict, since: str, sweep: bool) -> dict:
+    """Delta d'une BD : pages modifiées depuis `since` (+ suppressions si `sweep`).
+
+    Retourne les maps de la BD mises à jour, ou {"error": ...}.
+    """
+    db_id = db_ids.get(src.key)
+    if not db_id:
+        return {"error": f"{src.label}: ID manquant en config (clé `{src.key}_db_id`)"}
+    try:
+        edited = _query_db_all(
+            token, db_id, filter_properties=src.filter_properties,
+            body={"filter": {"timestamp": "last_edited_time",
+                             "last_edited_time": {"on_or_after": since}}},
+        )
+        stale = {p["id"] for p in edited}
+        if sweep:
+            # Les pages archivées / supprimées n'apparaissent plus dans les
+            # requêtes : tout ID connu absent de la liste courante est retiré.
+            live = {p["id"] for p in _iter_pages(token, db_id, filter_properties=["title"])}
+            known = {pid for k in src.map_keys for pid in maps.get(k, {}).values()}
+            stale |= known - live
+        if not stale:
+            return {k: maps.get(k, {}) for k in src.map_keys}
+
+        fresh = src.parse(edited)
+        merged = {}
+        for k in src.map_keys:
+            m = {key: pid for key, pid in maps.get(k, {}).items() if pid not in stale}
+            m.update(fresh.get(k, {}))
+            merged[k] = m
+        print(f"[Notion] {src.label} : {len(edited)} page(s) modifiée(s), "
+              f"{len(stale) - len(edited)} retirée(s)")
+        return merged
+    except Exception as e:
+        print(f"[Notion] Erreur rafraîchissement {src.label}: {e}")
+        return {"error": f"{src.label}: {e}"}
+
+
+def refresh_lookup_maps(
+    token: str,
+    maps: dict | None,
+    db_ids: dict | None = None,
+    full_sweep: bool = False,
+    snapshot_path: str | None = None,
+) -> dict:
+    """
+    Rafraîchissement incrémental des maps : ne lit que les pages dont
+    `last_edited_time` est postérieur au dernier `_synced_at`.
+
+    Quelques requêtes au lieu d'une pagination complète de chaque BD. Les
+    suppressions/archivages sont détectés par une liste titre-seul des petites
+    BDs (Stations, Habitats, Substrats, Projets) ; pour Mycoliste et
+    Végétation, si `full_sweep=True` ou si le dernier balayage complet
+    (`_full_swept_at`) date de plus de `FULL_SWEEP_INTERVAL`.
+
+    `maps` n'est pas muté. Sans `_synced_at` exploitable (maps absentes ou
+    construites avant cette fonctionnalité) → `build_lookup_maps` complet.
+    Une BD en erreur garde ses maps précédentes et `_synced_at` n'avance pas
+    (le delta sera relu au prochain appel).
+    """
+    if not maps or not maps.get("_synced_at") or not db_ids:
+        return build_lookup_maps(token, db_ids=db_ids, snapshot_path=snapshot_path)
+
+    started_at = time.time()
+    full_sweep = full_sweep or started_at - (maps.get("_full_swept_at") or 0.0) > FULL_SWEEP_INTERVAL
+    since = _notion_timestamp(maps["_synced_at"] - _SYNC_OVERLAP_SECONDS)
+    new_maps = {k: v for k, v in maps.items() if not k.startswith("_")}
+    new_maps["_errors"] = []
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [
+            executor.submit(_refresh_source, token, db_ids, src, maps, since,
+                            full_sweep or src.always_sweep)
+            for src in _MAP_SOURCES
+        ]
+        for fut in as_completed(futures):
+            res = fut.result()
+            if "error" in res:
+                new_maps["_errors"].append(res["error"])
+            else:
+                new_maps.update(res)
+    new_maps["_synced_at"] = maps["_synced_at"] if new_maps["_errors"] else started_at
+    if full_sweep and not new_maps["_errors"]:
+        new_maps["_full_swept_at"] = started_at
+    elif maps.get("_full_swept_at"):
+        new_maps["_full_swept_at"] = maps["_full_swept_at"]
+    _finalize_maps(new_maps)
+
+    if snapshot_path and not new_maps["_errors"]:
+        save_maps_snapshot(new_maps, snapshot_path, db_ids)
+
+    return new_maps
+
+
+# ---------------------------------------------------------------------------
+# 1b. Snapshot disque des maps (démarrage à chaud)
+# ---------------------------------------------------------------------------
+#
+# Reconstruire les maps depuis Notion prend 1-2 min (pagination de Mycoliste).
+# Après un redéploiement ou un redémarrage du conteneur, on recharge donc le
+# dernier snapshot (JSON gzippé, quelques centaines de Ko) en quelques ms, puis
+# on le remplace en arrière-plan par une version fraîche.
+#
+# Le snapshot est invalidé si son format (`SNAPSHOT_VERSION`) ou la config des
+# BDs (`db_ids`) a changé — on ne résout jamais contre le workspace d'un autre.
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = os.path.join(".cache", "enricher_maps.json.gz")
+
+# Maps dont les clés ne sont pas des chaînes (JSON les convertit en str).
+_INT_KEYED_MAPS = ("taxon_id_map",)
+
+
+def _db_ids_fingerprint(db_ids: dict | None) -> str:
+    raw = json.dumps(sorted((db_ids or {}).items()))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def save_maps_snapshot(maps: dict, path: str, db_ids: dict | None = None) -> bool:
+    """Écrit `maps` dans `path` (JSON gzippé, écriture atomique).
+
+    Les clés préfixées `_` (erreurs, métadonnées) ne sont pas sauvegardées,
+    sauf `_synced_at` (point de reprise de `refresh_lookup_maps`) et
+    `_full_swept_at` (dernier balayage complet).
+    Retourne False (sans lever) si l'écriture échoue.
+    """
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "db_ids": _db_ids_fingerprint(db_ids),
+        "saved_at": time.time(),
+        "synced_at": maps.get("_synced_at"),
+        "full_swept_at": maps.get("_full_swept_at"),
+        "maps": {k: v for k, v in maps.items() if not k.startswith("_")},
     }
+    tmp = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"[Notion] Snapshot des maps non écrit ({path}) : {e}")
+        return False
+
+
+def load_maps_snapshot(path: str, db_ids: dict | None = None) -> dict | None:
+    """Relit un snapshot écrit par `save_maps_snapshot`.
+
+    Retourne None si le fichier est absent, illisible, d'une autre version ou
+    construit pour d'autres `db_ids`. Sinon, retourne les maps avec
+    `_errors` vide, `_snapshot_saved_at` (timestamp de l'écriture) et
+    `_synced_at` / `_full_swept_at` s'ils avaient été enregistrés.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[Notion] Snapshot des maps illisible ({path}) : {e}")
+        return None
 
-    def _load_mycoliste(session):
-        db_id = db_ids.get("mycoliste")
-        if not db_id:
-            return {"error": "Mycoliste: ID manquant en config (clé `mycoliste_db_id`)"}
-        print(f"[Notion] Chargement de Mycoliste ({db_id})...")
-        start_t = time.time()
-        try:
-            # Optimisation : Mycoliste contient 4700+ taxons et est chargée à chaque session
-            # (cache 1h). Récupérer toutes les propriétés ferait ~10× la bande passante pour
-            # 50+ colonnes morphologiques inutilisées par enricher. On filtre donc sur 3 IDs :
-            #   - title    : Nom Latin
-            #   - NmF%3F   : Inat Taxon ID (= `NmF?` décodé)
-            #   - %3C~w%5C : Ancien(s) Nom (= `<~w\` décodé)
-            # Si Notion recycle ces IDs → _query_db_all fait automatiquement un fallback
-            # sans filter_properties (cf. signature de _query_db_all).
-            props_to_fetch = ["title", "NmF%3F", "%3C~w%5C"]
-            pages = _query_db_all(token, db_id, session=session, filter_properties=props_to_fetch)
-            s_map, t_map, o_map = {}, {}, {}
-            for p in pages:
-                pid = p["id"]
-                props = p["properties"]
-                name = _get_title(props)
-                if name: s_map[_normalize(name)] = pid
-                tid = extract_taxon_id_from_props(props)
-                if tid is not None: t_map[tid] = pid
-                old_name_raw = _get_rich_text(props.get("Ancien(s) Nom", {}))
-                if old_name_raw:
-                    for part in re.split(r"[,;]", old_name_raw):
-                        part = part.strip()
-                        if part: o_map[_normalize(part)] = pid
-            print(f"[Notion] Mycoliste chargée : {len(s_map)} taxons en {time.time()-start_t:.1f}s")
-            return {"species_map": s_map, "taxon_id_map": t_map, "old_names_map": o_map}
-        except Exception as e:
-            print(f"[Notion] Erreur Mycoliste: {e}")
-            return {"error": f"Mycoliste: {e}"}
-
-    def _load_stations(session):
-        db_id = db_ids.get("stations")
-        if not db_id:
-            return {"error": "Stations: ID manquant en config (clé `stations_db_id`)"}
-        print("[Notion] Chargement des Stations...")
-        start_t = time.time()
-        try:
-            # Pas de filter_properties : les property IDs Notion changent quand
-            # la colonne est recréée. Robustesse > perf sur cette petite BD.
-            pages = _query_db_all(token, db_id, session=session)
-            st_map = {}
-            st_names = {}
-            for p in pages:
-                props = p["properties"]
-                title = _get_title(props)
-                code = _get_rich_text(props.get("Code de la station", {}))
-                if not code:
-                    code = title.split()[0] if title else ""
-                if code:
-                    st_map[code.upper()] = p["id"]
-                    st_names[code.upper()] = title or code
-            print(f"[Notion] Stations chargées : {len(st_map)} en {time.time()-start_t:.1f}s")
-            return {"station_map": st_map, "station_names": st_names}
-        except Exception as e:
-            print(f"[Notion] Erreur Stations: {e}")
-            return {"error": f"Stations: {e}"}
-
-    def _load_habitats(session):
-        db_id = db_ids.get("habitats")
-        if not db_id:
-            return {"error": "Habitats: ID manquant en config (clé `habitats_db_id`)"}
-        print("[Notion] Chargement des Habitats...")
-        start_t = time.time()
-        try:
-            # Pas de filter_properties : robustesse face aux changements d'ID Notion.
-            pages = _query_db_all(token, db_id, session=session)
-            h_map = {}
-            h_names = {}
-            for p in pages:
-                props = p["properties"]
-                code = _get_rich_text(props.get("Code terrain", {}))
-                if code:
-                    h_map[code.upper()] = p["id"]
-                    h_names[code.upper()] = _get_title(props) or code
-            print(f"[Notion] Habitats chargés : {len(h_map)} en {time.time()-start_t:.1f}s")
-            return {"habitat_codes": h_map, "habitat_names": h_names}
-        except Exception as e:
-            print(f"[Notion] Erreur Habitats: {e}")
-            return {"error": f"Habitats: {e}"}
-
-    def _load_substrats(session):
-        db_id = db_ids.get("substrats")
-        if not db_id:
-            return {"error": "Substrats: ID manquant en config (clé `substrats_db_id`)"}
-        print("[Notion] Chargement des Substrats...")
-        start_t = time.time()
-        try:
-            # Pas de filter_properties : robustesse face aux changements d'ID Notion.
-            pages = _query_db_all(token, db_id, session=session)
-            su_map = {}
-            su_names = {}
-            for p in pages:
-                props = p["properties"]
-                code = _get_rich_text(props.get("Code terrain", {}))
-                if code:
-                    su_map[code.upper()] = p["id"]
-                    su_names[code.upper()] = _get_title(props) or code
-            print(f"[Notion] Substrats chargés : {len(su_map)} en {time.time()-start_t:.1f}s")
-            return {"substrat_codes": su_map, "substrat_names": su_names}
-        except Exception as e:
-            print(f"[Notion] Erreur Substrats: {e}")
-            return {"error": f"Substrats: {e}"}
-
-    def _load_vegetation(session):
-        db_id = db_ids.get("vegetation")
-        if not db_id:
-            return {"error": "Végétation: ID manquant en config (clé `vegetation_db_id`)"}
-        print("[Notion] Chargement de la Végétation...")
-        start_t = time.time()
-        try:
-            # Property IDs : title (Nom latin), hNJw (code_plante),
-            #                oZxm (nom_vernaculaire_fr), %3AUtU (nom_vernaculaire_en),
-            #                %5Esso (synonymes_fr — séparés par , ou ;)
-            pages = _query_db_all(
-                token, db_id, session=session,
-                filter_properties=["title", "hNJw", "oZxm", "%3AUtU", "%5Esso"],
-            )
-            v_latin, v_code, v_fr, v_en = {}, {}, {}, {}
-            v_code_names = {}
-            for p in pages:
-                props = p["properties"]
-                pid = p["id"]
-                # Nom latin (title)
-                latin = _get_title(props)
-                if latin:
-                    v_latin[_normalize(latin)] = pid
-                # code_plante (rich_text) — clé en majuscules pour comparaison @CODE
-                code = _get_rich_text(props.get("code_plante", {}))
-                if code:
-                    v_code[code.upper()] = pid
-                    # Toujours peupler le nom (repli sur le code si pas de latin)
-                    # pour ne pas afficher un nom vide dans le référentiel.
-                    v_code_names[code.upper()] = latin or code
-                # nom_vernaculaire_fr — peut contenir plusieurs noms séparés par ; ou ,
-                fr_raw = _get_rich_text(props.get("nom_vernaculaire_fr", {}))
-                if fr_raw:
-                    for part in re.split(r"[,;]", fr_raw):
-                        part = part.strip()
-                        if part:
-                            v_fr[_normalize(part)] = pid
-                # nom_vernaculaire_en — idem
-                en_raw = _get_rich_text(props.get("nom_vernaculaire_en", {}))
-                if en_raw:
-                    for part in re.split(r"[,;]", en_raw):
-                        part = part.strip()
-                        if part:
-                            v_en[_normalize(part)] = pid
-                # synonymes_fr — alimente la même map fr (priorité au nom canonique
-                # déjà inséré, mais on overwrite si plusieurs synonymes pointent ici —
-                # acceptable car un synonyme unique pointe vers une seule espèce)
-                syn_raw = _get_rich_text(props.get("synonymes_fr", {}))
-                if syn_raw:
-                    for part in re.split(r"[,;]", syn_raw):
-                        part = part.strip()
-                        if part:
-                            v_fr[_normalize(part)] = pid
-            print(
-                f"[Notion] Végétation chargée : {len(v_latin)} latins, "
-                f"{len(v_code)} codes, {len(v_fr)} fr, {len(v_en)} en "
-                f"en {time.time()-start_t:.1f}s"
-            )
-            return {
-                "vegetation_map": v_latin,
-                "vegetation_code_map": v_code,
-                "vegetation_fr_map": v_fr,
-                "vegetation_en_map": v_en,
-                "vegetation_code_names": v_code_names,
-            }
-        except Exception as e:
-            print(f"[Notion] Erreur Végétation: {e}")
-            return {"error": f"Végétation: {e}"}
-
-    def _load_projets(session):
-        db_id = db_ids.get("projets")
-        if not db_id:
-            return {"error": "Projets: ID manquant en config (clé `projets_db_id`)"}
-        print("[Notion] Chargement des Projets d'inventaire...")
-        start_t = time.time()
+    if not isinstance(payload, dict) or payload.get("version") != SNAPSHOT_VERSION:
+        return None
+    if payload.get("db_ids") != _db_ids_fingerprint(db_ids):
+        return None
+
+    maps = dict(payload.get("maps") or {})
+    for key in _INT_KEYED_MAPS:
+        if key in maps:
+            maps[key] = {int(k): v for k, v in maps[key].items()}
+    maps["_errors"] = []
+    maps["_snapshot_saved_at"] = payload.get("saved_at", 0.0)
+    if payload.get("synced_at"):
+        maps["_synced_at"] = payload["synced_at"]
+    if payload.get("full_swept_at"):
+        maps["_full_swept_at"] = payload["full_swept_at"]
+    return _finalize_maps(maps)
+
+
+_refresh_lock = threading.Lock()
+
+
+def refresh_maps_snapshot_async(
+    token: str,
+    db_ids: dict | None,
+    snapshot_path: str,
+    on_done=None,
+    base_maps: dict | None = None,
+) -> threading.Thread | None:
+    """Met à jour les maps depuis Notion dans un thread (daemon) et réécrit le snapshot.
+
+    Avec `base_maps` (ex. le snapshot tout juste chargé) : delta incrémental
+    via `refresh_lookup_maps` ; sinon reconstruction complète.
+
+    Un seul rafraîchissement à la fois pour tout le processus : retourne None
+    si un autre est déjà en cours. `on_done(maps)` est appelé à la fin
+    (typiquement pour vider le cache Streamlit).
+    """
+    if not _refresh_lock.acquire(blocking=False):
+        return None
+
+    def _run():
         try:
-            pages = _query_db_all(token, db_id, session=session)
-            p_map = {}
-            p_names = {}
-            for p in pages:
-                props = p["properties"]
-                # Champ "Code" : acronyme officiel (ex: FSL, RNFCT, LT)
-                code = _get_rich_text(props.get("Code", {}))
-                if code:
-                    p_map[code.upper()] = p["id"]
-                    p_names[code.upper()] = _get_title(props) or code
-            print(f"[Notion] Projets chargés : {len(p_map)} en {time.time()-start_t:.1f}s")
-            return {"projet_map": p_map, "projet_names": p_names}
+            maps = refresh_lookup_maps(token, base_maps, db_ids=db_ids, snapshot_path=snapshot_path)
+            if on_done is not None:
+                on_done(maps)
         except Exception as e:
-            print(f"[Notion] Erreur Projets: {e}")
-            return {"error": f"Projets: {e}"}
-
-    with requests.Session() as session:
-        tasks = [
-            _load_mycoliste,
-            _load_stations,
-            _load_habitats,
-            _load_substrats,
-            _load_vegetation,
-            _load_projets,
-        ]
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(t, session) for t in tasks]
-            for fut in as_completed(futures):
-                res = fut.result()
-                if "error" in res:
-                    maps["_errors"].append(res["error"])
-                else:
-                    maps.update(res)
+            print(f"[Notion] Rafraîchissement des maps en arrière-plan échoué : {e}")
+        finally:
+            _refresh_lock.release()
 
-    return maps
+    thread = threading.Thread(target=_run, name="enricher-maps-refresh", daemon=True)
+    thread.start()
+    return thread
 
 
 # ---------------------------------------------------------------------------
@@ -560,45 +694,117 @@ def _strip_punct(token: str) -> str:
     return _PUNCT_RE.sub("", token)
 
 
-def _scan_bare_plant_names(
-    bare_tokens: list[str],
-    latin_map: dict,
-    fr_map: dict,
-    en_map: dict,
-    max_ngram: int = 4,
-) -> list[str]:
+# Clé terminale d'un nœud du trie : aucun token normalisé n'est vide.
+_TRIE_END = ""
+
+
+def build_plant_trie(latin_map: dict | None, fr_map: dict | None, en_map: dict | None) -> dict:
+    """
+    Compile les noms de plantes (latin/fr/en) en un trie au niveau des mots :
+    {"bouleau": {"jaune": {"": page_id}}, …}.
+
+    À construire une fois par jeu de maps (cf. `_finalize_maps`) : le scan du
+    texte libre devient alors une seule passe linéaire, sans limite sur le
+    nombre de mots d'un nom. En cas de collision, latin > fr > en (même
+    priorité que l'ancien lookup en cascade).
+    """
+    trie: dict = {}
+    for names in (en_map, fr_map, latin_map):
+        for name, pid in (names or {}).items():
+            words = name.split()
+            if not words:
+                continue
+            node = trie
+            for w in words:
+                node = node.setdefault(w, {})
+            node[_TRIE_END] = pid
+    return trie
+
+
+def _scan_bare_plant_names(bare_tokens: list[str], plant_trie: dict) -> list[str]:
     """
-    Scan greedy longest-first des noms de plantes (latin/fr/en) dans une liste
-    de tokens texte libre. Match exact requis contre la BD.
+    Scan leftmost-longest des noms de plantes dans une liste de tokens texte
+    libre, en une passe sur le trie de `build_plant_trie`. Match exact requis
+    contre la BD.
 
     Retourne une liste de page_ids uniques (ordre de première occurrence).
     """
-    if not bare_tokens or not (latin_map or fr_map or en_map):
+    if not bare_tokens or not plant_trie:
         return []
 
+    words = [_normalize(t) for t in bare_tokens]
+    n_tokens = len(words)
     matched_ids: list[str] = []
-    consumed = [False] * len(bare_tokens)
-    n_tokens = len(bare_tokens)
-
-    # Greedy : du n-gramme le plus long au plus court
-    for n in range(min(max_ngram, n_tokens), 0, -1):
-        for i in range(n_tokens - n + 1):
-            if any(consumed[j] for j in range(i, i + n)):
-                continue
-            phrase = " ".join(bare_tokens[i:i + n])
-            key = _normalize(phrase)
-            if not key:
-                continue
-            pid = latin_map.get(key) or fr_map.get(key) or en_map.get(key)
-            if pid:
-                if pid not in matched_ids:
-                    matched_ids.append(pid)
-                for j in range(i, i + n):
-                    consumed[j] = True
+    i = 0
+    while i < n_tokens:
+        node = plant_trie
+        best_end, best_pid = 0, None
+        j = i
+        while j < n_tokens:
+            node = node.get(words[j])
+            if node is None:
+                break
+            j += 1
+            if _TRIE_END in node:
+                best_end, best_pid = j, node[_TRIE_END]
+        if best_pid is None:
+            i += 1
+            continue
+        if best_pid not in matched_ids:
+            matched_ids.append(best_pid)
+        i = best_end
 
     return matched_ids
 
 
+# Préfixe → type de token. `##` est testé AVANT `#` (ordre de l'alternance).
+_TOKEN_PREFIX_RE = re.compile(r"^(##|[*!$#@])?(.*)$", re.DOTALL)
+_PREFIX_KINDS = {
+    "*": "station",
+    "##": "hote",
+    "!": "habitat",
+    "$": "substrat",
+    "#": "plante",
+    "@": "at",
+}
+
+
+@lru_cache(maxsize=8192)
+def tokenize_description(description: str) -> tuple:
+    """
+    Découpe une description en tokens classés, UNE fois pour le résolveur
+    (`parse_description_codes`) et le linter (`lint_description_codes`).
+
+    Retourne un tuple de `(raw, kind, value)` :
+      - kind ∈ station | coll | hote | habitat | substrat | plante | at | bare
+      - value : code en majuscules sans ponctuation (préfixés), token nettoyé
+        (`bare`), token brut (`at`).
+    `*coll` / `#coll` → kind `coll`. Un préfixe seul (`*`, `!.`) est ignoré.
+
+    Mémoïsé par description (les reruns Streamlit re-lintent chaque ligne) :
+    le résultat est immuable, ne pas le muter.
+    """
+    tokens = []
+    for raw in description.split():
+        prefix, rest = _TOKEN_PREFIX_RE.match(raw).groups()
+        if prefix is None:
+            cleaned = _strip_punct(raw)
+            if cleaned:
+                tokens.append((raw, "bare", cleaned))
+            continue
+        kind = _PREFIX_KINDS[prefix]
+        if kind == "at":
+            tokens.append((raw, "at", raw))
+            continue
+        code = _strip_punct(rest).upper()
+        if not code:
+            continue
+        if code == "COLL" and kind in ("station", "plante"):
+            kind = "coll"
+        tokens.append((raw, kind, code))
+    return tuple(tokens)
+
+
 def parse_description_codes(
     description: str,
     station_map: dict,
@@ -609,6 +815,7 @@ def parse_description_codes(
     vegetation_code_map: dict | None = None,
     vegetation_fr_map: dict | None = None,
     vegetation_en_map: dict | None = None,
+    plant_trie: dict | None = None,
 ) -> dict:
     """
     Extrait les codes terrain depuis Description rapide selon la convention :
@@ -627,7 +834,10 @@ def parse_description_codes(
     du bruit et peut lier l'observation au mauvais compte.
 
     Insensible à la casse pour les codes préfixés. Le texte libre est scanné
-    en greedy longest-first jusqu'à 4 mots consécutifs.
+    en leftmost-longest (nom le plus long à chaque position, sans limite de
+    mots) via `plant_trie` — compilé à la volée depuis les 3 maps de
+    végétation s'il n'est pas fourni (passer `maps["_plant_trie"]` pour
+    éviter ce coût à chaque appel).
 
     Retourne :
       {
@@ -663,81 +873,59 @@ def parse_description_codes(
 
     bare_tokens: list[str] = []
 
-    for raw in description.split():
-        if not raw:
-            continue
+    def _add(key, pid):
+        if pid not in result[key]:
+            result[key].append(pid)
+
+    for _raw, kind, code in tokenize_description(description):
+        # *coll / #coll → Fongarium. Cas spécial : *coll est accepté comme
+        # SYNONYME de #coll — certains membres tapent * au lieu de #.
+        if kind == "coll":
+            result["has_coll"] = True
+
         # *XXX → Station d'inventaire (+ Projet déduit du préfixe alpha).
-        # Cas spécial : *coll est accepté comme SYNONYME de #coll (Fongarium) —
-        # certains membres tapent * au lieu de #. On tolère les deux.
-        if raw.startswith("*"):
-            code = _strip_punct(raw[1:]).upper()
-            if code == "COLL":
-                result["has_coll"] = True
-            elif code and code in station_map:
+        elif kind == "station":
+            if code in station_map:
                 result["station_code"] = code
                 result["projet_page_id"] = None
                 if projet_map:
                     prefix = _extract_station_prefix(code)
                     if prefix and prefix in projet_map:
                         result["projet_page_id"] = projet_map[prefix]
-            continue
 
-        # ##XXX → Hôte - substrat (lookup via code_plante) — tester AVANT #
-        if raw.startswith("##"):
-            code = _strip_punct(raw[2:]).upper()
-            if code and code in vegetation_code_map:
-                pid = vegetation_code_map[code]
-                if pid not in result["hote_substrat_page_ids"]:
-                    result["hote_substrat_page_ids"].append(pid)
-            continue
+        # ##XXX → Hôte - substrat (lookup via code_plante)
+        elif kind == "hote":
+            if code in vegetation_code_map:
+                _add("hote_substrat_page_ids", vegetation_code_map[code])
 
         # !CODE → Habitat général
-        if raw.startswith("!"):
-            code = _strip_punct(raw[1:]).upper()
-            if code and code in habitat_codes:
-                pid = habitat_codes[code]
-                if pid not in result["habitat_page_ids"]:
-                    result["habitat_page_ids"].append(pid)
-            continue
+        elif kind == "habitat":
+            if code in habitat_codes:
+                _add("habitat_page_ids", habitat_codes[code])
 
         # $CODE → Substrat
-        if raw.startswith("$"):
-            code = _strip_punct(raw[1:]).upper()
-            if code and code in substrat_codes:
-                pid = substrat_codes[code]
-                if pid not in result["substrat_page_ids"]:
-                    result["substrat_page_ids"].append(pid)
-            continue
+        elif kind == "substrat":
+            if code in substrat_codes:
+                _add("substrat_page_ids", substrat_codes[code])
 
-        # #XXX → Fongarium (#coll) ou Végétation (code_plante puis rétrocompat latin)
-        if raw.startswith("#"):
-            code = _strip_punct(raw[1:]).upper()
-            if not code:
-                continue
-            if code == "COLL":
-                result["has_coll"] = True
-            elif code in vegetation_code_map:
-                pid = vegetation_code_map[code]
-                if pid not in result["vegetation_page_ids"]:
-                    result["vegetation_page_ids"].append(pid)
+        # #XXX → Végétation (code_plante puis rétrocompat latin)
+        elif kind == "plante":
+            if code in vegetation_code_map:
+                _add("vegetation_page_ids", vegetation_code_map[code])
             else:
                 # Rétrocompat : #Acer_saccharum → match nom latin
                 latin_key = code.replace("_", " ").lower()
                 if latin_key in vegetation_map:
-                    pid = vegetation_map[latin_key]
-                    if pid not in result["vegetation_page_ids"]:
-                        result["vegetation_page_ids"].append(pid)
-            continue
+                    _add("vegetation_page_ids", vegetation_map[latin_key])
 
         # Aucun préfixe → texte libre, candidat au matching de nom de plante
-        cleaned = _strip_punct(raw)
-        if cleaned:
-            bare_tokens.append(cleaned)
+        elif kind == "bare":
+            bare_tokens.append(code)
 
-    # Scan greedy du texte libre pour les noms de plantes (latin/fr/en)
-    bare_matches = _scan_bare_plant_names(
-        bare_tokens, vegetation_map, vegetation_fr_map, vegetation_en_map
-    )
+    # Scan du texte libre pour les noms de plantes (latin/fr/en)
+    if plant_trie is None and bare_tokens:
+        plant_trie = build_plant_trie(vegetation_map, vegetation_fr_map, vegetation_en_map)
+    bare_matches = _scan_bare_plant_names(bare_tokens, plant_trie)
     for pid in bare_matches:
         if pid not in result["vegetation_page_ids"]:
             result["vegetation_page_ids"].append(pid)
@@ -799,86 +987,196 @@ def lint_description_codes(description: str, maps: dict | None = None) -> dict:
     def _bad(token, type_):
         result["unrecognized"].append({"token": token, "type": type_})
 
-    for raw in description.split():
-        if not raw:
-            continue
-
+    for raw, kind, code in tokenize_description(description):
         # @ : piège iNat (mention d'utilisateur) — jamais un code valide chez nous
-        if raw.startswith("@"):
+        if kind == "at":
             result["at_warnings"].append(raw)
-            continue
 
-        # * : Station (ou *coll = Fongarium)
-        if raw.startswith("*"):
-            code = _strip_punct(raw[1:]).upper()
-            if not code:
-                continue
-            if code == "COLL":
-                _ok(raw, "fongarium", "Fongarium (collection)")
-            elif code in station_map:
+        # *coll / #coll : Fongarium
+        elif kind == "coll":
+            _ok(raw, "fongarium", "Fongarium (collection)")
+
+        # * : Station
+        elif kind == "station":
+            if code in station_map:
                 _ok(raw, "station", station_names.get(code, code))
             else:
                 _bad(raw, "station")
-            continue
 
-        # ## : Hôte-substrat (tester AVANT #)
-        if raw.startswith("##"):
-            code = _strip_punct(raw[2:]).upper()
-            if not code:
-                continue
+        # ## : Hôte-substrat
+        elif kind == "hote":
             if code in vegetation_code_map:
                 _ok(raw, "hôte-substrat", veg_code_names.get(code, code))
             else:
                 _bad(raw, "hôte-substrat")
-            continue
 
         # ! : Habitat général
-        if raw.startswith("!"):
-            code = _strip_punct(raw[1:]).upper()
-            if not code:
-                continue
+        elif kind == "habitat":
             if code in habitat_codes:
                 _ok(raw, "habitat", habitat_names.get(code, code))
             else:
                 _bad(raw, "habitat")
-            continue
 
         # $ : Substrat
-        if raw.startswith("$"):
-            code = _strip_punct(raw[1:]).upper()
-            if not code:
-                continue
+        elif kind == "substrat":
             if code in substrat_codes:
                 _ok(raw, "substrat", substrat_names.get(code, code))
             else:
                 _bad(raw, "substrat")
-            continue
 
-        # # : Fongarium (#coll) ou Plante (code_plante, puis nom latin rétrocompat)
-        if raw.startswith("#"):
-            code = _strip_punct(raw[1:]).upper()
-            if not code:
-                continue
-            if code == "COLL":
-                _ok(raw, "fongarium", "Fongarium (collection)")
-            elif code in vegetation_code_map:
+        # # : Plante (code_plante, puis nom latin rétrocompat)
+        elif kind == "plante":
+            if code in vegetation_code_map:
                 _ok(raw, "plante", veg_code_names.get(code, code))
             elif code.replace("_", " ").lower() in vegetation_map:
                 _ok(raw, "plante", code.replace("_", " "))
             else:
                 _bad(raw, "plante")
-            continue
 
-        # Sinon : texte libre → non linté (voir docstring).
+        # Sinon (bare) : texte libre → non linté (voir docstring).
 
     result["has_issues"] = bool(result["unrecognized"] or result["at_warnings"])
     return result
 
 
+# Au moins un token préfixé (code ou @) quelque part dans la description.
+_HAS_PREFIXED_TOKEN_RE = r"(?:^|\s)[*!$#@]"
+
+
+def lint_descriptions(descriptions, maps: dict | None = None) -> pd.DataFrame:
+    """Version « colonne entière » de `lint_description_codes` pour l'aperçu d'import.
+
+    - les notes identiques ne sont lintées qu'une fois (`pd.unique`) ;
+    - un filtre vectorisé (`str.contains`) écarte d'emblée les notes sans
+      aucun token préfixé — la majorité — qui n'ont rien à linter ;
+    - les valeurs non-texte (NaN…) comptent comme des notes vides.
+
+    Retourne un DataFrame aligné sur l'index de `descriptions` :
+      n_recognized (int), unrecognized (str, tokens séparés par « , »),
+      at_warnings (str, idem), has_issues (bool).
+    """
+    series = pd.Series(descriptions)
+    texts = series.where(series.map(lambda v: isinstance(v, str)), "")
+
+    uniques = pd.Series(pd.unique(texts), dtype=object)
+    with_codes = uniques[uniques.str.contains(_HAS_PREFIXED_TOKEN_RE, regex=True)]
+
+    summaries = {}
+    for desc in with_codes:
+        r = lint_description_codes(desc, maps)
+        summaries[desc] = (
+            len(r["recognized"]),
+            ", ".join(u["token"] for u in r["unrecognized"]),
+            ", ".join(r["at_warnings"]),
+            r["has_issues"],
+        )
+
+    empty = (0, "", "", False)
+    rows = [summaries.get(desc, empty) for desc in texts]
+    return pd.DataFrame(
+        rows,
+        index=series.index,
+        columns=["n_recognized", "unrecognized", "at_warnings", "has_issues"],
+    ).astype({"n_recognized": int, "has_issues": bool})
+
+
 # ---------------------------------------------------------------------------
 # 3. match_species
 # ---------------------------------------------------------------------------
 
+# Niveau de résolution retenu (affiché dans le journal d'enrichissement).
+TIER_TAXON_ID = "taxon_id"
+TIER_EXACT = "exact"
+TIER_SYNONYM = "synonyme"
+TIER_INFRASPECIFIC = "infraspécifique"
+TIER_GENUS_SPECIES = "genre+espèce"
+
+_QUALIFIERS = ("cf.", "aff.", "sp.", "spp.")
+
+
+@lru_cache(maxsize=16384)
+def _name_variants(taxon_name: str) -> tuple:
+    """Clés normalisées d'un nom iNat, dans l'ordre des niveaux → ((clé, niveau), …).
+
+    'Russula cf. emetica var. x' → (('russula cf. emetica var. x', exact),
+    ('russula cf. emetica', infraspécifique), ('russula emetica', genre+espèce)).
+    Mémorisé : normalisation, regex et découpage ne sont faits qu'une fois par nom.
+    """
+    key = _normalize(taxon_name)
+    variants = [(key, TIER_EXACT)]
+    stripped = _normalize(_strip_infraspecific(taxon_name))
+    if stripped != key:
+        variants.append((stripped, TIER_INFRASPECIFIC))
+    parts = [p for p in stripped.split() if p not in _QUALIFIERS]
+    if len(parts) >= 2:
+        genus_sp = f"{parts[0]} {parts[1]}"
+        if all(genus_sp != v for v, _ in variants):
+            variants.append((genus_sp, TIER_GENUS_SPECIES))
+    return tuple(variants)
+
+
+class SpeciesIndex:
+    """Index de résolution des noms d'espèces, construit une fois par jeu de maps.
+
+    Fusionne `species_map` et `old_names_map` en un seul dict
+    `clé normalisée → (page_id, niveau)` (le nom actuel l'emporte sur un
+    synonyme identique) ; `resolve()` est mémorisé (LRU) par nom brut.
+
+    Picklable (les maps passent par `st.cache_data`) : le cache LRU n'est pas
+    sérialisé, il est recréé vide au chargement.
+    """
+
+    def __init__(self, species_map: dict | None, old_names_map: dict | None = None, cache_size: int = 8192):
+        entries = {key: (pid, TIER_SYNONYM) for key, pid in (old_names_map or {}).items()}
+        entries.update({key: (pid, TIER_EXACT) for key, pid in (species_map or {}).items()})
+        self._entries = entries
+        self._cache_size = cache_size
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def __getstate__(self) -> dict:
+        return {"_entries": self._entries, "_cache_size": self._cache_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self._entries = state["_entries"]
+        self._cache_size = state["_cache_size"]
+        self.resolve = lru_cache(maxsize=self._cache_size)(self._resolve)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _resolve(self, taxon_name: str) -> tuple[str | None, str | None]:
+        """Nom iNat → (page_id, niveau), ou (None, None)."""
+        if not taxon_name:
+            return None, None
+        for i, (variant, tier) in enumerate(_name_variants(taxon_name)):
+            hit = self._entries.get(variant)
+            if hit:
+                # Nom complet : exact ou synonyme selon la source ; variantes :
+                # niveau de la variante (infraspécifique / genre+espèce).
+                return hit[0], hit[1] if i == 0 else tier
+        return None, None
+
+
+def resolve_species(taxon_name: str, maps: dict, taxon_id: int | None = None) -> tuple[str | None, str | None]:
+    """
+    Résolution d'une espèce avec le niveau retenu → (page_id, niveau) ou (None, None).
+
+    Mêmes niveaux que `match_species` ; l'index (`maps["_species_index"]`)
+    est construit par `_finalize_maps` — à défaut (maps assemblées à la main),
+    un index temporaire est construit pour l'appel, sans modifier `maps`
+    (qui peut être un objet en cache partagé).
+    """
+    taxon_id_map = maps.get("taxon_id_map")
+    if taxon_id is not None and taxon_id_map:
+        pid = taxon_id_map.get(int(taxon_id))
+        if pid:
+            return pid, TIER_TAXON_ID
+    index = maps.get("_species_index")
+    if index is None:
+        index = SpeciesIndex(maps.get("species_map"), maps.get("old_names_map"), cache_size=0)
+    return index.resolve(taxon_name)
+
+
 def match_species(
     taxon_name: str,
     species_map: dict,
@@ -895,7 +1193,9 @@ def match_species(
       4. Strip infraspécifique         "Amanita muscaria var. guessowii" → "Amanita muscaria"
       5. Genre + espèce seulement      "Russula cf. emetica" → "Russula emetica"
 
-    Retourne le page_id Notion ou None.
+    Retourne le page_id Notion ou None. Les variantes du nom sont mémorisées
+    (`_name_variants`) ; pour des résolutions en masse avec le niveau retenu,
+    voir `resolve_species` / `SpeciesIndex`.
     """
     # Tier 1 — iNat Taxon ID (le plus fiable, contourne les problèmes de synonymes)
     if taxon_id is not None and taxon_id_map:
@@ -906,31 +1206,13 @@ def match_species(
     if not taxon_name:
         return None
 
-    # Tier 2 — Exact match
-    key = _normalize(taxon_name)
-    if key in species_map:
-        return species_map[key]
-
-    # Tier 3 — Ancien(s) Nom (synonymes)
-    if old_names_map and key in old_names_map:
-        return old_names_map[key]
-
-    # Tier 4 — Strip infraspécifique (var. / subsp. / f.)
-    stripped = _normalize(_strip_infraspecific(taxon_name))
-    if stripped != key:
-        if stripped in species_map:
-            return species_map[stripped]
-        if old_names_map and stripped in old_names_map:
-            return old_names_map[stripped]
-
-    # Tier 5 — Genre + espèce uniquement (filtre cf. / aff. / sp.)
-    parts = [p for p in stripped.split() if p not in ("cf.", "aff.", "sp.", "spp.")]
-    if len(parts) >= 2:
-        genus_sp = f"{parts[0]} {parts[1]}"
-        if genus_sp in species_map:
-            return species_map[genus_sp]
-        if old_names_map and genus_sp in old_names_map:
-            return old_names_map[genus_sp]
+    # Tiers 2-5 — nom complet, puis sans infraspécifique, puis genre + espèce ;
+    # à chaque variante, nom actuel avant ancien(s) nom(s).
+    for variant, _tier in _name_variants(taxon_name):
+        if variant in species_map:
+            return species_map[variant]
+        if old_names_map and variant in old_names_map:
+            return old_names_map[variant]
 
     return None
 
@@ -939,33 +1221,35 @@ def match_species(
 # 4. resolve_and_update_relations
 # ---------------------------------------------------------------------------
 
-def resolve_and_update_relations(
-    page_id: str,
+def _memoized(memo: dict | None, key: tuple, compute):
+    """`compute()` mémorisé dans `memo` sous `key` (sans mémo : appel direct)."""
+    if memo is None:
+        return compute()
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
+
+
+def compute_relation_properties(
     taxon_name: str,
     description: str,
     maps: dict,
-    token: str,
     db_props_schema: dict | None = None,
     taxon_id: int | None = None,
-    session: requests.Session | None = None,
-) -> tuple[bool, str]:
+    memo: dict | None = None,
+) -> tuple[dict, list]:
     """
-    Résout les relations pour une observation Notion et met à jour la page.
+    Calcule les propriétés Notion (relations + checkbox Fongarium) d'une
+    observation, SANS rien écrire.
 
-    Paramètres :
-      page_id         — ID de la page Notion à mettre à jour
-      taxon_name      — Nom scientifique iNat (ex : "Amanita muscaria")
-      description     — Contenu du champ Description rapide (= Notes iNat)
-      maps            — Résultat de build_lookup_maps()
-      token           — Token Notion
-      db_props_schema — Schéma des propriétés Notion (pour détecter le nom exact du checkbox Fongarium)
-      taxon_id        — ID numérique iNat du taxon (obs['taxon']['id']) — match prioritaire
+    `memo` : dict partagé par les observations d'un même lot (mêmes `maps`).
+    `parse_description_codes` et `match_species` n'y sont calculés qu'une
+    fois par description / taxon distinct — 200 pages d'une même station et
+    d'un même taxon = un seul parsing, une seule résolution.
 
-    Retourne (success: bool, message: str).
+    Retourne (props, log) — `props` au format PATCH Notion, `log` la liste des
+    étapes lisibles (« Espèce→… », « Station non trouvée (…) »…).
     """
-    species_map         = maps.get("species_map", {})
-    taxon_id_map        = maps.get("taxon_id_map", {})
-    old_names_map       = maps.get("old_names_map", {})
     station_map         = maps.get("station_map", {})
     habitat_codes       = maps.get("habitat_codes", {})
     substrat_codes      = maps.get("substrat_codes", {})
@@ -975,12 +1259,15 @@ def resolve_and_update_relations(
     vegetation_en_map   = maps.get("vegetation_en_map", {})
     projet_map          = maps.get("projet_map", {})
 
-    parsed = parse_description_codes(
+    parsed = _memoized(memo, ("codes", description), lambda: parse_description_codes(
         description, station_map, habitat_codes, substrat_codes,
         vegetation_map, projet_map,
         vegetation_code_map, vegetation_fr_map, vegetation_en_map,
+        plant_trie=maps.get("_plant_trie"),
+    ))
+    species_id, species_tier = _memoized(
+        memo, ("species", taxon_name, taxon_id), lambda: resolve_species(taxon_name, maps, taxon_id),
     )
-    species_id = match_species(taxon_name, species_map, taxon_id, taxon_id_map, old_names_map)
 
     props: dict = {}
     log: list   = []
@@ -988,7 +1275,8 @@ def resolve_and_update_relations(
     # Espèce
     if species_id:
         props[PROP_ESPECE] = {"relation": [{"id": species_id}]}
-        log.append(f"Espèce→{taxon_name}")
+        tier_note = "" if species_tier in (TIER_TAXON_ID, TIER_EXACT) else f" ({species_tier})"
+        log.append(f"Espèce→{taxon_name}{tier_note}")
     else:
         log.append(f"Espèce non trouvée ({taxon_name})")
 
@@ -1039,10 +1327,85 @@ def resolve_and_update_relations(
         props[PROP_HOTE_SUBSTRAT] = {"relation": [{"id": hid} for hid in parsed["hote_substrat_page_ids"]]}
         log.append(f"Hôte-substrat→{len(parsed['hote_substrat_page_ids'])} lié(s)")
 
+    return props, log
+
+
+def _relation_ids(prop: dict | None) -> set[str]:
+    return {r.get("id", "").replace("-", "") for r in (prop or {}).get("relation") or []}
+
+
+def diff_properties(props: dict, current_props: dict | None) -> dict:
+    """
+    Ne garde de `props` (format PATCH) que les propriétés qui changent par
+    rapport à `current_props` (propriétés de la page telles que renvoyées par
+    Notion). Relations comparées comme ensembles d'IDs (ordre et tirets
+    ignorés) ; checkbox comparées en booléen. Une propriété absente de
+    `current_props` est considérée comme modifiée.
+    """
+    if not current_props:
+        return dict(props)
+    changed = {}
+    for name, value in props.items():
+        current = current_props.get(name)
+        if current is None:
+            changed[name] = value
+        elif "relation" in value:
+            if _relation_ids(value) != _relation_ids(current):
+                changed[name] = value
+        elif "checkbox" in value:
+            if bool(value["checkbox"]) != bool(current.get("checkbox")):
+                changed[name] = value
+        else:
+            changed[name] = value
+    return changed
+
+
+# Message de `resolve_and_update_relations` quand la page est déjà à jour.
+ALREADY_UP_TO_DATE = "Déjà à jour"
+
+
+def resolve_and_update_relations(
+    page_id: str,
+    taxon_name: str,
+    description: str,
+    maps: dict,
+    token: str,
+    db_props_schema: dict | None = None,
+    taxon_id: int | None = None,
+    priority: int = PRIORITY_NORMAL,
+    current_props: dict | None = None,
+) -> tuple[bool, str]:
+    """
+    Résout les relations pour une observation Notion et met à jour la page.
+
+    Paramètres :
+      page_id         — ID de la page Notion à mettre à jour
+      taxon_name      — Nom scientifique iNat (ex : "Amanita muscaria")
+      description     — Contenu du champ Description rapide (= Notes iNat)
+      maps            — Résultat de build_lookup_maps()
+      token           — Token Notion
+      db_props_schema — Schéma des propriétés Notion (pour détecter le nom exact du checkbox Fongarium)
+      taxon_id        — ID numérique iNat du taxon (obs['taxon']['id']) — match prioritaire
+      priority        — classe de priorité `ratelimit` du PATCH (BULK pour batch_resolve)
+      current_props   — propriétés actuelles de la page (si déjà lues) : seules
+                        celles qui changent sont envoyées, et aucun PATCH n'est
+                        fait si rien ne change (→ (False, ALREADY_UP_TO_DATE))
+
+    Retourne (success: bool, message: str).
+    """
+    props, log = compute_relation_properties(
+        taxon_name, description, maps, db_props_schema, taxon_id=taxon_id,
+    )
+
     if not props:
         return False, "Rien à résoudre"
 
-    resp = _notion_patch_with_retry(token, page_id, props, session=session)
+    if current_props is not None:
+        props = diff_properties(props, current_props)
+        if not props:
+            return False, ALREADY_UP_TO_DATE
+
+    resp = _notion_patch_with_retry(token, page_id, props, priority=priority)
     if resp.status_code == 200:
         return True, " | ".join(log)
     return False, f"HTTP {resp.status_code}: {resp.text[:300]}"
@@ -1052,6 +1415,91 @@ def resolve_and_update_relations(
 # 5. batch_resolve — résolution rétroactive sur un lot d'observations Notion
 # ---------------------------------------------------------------------------
 
+# Workers concurrents de batch_resolve. Le débit réel est plafonné par
+# `NOTION_LIMITER` (~3 req/s) : quelques workers suffisent à masquer la latence
+# d'un PATCH (~0,5-1 s) sans faire la queue pour rien.
+BATCH_RESOLVE_WORKERS = 4
+
+
+def plan_relation_update(
+    page: dict, maps: dict, db_props_schema: dict | None = None, memo: dict | None = None,
+) -> tuple[str, dict, str]:
+    """Étape 1 de batch_resolve (calcul seul, aucun appel réseau) : PATCH à
+    envoyer pour une page lue dans la DB → (statut, props, message) ;
+    statut ∈ patch | unchanged | skipped | error.
+
+    Les propriétés de la page sont déjà en mémoire (lecture de la DB) : seuls
+    les champs qui changent sont gardés (`diff_properties`).
+    """
+    page_id = page["id"]
+    props   = page["properties"]
+
+    taxon_name = _get_title(props)
+    desc_prop = props.get("Description rapide", {})
+    description = _get_rich_text(desc_prop)
+    taxon_id = extract_taxon_id_from_props(props)
+
+    if not taxon_name:
+        return "skipped", {}, ""
+
+    try:
+        new_props, log = compute_relation_properties(
+            taxon_name, description, maps, db_props_schema, taxon_id=taxon_id, memo=memo,
+        )
+    except Exception as e:
+        return "error", {}, f"Page {page_id} (Exception): {e}"
+    if not new_props:
+        return "skipped", {}, "Rien à résoudre"
+    changed = diff_properties(new_props, props)
+    if not changed:
+        return "unchanged", {}, ALREADY_UP_TO_DATE
+    return "patch", changed, " | ".join(log)
+
+
+def _write_relation_update(page_id: str, props: dict, message: str, token: str) -> tuple[str, str]:
+    """Étape 2 de batch_resolve : envoie un PATCH précalculé → (statut, message) ;
+    statut ∈ ok | error."""
+    try:
+        resp = _notion_patch_with_retry(token, page_id, props, priority=PRIORITY_BULK)
+    except Exception as e:
+        return "error", f"Page {page_id} (Exception): {e}"
+    if resp.status_code == 200:
+        return "ok", message
+    return "error", f"Page {page_id}: HTTP {resp.status_code}: {resp.text[:300]}"
+
+
+# Propriétés lues par le résolveur (en plus du titre et du checkbox Fongarium).
+_RESOLVER_PROPS = (
+    "Description rapide", PROP_TAXON_ID,
+    PROP_ESPECE, PROP_STATION, PROP_PROJET, PROP_HABITAT,
+    PROP_SUBSTRAT, PROP_VEGETATION, PROP_HOTE_SUBSTRAT,
+)
+
+
+def _resolver_filter_properties(db_props_schema: dict | None) -> list[str] | None:
+    """IDs (déjà encodés, tels que renvoyés par le schéma) des seules propriétés
+    utiles à batch_resolve : titre, Description rapide, Inat Taxon ID, relations
+    et checkbox Fongarium (comparé par le PATCH différentiel).
+
+    None (= toutes les propriétés) si le schéma est inconnu ou sans titre.
+    Un ID devenu obsolète est rattrapé par le fallback 400 de `_iter_query_db`.
+    """
+    if not db_props_schema:
+        return None
+    ids = []
+    for name, spec in db_props_schema.items():
+        wanted = (
+            spec.get("type") == "title"
+            or name in _RESOLVER_PROPS
+            or (spec.get("type") == "checkbox" and "fongarium" in name.lower())
+        )
+        if wanted and spec.get("id"):
+            ids.append(spec["id"])
+    if not any(spec.get("type") == "title" for spec in db_props_schema.values()):
+        return None
+    return ids
+
+
 def batch_resolve(
     token: str,
     obs_db_id: str,
@@ -1059,66 +1507,151 @@ def batch_resolve(
     db_props_schema: dict | None = None,
     filter_unresolved: bool = True,
     progress_callback=None,
+    max_workers: int = BATCH_RESOLVE_WORKERS,
+    cancel_event: threading.Event | None = None,
+    done_page_ids: set | None = None,
 ) -> dict:
     """
     Résout les relations pour toutes les observations d'une DB Notion.
 
-    Si filter_unresolved=True, ne traite que les pages sans relation Espèce.
-    progress_callback(current, total) — appelé après chaque page traitée.
-
-    Retourne { "success": int, "skipped": int, "errors": list[str] }.
+    Si filter_unresolved=True, ne traite que les pages sans relation Espèce
+    (filtre `is_empty` appliqué par Notion). Seules les propriétés utiles au
+    résolveur sont transférées (cf. `_resolver_filter_properties`).
+    progress_callback(current, total) — appelé après chaque page traitée,
+    toujours depuis le thread appelant (compatible widgets Streamlit) ; sans
+    filtre, `total` = pages lues jusqu'ici (il croît avec la lecture).
+
+    Deux étapes par lot — toutes les pages en mode filtré, chaque lot de la
+    requête (≤ 100 pages) sans filtre :
+      1. **Résolution** (CPU seul, tout le lot d'un coup) : chaque page est
+         réduite au PATCH différentiel à envoyer (`plan_relation_update`).
+         Parsing des descriptions et résolution des espèces sont mémorisés
+         par entrée distincte pour tout le traitement. Les pages sans rien à écrire
+         (déjà à jour, sans nom…) sont comptées ici, sans thread.
+      2. **Écriture** : la file des PATCH précalculés est vidée sur
+         `max_workers` threads ; le débit est réglé par l'ordonnanceur partagé
+         (priorité BULK : les lectures interactives passent devant). Au plus
+         2 × `max_workers` PATCH sont en vol : une interruption n'attend que
+         ceux-ci.
+
+    Reprise / annulation :
+      - `cancel_event` (threading.Event) : plus aucune page n'est lancée dès
+        qu'il est levé ; les pages en vol se terminent.
+      - `done_page_ids` : ensemble muté EN PLACE avec chaque page traitée
+        (sauf erreurs, qui seront retentées). Le repasser à l'appel suivant
+        saute ces pages — y compris après une exception côté appelant.
+
+    Retourne { "success": int, "unchanged": int, "skipped": int,
+               "errors": list[str], "total": int, "cancelled": bool }.
+    `unchanged` (inclus dans `skipped`) : pages déjà à jour, non PATCHées.
     """
     success = 0
+    unchanged = 0
     skipped = 0
     errors  = []
-
-    with requests.Session() as session:
-        # Re-fetch pages using the session if we need to query the whole DB
-        pages = _query_db_all(token, obs_db_id, session=session)
-
-        if filter_unresolved:
-            pages = [
-                p for p in pages
-                if not p["properties"].get(PROP_ESPECE, {}).get("relation")
-            ]
-
-        total = len(pages)
-        for i, page in enumerate(pages):
-            page_id = page["id"]
-            props   = page["properties"]
-
-            taxon_name = _get_title(props)
-            desc_prop = props.get("Description rapide", {})
-            description = _get_rich_text(desc_prop)
-            taxon_id = extract_taxon_id_from_props(props)
-
-            if not taxon_name:
-                skipped += 1
-                if progress_callback:
-                    progress_callback(i + 1, total)
+    done_page_ids = done_page_ids if done_page_ids is not None else set()
+
+    # Filtrage côté Notion : seules les pages sans Espèce (mode par défaut) et
+    # seulement les propriétés lues par le résolveur → le transfert suit la
+    # taille du travail à faire, pas celle de la DB.
+    body = None
+    if filter_unresolved and (not db_props_schema or PROP_ESPECE in db_props_schema):
+        body = {"filter": {"property": PROP_ESPECE, "relation": {"is_empty": True}}}
+    #
+    # La requête est lue en flux et chaque page réduite à {id, properties}
+    # (pas d'URL, parent, icône…). Avec le filtre `is_empty`, on la draine
+    # AVANT de PATCHer : résoudre une page la fait sortir du filtre, ce qui
+    # décalerait les curseurs d'une pagination encore en cours. Sans filtre,
+    # rien ne bouge : chaque lot est résolu puis écrit à son arrivée
+    # (mémoire bornée par un lot, pas par la DB).
+    def _keep(batch: list) -> list:
+        kept = []
+        for page in batch:
+            if page["id"] in done_page_ids:
+                continue
+            # Filet de sécurité (schéma sans Espèce, filtre non appliqué) — gratuit.
+            if filter_unresolved and page["properties"].get(PROP_ESPECE, {}).get("relation"):
                 continue
+            kept.append({"id": page["id"], "properties": page["properties"]})
+        return kept
+
+    query = _iter_query_db(
+        token, obs_db_id, filter_properties=_resolver_filter_properties(db_props_schema),
+        priority=PRIORITY_BULK, body=body,
+    )
+    if body is not None:
+        batches = [[page for batch in query for page in _keep(batch)]]
+    else:
+        batches = (_keep(batch) for batch in query)
+
+    total = 0        # pages lues jusqu'ici (définitif en mode filtré)
+    processed = 0
+    cancelled = False
 
-            try:
-                ok, msg = resolve_and_update_relations(
-                    page_id, taxon_name, description, maps, token, db_props_schema, 
-                    taxon_id=taxon_id, session=session
-                )
-                if ok:
-                    success += 1
+    def _record(page_id: str, status: str, msg: str) -> None:
+        nonlocal success, unchanged, skipped, processed
+        if status == "ok":
+            success += 1
+        else:
+            skipped += 1
+            if status == "unchanged":
+                unchanged += 1
+            elif status == "error":
+                errors.append(msg)
+        if status != "error":
+            done_page_ids.add(page_id)
+        processed += 1
+        if progress_callback:
+            progress_callback(processed, total)
+
+    memo: dict = {}          # mémo partagé : mêmes maps pour tout le traitement
+    window = max(1, 2 * max_workers)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for pages in batches:
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                break
+            total += len(pages)
+
+            # Étape 1 — résolution pure du lot.
+            writes = []
+            for page in pages:
+                status, props, msg = plan_relation_update(page, maps, db_props_schema, memo)
+                if status == "patch":
+                    writes.append((page["id"], props, msg))
                 else:
-                    if "HTTP" in msg:
-                        errors.append(f"Page {page_id}: {msg}")
-                    skipped += 1
-            except Exception as e:
-                errors.append(f"Page {page_id} (Exception): {e}")
-                skipped += 1
+                    _record(page["id"], status, msg)
+
+            # Étape 2 — écriture des PATCH précalculés, au rythme du limiteur.
+            pending_writes = iter(writes)
+            in_flight: dict = {}
+            while True:
+                while len(in_flight) < window:
+                    if cancel_event is not None and cancel_event.is_set():
+                        cancelled = True
+                        break
+                    write = next(pending_writes, None)
+                    if write is None:
+                        break
+                    page_id, props, msg = write
+                    fut = executor.submit(_write_relation_update, page_id, props, msg, token)
+                    in_flight[fut] = page_id
+                if not in_flight:
+                    break
 
-            if progress_callback:
-                progress_callback(i + 1, total)
+                fut = next(as_completed(in_flight))
+                page_id = in_flight.pop(fut)
+                status, msg = fut.result()
+                _record(page_id, status, msg)
+            if cancelled:
+                break
 
     return {
-        "success": success, 
-        "skipped": skipped, 
-        "errors": errors, 
-        "total": success + skipped
+        "success": success,
+        "unchanged": unchanged,
+        "skipped": skipped,
+        "errors": errors,
+        "total": success + skipped,
+        "cancelled": cancelled,
     }
@@ -0,0 +1,320 @@
+"""import_jobs.py — File d'attente persistante des imports iNat → Notion.
+
+L'import tournait dans l'exécution du script Streamlit : rechargement de
+l'onglet, websocket coupé ou redémarrage du conteneur en plein import → tout
+le suivi était perdu, et l'utilisateur devait re-chercher, re-dédoublonner et
+deviner ce qui était passé.
+
+Ici, un import est un **job** soumis dans une file SQLite (`.cache/`) et
+exécuté en tâche de fond sur la boucle partagée `aio_engine` (une coroutine
+par observation) :
+
+  - **idempotent par ID iNat** : une observation n'a qu'une ligne dans la
+    file ; la re-soumettre ne relance que si elle était en erreur (une
+    observation importée n'est jamais retraitée) ;
+  - **reprise** : au redémarrage, les éléments « en cours » repassent « à
+    faire » et l'exécution est relancée à la prochaine visite de l'onglet ;
+  - **deux phases** : création de la page, puis mise à jour différée (QR code
+    Notion) une fois toutes les créations faites ;
+  - **suivi** : statut par élément, lisible depuis n'importe quelle session.
+
+Le traitement lui-même (`process`, `finalize`) est fourni par l'appelant
+(cf. `importer.py`) : ce module ne connaît ni Notion ni Streamlit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from aio_engine import get_engine
+from ratelimit import AdaptiveConcurrency
+
+DEFAULT_QUEUE_DIR = ".cache"
+SCHEMA_VERSION = 1
+# Plafond de tâches (coroutines) en vol ; le débit réel reste celui du limiteur.
+MAX_IN_FLIGHT = 32
+
+# Cycle de vie d'un élément.
+STATUS_PENDING = "pending"        # à créer
+STATUS_RUNNING = "running"        # création en cours
+STATUS_CREATED = "created"        # page créée, mise à jour différée à faire
+STATUS_FINISHING = "finishing"    # mise à jour différée en cours
+STATUS_DONE = "done"
+STATUS_SKIPPED = "skipped"        # déjà présent dans Notion
+STATUS_ERROR = "error"
+
+FINAL_STATUSES = (STATUS_DONE, STATUS_SKIPPED, STATUS_ERROR)
+
+
+class ImportQueue:
+    """File d'imports persistante (thread-safe), une exécution à la fois."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._worker: Future | None = None
+        # Posé (sous verrou) par le worker qui ne trouve plus rien à prendre :
+        # une soumission qui suit relance un worker au lieu de s'y fier.
+        self._worker_idle = False
+        self.concurrency: AdaptiveConcurrency | None = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            version = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            if version is None or version[0] != str(SCHEMA_VERSION):
+                conn.execute("DROP TABLE IF EXISTS jobs")
+                conn.execute("DROP TABLE IF EXISTS items")
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                             (str(SCHEMA_VERSION),))
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY, owner TEXT, context TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            # Une ligne par observation iNat : c'est ce qui rend la file idempotente.
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " inat_id INTEGER PRIMARY KEY, job_id TEXT NOT NULL, seq INTEGER NOT NULL,"
+                " payload TEXT NOT NULL, status TEXT NOT NULL, message TEXT,"
+                " page_id TEXT, url TEXT, followup TEXT, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS items_job ON items (job_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS items_status ON items (status)")
+            # Reprise après un arrêt brutal : ce qui était en vol est refait.
+            conn.execute("UPDATE items SET status = ? WHERE status = ?", (STATUS_PENDING, STATUS_RUNNING))
+            conn.execute("UPDATE items SET status = ? WHERE status = ?", (STATUS_CREATED, STATUS_FINISHING))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    # ── Soumission ───────────────────────────────────────────────────────────
+
+    def submit(self, items, context: dict, owner: str | None = None) -> str:
+        """Crée un job pour `items` (itérable de (inat_id, payload)) ; retourne son ID.
+
+        `payload` et `context` (commun au job) doivent être sérialisables en
+        JSON. Une observation déjà dans la file n'est reprise par le nouveau
+        job (rattachée et remise « à faire ») que si elle était en erreur ;
+        sinon elle reste dans son job d'origine (en cours, ou déjà importée),
+        dont le suivi continue de l'afficher.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        rows = [
+            (int(inat_id), job_id, seq, json.dumps(payload), STATUS_PENDING, now)
+            for seq, (inat_id, payload) in enumerate(items)
+        ]
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, owner, context, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, owner, json.dumps(context), now),
+            )
+            conn.executemany(
+                "INSERT INTO items (inat_id, job_id, seq, payload, status, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (inat_id) DO UPDATE SET"
+                "  job_id = CASE WHEN status = 'error' THEN excluded.job_id ELSE job_id END,"
+                "  seq = CASE WHEN status = 'error' THEN excluded.seq ELSE seq END,"
+                "  payload = CASE WHEN status = 'error' THEN excluded.payload ELSE payload END,"
+                "  message = CASE WHEN status = 'error' THEN NULL ELSE message END,"
+                "  status = CASE WHEN status = 'error' THEN 'pending' ELSE status END,"
+                "  updated_at = excluded.updated_at",
+                rows,
+            )
+        return job_id
+
+    # ── Lecture (suivi) ──────────────────────────────────────────────────────
+
+    def latest_job(self, owner: str | None, since: float = 0.0) -> str | None:
+        """Dernier job soumis par `owner` après `since` (pour retrouver le suivi
+        après un rechargement)."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE owner IS ? AND created_at >= ?"
+                " ORDER BY created_at DESC LIMIT 1", (owner, since)
+            ).fetchone()
+        return row[0] if row else None
+
+    def job_items(self, job_id: str) -> list[dict]:
+        """Éléments du job, dans l'ordre de soumission."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT inat_id, payload, status, message, page_id, url FROM items"
+                " WHERE job_id = ? ORDER BY seq", (job_id,)
+            ).fetchall()
+        return [
+            {"inat_id": r[0], "payload": json.loads(r[1]), "status": r[2],
+             "message": r[3], "page_id": r[4], "url": r[5]}
+            for r in rows
+        ]
+
+    def counts(self, job_id: str) -> dict[str, int]:
+        """Nombre d'éléments du job par statut."""
+        with self._connect() as conn:
+            return dict(conn.execute(
+                "SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job_id,)
+            ))
+
+    def has_work(self) -> bool:
+        """True s'il reste des créations ou des mises à jour différées à faire."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM items WHERE status IN (?, ?, ?, ?) LIMIT 1",
+                (STATUS_PENDING, STATUS_RUNNING, STATUS_CREATED, STATUS_FINISHING),
+            ).fetchone() is not None
+
+    @property
+    def active(self) -> bool:
+        """True si la file est en cours de traitement."""
+        return self._worker is not None and not self._worker.done() and not self._worker_idle
+
+    # ── Exécution ────────────────────────────────────────────────────────────
+
+    def _claim(self, stop_if_idle: bool = False) -> dict | None:
+        """Prend le prochain élément : créations d'abord, mises à jour différées ensuite.
+
+        `stop_if_idle` : le worker n'a plus rien en vol ; si rien n'est à
+        prendre, il se déclare inactif dans le même verrou que `submit()` —
+        une soumission est donc soit prise par ce worker, soit suivie d'un
+        nouveau (`active` est déjà False).
+        """
+        with self._lock, self._connect() as conn:
+            for status, claimed in ((STATUS_PENDING, STATUS_RUNNING), (STATUS_CREATED, STATUS_FINISHING)):
+                row = conn.execute(
+                    "SELECT i.inat_id, i.payload, i.page_id, i.followup, j.context"
+                    " FROM items i JOIN jobs j ON j.job_id = i.job_id"
+                    " WHERE i.status = ? ORDER BY j.created_at, i.seq LIMIT 1", (status,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE items SET status = ?, updated_at = ? WHERE inat_id = ?",
+                                 (claimed, time.time(), row[0]))
+                    return {
+                        "inat_id": row[0], "status": claimed, "payload": json.loads(row[1]),
+                        "page_id": row[2], "followup": json.loads(row[3]) if row[3] else None,
+                        "context": json.loads(row[4]),
+                    }
+            if stop_if_idle:
+                self._worker_idle = True
+        return None
+
+    def _complete(self, inat_id: int, status: str, message: str | None = None,
+                  page_id: str | None = None, url: str | None = None, followup=None) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE items SET status = ?, message = ?, page_id = COALESCE(?, page_id),"
+                " url = COALESCE(?, url), followup = ?, updated_at = ? WHERE inat_id = ?",
+                (status, message, page_id, url, json.dumps(followup) if followup else None,
+                 time.time(), inat_id),
+            )
+
+    async def _complete_async(self, *args) -> None:
+        """`_complete()` dans le pool d'E/S : l'attente du verrou SQLite
+        (jusqu'à 30 s) ne doit pas geler la boucle partagée."""
+        await get_engine().to_thread(self._complete, *args)
+
+    async def _call(self, fn, *args):
+        """Coroutine attendue telle quelle ; fonction synchrone → pool d'E/S."""
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args)
+        return await get_engine().to_thread(fn, *args)
+
+    async def _execute(self, item: dict, process, finalize) -> str:
+        """Traite un élément ; retourne son nouveau statut."""
+        inat_id = item["inat_id"]
+        if item["status"] == STATUS_FINISHING:
+            try:
+                await self._call(finalize, item["page_id"], item["followup"], item["context"])
+                await self._complete_async(inat_id, STATUS_DONE)
+            except Exception as e:
+                # La page existe : l'élément est importé, avec un avertissement.
+                await self._complete_async(inat_id, STATUS_DONE, f"Mise à jour différée échouée : {e!s}")
+            return STATUS_DONE
+        try:
+            result = await self._call(process, item["payload"], item["context"])
+        except Exception as e:
+            await self._complete_async(inat_id, STATUS_ERROR, f"Erreur système durant l'import : {e!s}")
+            return STATUS_ERROR
+        status = result.get("status", STATUS_DONE)
+        followup = result.get("followup")
+        if status == STATUS_DONE and followup:
+            status = STATUS_CREATED
+        await self._complete_async(inat_id, status, result.get("message"), result.get("page_id"),
+                                   result.get("url"), followup)
+        return status
+
+    async def run_async(self, process, finalize, limiter=None, key: str = "", max_in_flight: int = MAX_IN_FLIGHT) -> int:
+        """Traite la file jusqu'à épuisement ; retourne le nombre d'éléments traités.
+
+        `process(payload, context) -> dict` crée la page : clés `status`
+        (STATUS_DONE / STATUS_SKIPPED / STATUS_ERROR), `message`, `page_id`,
+        `url` et `followup` (propriétés à appliquer plus tard, ou None).
+        `finalize(page_id, followup, context)` applique la mise à jour différée.
+        Coroutines de préférence (une tâche par élément) ; une fonction
+        synchrone passe par le pool d'E/S de `aio_engine`.
+
+        Le nombre de tâches en vol suit `AdaptiveConcurrency` (429/5xx et
+        latence vus par `limiter` pour `key`) ; seules les créations et mises à
+        jour abouties alimentent le signal de latence.
+        """
+        concurrency = self.concurrency = AdaptiveConcurrency(
+            initial=2, maximum=max_in_flight, limiter=limiter, key=key,
+        )
+        processed = 0
+        running = {}
+        while True:
+            while len(running) < concurrency.limit:
+                item = await get_engine().to_thread(self._claim, not running)
+                if item is None:
+                    break
+                running[asyncio.ensure_future(self._execute(item, process, finalize))] = time.time()
+            if not running:
+                return processed
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                started = running.pop(task)
+                # Lignes ignorées (déjà importées) ou en erreur : chemins courts
+                # sans appel Notion représentatif, hors signal de latence.
+                if task.result() in (STATUS_DONE, STATUS_CREATED):
+                    concurrency.record(time.time() - started)
+                processed += 1
+
+    def run(self, process, finalize, **kwargs) -> int:
+        """`run_async()` sur la boucle partagée, en attendant la fin (hors boucle)."""
+        return get_engine().run(self.run_async(process, finalize, **kwargs))
+
+    def start(self, process, finalize, **kwargs) -> Future | None:
+        """`run_async()` en tâche de fond sur la boucle partagée ; None si déjà en cours."""
+        with self._lock:
+            if self.active:
+                return None
+
+            def _done(future):
+                if not future.cancelled() and future.exception() is not None:
+                    print(f"[ImportJobs] Exécution de la file interrompue : {future.exception()}")
+
+            self._worker_idle = False
+            self._worker = get_engine().submit(self.run_async(process, finalize, **kwargs))
+            self._worker.add_done_callback(_done)
+            return self._worker
+
+
+_QUEUES: dict[str, ImportQueue] = {}
+_QUEUES_LOCK = threading.Lock()
+
+
+def get_queue(db_id: str, directory: str = DEFAULT_QUEUE_DIR) -> ImportQueue:
+    """File partagée (une par BD Observations) pour tout le processus."""
+    key = (db_id or "").replace("-", "").lower()
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(key)
+        if queue is None:
+            path = os.path.join(directory, f"import_jobs_{key[:12] or 'default'}.sqlite")
+            queue = _QUEUES[key] = ImportQueue(path)
+        return queue
@@ -0,0 +1,441 @@
+"""importer.py — Import d'une observation iNaturalist dans la BD Observations Notion.
+
+Code du worker d'import, sorti de `app.py` pour être exécuté hors du script
+Streamlit par la file persistante `import_jobs` (aucun appel `st.*` ici) :
+
+  - `job_payload()` : ligne du tableau + observation iNat → payload JSON ;
+  - `import_observation()` : création de la page (une seule requête), en
+    coroutine sur le client Notion asynchrone ;
+  - `process_job_item()` / `apply_followup()` : branchement sur `import_jobs`.
+"""
+
+from __future__ import annotations
+
+import time
+from urllib.parse import quote
+
+import enricher
+import import_jobs
+import obs_index
+from aio_engine import get_engine
+from notion_http import NotionAPIError
+from ratelimit import PRIORITY_BULK
+
+ALREADY_IMPORTED = "⚠️ Importation ignorée (déjà présent sur Notion)"
+
+# Colonnes du tableau d'import utilisées par `import_observation`.
+_ROW_FIELDS = ("Taxon", "ID", "No° Fongarium", "Collection", "Identificateur", "Description", "_is_new")
+
+
+# Suffixes taxonomiques fongiques au-dessus du genre — détection auto de
+# l'État d'identification à l'import.
+_HIGHER_RANK_SUFFIXES = (
+    "aceae",      # famille (ex: Boletaceae)
+    "ales",       # ordre (ex: Boletales)
+    "mycetes",    # classe (ex: Agaricomycetes)
+    "mycetidae",  # sous-classe (ex: Agaricomycetidae)
+    "mycotina",   # sous-phylum (ex: Pucciniomycotina)
+    "mycota",     # phylum (ex: Basidiomycota)
+)
+
+
+def auto_etat_identification(taxon_name: str) -> str:
+    """
+    Détecte automatiquement l'`État d'identification` à partir du nom scientifique.
+
+    Règles :
+      - Suffixe famille/ordre/classe/phylum (-aceae, -ales, -mycetes, etc.)
+          → "Groupe identifié"
+      - Genre seul (1 mot sans suffixe supérieur) ou "Genre sp." / "Genre spp."
+          → "Genre identifié"
+      - Genre + épithète spécifique (même avec cf. / aff.)
+          → "Identifié"
+      - Vide / inconnu
+          → "Non identifié"
+
+    Exemples :
+      "Cronartium ribicola"   → "Identifié"
+      "Russula cf. emetica"   → "Identifié"
+      "Boletus sp."           → "Genre identifié"
+      "Russula"               → "Genre identifié"
+      "Boletaceae"            → "Groupe identifié"
+      "Agaricomycetes"        → "Groupe identifié"
+      ""                      → "Non identifié"
+    """
+    if not taxon_name or not taxon_name.strip():
+        return "Non identifié"
+
+    parts = [p for p in taxon_name.strip().split() if p]
+    if not parts:
+        return "Non identifié"
+
+    first = parts[0]
+    # 1. Rang supérieur au genre (suffixe standardisé)
+    if any(first.lower().endswith(suf) for suf in _HIGHER_RANK_SUFFIXES):
+        return "Groupe identifié"
+
+    # 2. Genre seul
+    if len(parts) == 1:
+        return "Genre identifié"
+
+    # 3. "Genus sp." / "Genus spp." → genre seul aussi
+    second = parts[1].lower().rstrip(".")
+    if second in ("sp", "spp"):
+        return "Genre identifié"
+
+    # 4. Sinon : Genus + epithète (cf./aff. tolérés, l'épithète est présente)
+    return "Identifié"
+
+
+def _qr_code_files_prop(file_name, data):
+    """Propriété Notion `files` pointant vers un QR code (api.qrserver.com) encodant `data`."""
+    qr_api_url = f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={quote(data, safe='')}"
+    return {"files": [{"name": file_name, "type": "external", "external": {"url": qr_api_url}}]}
+
+
+def _json_value(value):
+    """Valeur de cellule pandas/numpy → type JSON natif (NaN → None)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def compact_observation(obs: dict) -> dict:
+    """Sous-ensemble JSON de l'observation (`inat_search.Observation` ou dict) lu par `import_observation`."""
+    location = obs.get("location")
+    return {
+        "id": obs.get("id"),
+        "user": {"login": (obs.get("user") or {}).get("login")},
+        "time_observed_at": _json_value(obs.get("time_observed_at")),
+        "observed_on": _json_value(obs.get("observed_on")),
+        "uri": obs.get("uri"),
+        "tags": [t if isinstance(t, (dict, str)) else str(t) for t in obs.get("tags") or []],
+        "photos": [{"id": p["id"], "url": p["url"]} for p in obs.get("photos") or []],
+        "taxon": {"id": (obs.get("taxon") or {}).get("id")},
+        "place_guess": obs.get("place_guess"),
+        "location": list(location) if isinstance(location, (list, tuple)) else location,
+    }
+
+
+def job_payload(row, obs: dict) -> dict:
+    """Payload `import_jobs` d'une ligne du tableau d'import et de son observation."""
+    return {
+        "row": {k: _json_value(row.get(k)) for k in _ROW_FIELDS if k in row},
+        "obs": compact_observation(obs),
+    }
+
+
+def _indexed(db_id: str, obs_id: str) -> bool:
+    """`obs_id` est-il dans l'index local ? (SQLite : à appeler hors boucle)"""
+    return obs_id in obs_index.get_index(db_id)
+
+
+def _index_import(db_id: str, obs_id: str, page_id: str, mycologue: str | None) -> None:
+    """Enregistre l'import dans l'index local (SQLite : à appeler hors boucle)."""
+    obs_index.get_index(db_id).add(obs_id, page_id, mycologue=mycologue)
+
+
+async def import_observation(row, obs_obj, current_inat, real_name_notion, fmt_db_id, db_props_schema, notion_instance, fong_col_name, enricher_maps=None, current_user_portail_page_id=None):
+    """
+    Import a single iNaturalist observation into the configured Notion database as a new page.
+
+    Parameters:
+        row (Mapping): A row from the import dataframe containing at least "Taxon", "ID", and "No° Fongarium".
+        obs_obj (Mapping): The iNaturalist observation (full object or `compact_observation()`) used to populate Notion properties (user, dates, photos, location, uri, tags, etc.).
+        current_inat (str | None): Current iNaturalist username for the authenticated user; used to map to a Notion display name when matching the observation's user.
+        real_name_notion (str | None): The display name to set in the Notion "Mycologue" select property when current_inat matches the observation's user.
+        fmt_db_id (str): Notion database ID where the new page will be created.
+        db_props_schema (dict): Notion database properties schema for dynamic key detection.
+        notion_instance (AsyncNotionHTTPClient): Client Notion asynchrone (notion_http.get_async_client).
+        fong_col_name (str): The name of the Notion property for Fongarium code.
+        current_user_portail_page_id (str | None): Notion page ID of the current user's "Portail du mycologue" entry. When the observation's iNat user matches the current Streamlit user, this is used to populate the "Mycologue (relation)" column.
+
+    Returns:
+        tuple:
+            - success (dict | None): If successful, a dict with keys "name" (scientific name), "id" (iNaturalist observation id), "url" and "page_id" (Notion page), and "followup": the Notion-page QR code properties, to apply once all pages are created (None if not applicable); otherwise None.
+            - error_or_warning (str | None): If the import failed or was skipped, an error message; if the import succeeded but relation enrichment failed, a warning message; otherwise None.
+
+    Side effects:
+        - Creates a new page in Notion in a single request: mapped properties, iNat QR code, enricher relations and optional photo children blocks.
+    """
+    sci_name = row["Taxon"]
+    obs_id = str(row["ID"])
+    _t_worker_start = time.time()
+
+    # --- DOUBLE SECURITY ---
+    # L'index local couvre aussi un import repris après un arrêt brutal
+    # (page créée juste avant l'arrêt).
+    if not row.get("_is_new", True) or await get_engine().to_thread(_indexed, fmt_db_id, obs_id):
+        return None, ALREADY_IMPORTED
+
+    warning_msg = None
+    try:
+        # --- DATA EXTRACTION & MAPPING ---
+        inat_login = obs_obj.get('user', {}).get('login') or "Inconnu"
+        user_name = inat_login
+        is_self_import = bool(current_inat) and inat_login.lower() == current_inat.lower()
+        if is_self_import:
+            if real_name_notion:
+                user_name = real_name_notion
+
+        observed_on = obs_obj.get('time_observed_at')
+        if not observed_on:
+            obs_date_raw = obs_obj.get('observed_on')
+            if obs_date_raw:
+                date_iso = obs_date_raw.isoformat() if hasattr(obs_date_raw, 'isoformat') else str(obs_date_raw)
+            else:
+                date_iso = None
+        else:
+            date_iso = observed_on.isoformat() if hasattr(observed_on, 'isoformat') else str(observed_on)
+
+        obs_url = obs_obj.get('uri')
+        tags = obs_obj.get('tags', []) 
+        tag_string = ""
+        if tags:
+            extracted_tags = []
+            for t in tags:
+                if isinstance(t, dict): extracted_tags.append(t.get('tag', ''))
+                elif isinstance(t, str): extracted_tags.append(t)
+                else: extracted_tags.append(str(t))
+            tag_string = ", ".join(filter(None, extracted_tags))
+
+        fong_code = row["No° Fongarium"]
+        photos = obs_obj.get('photos', [])
+        photo_files_payload = []
+        for p in photos:
+            photo_files_payload.append({
+                "name": f"iNat {p['id']}",
+                "type": "external",
+                "external": {"url": p['url'].replace("square", "original")}
+            })
+
+        children = []
+        if photos:
+            children.append({"object": "block", "type": "heading_3", "heading_3": {"rich_text": [{"text": {"content": "Galerie Photo"}}]}})
+            for p in photos:
+                children.append({
+                    "object": "block", 
+                    "type": "image", 
+                    "image": {"type": "external", "external": {"url": p['url'].replace("square", "large")}}
+                })
+
+        # Construct Props
+        props = {
+            "Titre": {"title": [{"text": {"content": sci_name}}]}
+        }
+        if date_iso: props["Date"] = {"date": {"start": date_iso}}
+        if user_name: props["Mycologue"] = {"select": {"name": user_name}}
+        # Mycologue (relation) — uniquement pour self-import et si page_id configuré
+        if is_self_import and current_user_portail_page_id:
+            # Détecter dynamiquement le nom exact dans le schéma de la BD.
+            # Si aucune colonne relation Mycologue n'existe, on skip plutôt
+            # que de défauter sur un nom hardcodé qui ferait rejeter la page
+            # par Notion (400 "is not a property that exists").
+            relation_key = next(
+                (k for k, v in db_props_schema.items()
+                 if "mycologue" in k.lower() and "relation" in k.lower() and v.get("type") == "relation"),
+                None,
+            )
+            if relation_key:
+                props[relation_key] = {"relation": [{"id": current_user_portail_page_id}]}
+
+        # Identificateur (select) — alimenté par le sélecteur bulk ou la colonne éditable.
+        # Détection dynamique du nom exact pour gérer les variantes de casse.
+        ident_value = (row.get("Identificateur") or "").strip()
+        if ident_value:
+            ident_key = next(
+                (k for k, v in db_props_schema.items()
+                 if k.lower() == "identificateur" and v.get("type") == "select"),
+                None,
+            )
+            if ident_key:
+                props[ident_key] = {"select": {"name": ident_value}}
+
+        # État d'identification (status) — auto-détecté depuis le nom scientifique.
+        # Évite à l'utilisateur de cliquer manuellement après chaque import.
+        etat_value = auto_etat_identification(sci_name)
+        if etat_value:
+            etat_key = next(
+                (k for k, v in db_props_schema.items()
+                 if "identification" in k.lower() and "tat" in k.lower() and v.get("type") == "status"),
+                None,
+            )
+            if etat_key:
+                props[etat_key] = {"status": {"name": etat_value}}
+
+        if obs_url: props["URL Inaturalist"] = {"url": obs_url}
+        if photo_files_payload: props["Photo macro"] = {"files": photo_files_payload}
+
+        if fong_code:
+            props[fong_col_name] = {"rich_text": [{"text": {"content": str(fong_code)}}]}
+        elif tag_string:
+            props[fong_col_name] = {"rich_text": [{"text": {"content": tag_string}}]}
+
+        # Set Fongarium checkbox if Collection is selected
+        if row.get("Collection"):
+            fong_checkbox_key = next((k for k, v in db_props_schema.items() if "fongarium" in k.lower() and v["type"] == "checkbox"), None)
+
+            # Fallback if the user named it exactly 'Fongarium'
+            if not fong_checkbox_key and "Fongarium" in db_props_schema:
+                fong_checkbox_key = "Fongarium"
+
+            if fong_checkbox_key:
+                if db_props_schema.get(fong_checkbox_key, {}).get("type") == "checkbox":
+                    props[fong_checkbox_key] = {"checkbox": True}
+                else:
+                    print(f"Warning: Property '{fong_checkbox_key}' found but is not a checkbox type.")
+
+        # iNat Taxon ID
+        inat_taxon_id = obs_obj.get("taxon", {}).get("id")
+        if inat_taxon_id:
+            taxon_id_key = next((k for k, v in db_props_schema.items() if "taxon" in k.lower() and "id" in k.lower() and v["type"] == "number"), None)
+            if not taxon_id_key and "Inat Taxon ID" in db_props_schema:
+                taxon_id_key = "Inat Taxon ID"
+
+            if taxon_id_key:
+                props[taxon_id_key] = {"number": int(inat_taxon_id)}
+
+        # Description : la version éditée dans le tableau prime — permet d'ajouter
+        # ou corriger les codes (*FSL01, #BOJ, !BOM, $BMC, etc.) juste avant l'import
+        # sans devoir modifier l'obs côté iNat. Si l'utilisateur a effacé volontairement,
+        # on respecte (utiliser le bouton « Restaurer depuis iNat » pour récupérer).
+        description = (row.get("Description") or "").strip()
+        if description:
+            props["Description rapide"] = {"rich_text": [{"text": {"content": description[:2000]}}]}
+
+        place_guess = obs_obj.get('place_guess', '')
+        if place_guess: props["Repère"] = {"rich_text": [{"text": {"content": place_guess}}]}
+
+        coords = obs_obj.get('location')
+        if coords:
+            try:
+                lat_val = None
+                lng_val = None
+                if isinstance(coords, str):
+                    parts = coords.split(',')
+                    if len(parts) >= 2:
+                        lat_val = parts[0].strip()
+                        lng_val = parts[1].strip()
+                elif isinstance(coords, list) and len(coords) >= 2:
+                    lat_val = str(coords[0])
+                    lng_val = str(coords[1])
+
+                if lat_val and lng_val:
+                    lat_key = "Latitude (sexadécimal)"
+                    if lat_key not in db_props_schema:
+                        lat_key = next((k for k in db_props_schema if "lat" in k.lower() and "re" not in k.lower()), "Latitude")
+
+                    lng_key = "Longitude (sexadécimal)"
+                    if lng_key not in db_props_schema:
+                        lng_key = next((k for k in db_props_schema if "long" in k.lower()), "Longitude")
+
+                    if lat_key in db_props_schema:
+                        if db_props_schema[lat_key]["type"] == "number":
+                            props[lat_key] = {"number": float(lat_val)}
+                        else:
+                            props[lat_key] = {"rich_text": [{"text": {"content": str(lat_val)}}]}
+                    else:
+                        props["Latitude (sexadécimal)"] = {"rich_text": [{"text": {"content": str(lat_val)}}]}
+
+                    if lng_key in db_props_schema:
+                        if db_props_schema[lng_key]["type"] == "number":
+                            props[lng_key] = {"number": float(lng_val)}
+                        else:
+                            props[lng_key] = {"rich_text": [{"text": {"content": str(lng_val)}}]}
+                    else:
+                        props["Longitude (sexadécimal)"] = {"rich_text": [{"text": {"content": str(lng_val)}}]}
+
+            except Exception as coord_err:
+                print(f"Coord parse warning for {obs_id}: {coord_err}")
+
+        # --- QR CODE iNat ---
+        # Ne dépend que de l'URL iNat : envoyé dans la création. Colonne
+        # absente du schéma → ignorée (sinon Notion refuse toute la page).
+        qr_notion_key = next((k for k in db_props_schema if "qr" in k.lower() and "notion" in k.lower()), None)
+        qr_inat_key = next((k for k in db_props_schema if "qr" in k.lower() and "inat" in k.lower()), None)
+        if obs_url and qr_inat_key:
+            props[qr_inat_key] = _qr_code_files_prop("inat_qr.png", obs_url)
+
+        # --- ENRICHISSEMENT RELATIONS ---
+        # Calculées depuis les référentiels en mémoire et envoyées dans
+        # la création (plus de PATCH séparé). Les valeurs saisies
+        # ci-dessus (checkbox Fongarium…) priment.
+        relation_props = {}
+        if enricher_maps:
+            try:
+                relation_props, enrich_log = enricher.compute_relation_properties(
+                    sci_name,
+                    description or "",
+                    enricher_maps,
+                    db_props_schema,
+                    taxon_id=inat_taxon_id,
+                )
+                relation_props = {k: v for k, v in relation_props.items() if k not in props}
+                props.update(relation_props)
+                print(f"[Enricher] obs_id={obs_id} : {' | '.join(enrich_log)}")
+            except Exception as enrich_err:
+                # Ne fait pas échouer l'import : la page est créée sans relations
+                print(f"Erreur enrichissement pour {sci_name}: {enrich_err}")
+                warning_msg = f"⚠️ Importation réussie mais échec de l'enrichissement taxonomique pour {sci_name} (ID: {obs_id}). Erreur : {enrich_err!s}"
+
+        # --- SEND TO NOTION ---
+        # Retries 429/5xx/réseau : gérés par le client poolé (NOTION_LIMITER).
+        _t_create_start = time.time()
+        try:
+            new_page = await notion_instance.create_page(fmt_db_id, props, children=children)
+        except NotionAPIError as create_err:
+            # Relation vers une page de référentiel supprimée depuis le
+            # chargement des maps → Notion refuse toute la page (400).
+            # On recrée sans les relations plutôt que de perdre l'import.
+            if create_err.status != 400 or not relation_props:
+                raise
+            for k in relation_props:
+                props.pop(k, None)
+            new_page = await notion_instance.create_page(fmt_db_id, props, children=children)
+            warning_msg = f"⚠️ Importation réussie mais enrichissement refusé par Notion pour {sci_name} (ID: {obs_id}) : {create_err!s}"
+        _t_create_elapsed = time.time() - _t_create_start
+        print(f"[TIMING] obs_id={obs_id} step=pages.create took={_t_create_elapsed:.2f}s")
+
+        p_url = new_page.get('url')
+        page_id = new_page.get('id')
+        if page_id:
+            await get_engine().to_thread(_index_import, fmt_db_id, obs_id, page_id, user_name or None)
+
+        success = {"name": sci_name, "id": obs_id, "url": p_url, "page_id": page_id, "followup": None}
+        # QR Code Notion : seule propriété qui dépend de la page créée.
+        # Différé après toutes les créations (cf. import_jobs).
+        if page_id and p_url and qr_notion_key:
+            success["followup"] = {qr_notion_key: _qr_code_files_prop("notion_qr.png", p_url)}
+
+        _t_worker_total = time.time() - _t_worker_start
+        print(f"[TIMING] obs_id={obs_id} step=WORKER_TOTAL took={_t_worker_total:.2f}s")
+        return (success, warning_msg)
+
+    except Exception as e:
+        _t_worker_total = time.time() - _t_worker_start
+        print(f"[TIMING] obs_id={obs_id} step=WORKER_TOTAL took={_t_worker_total:.2f}s status=ERROR")
+        return (None, f"{sci_name} (ID: {obs_id}) : {e!s}")
+
+
+async def process_job_item(payload: dict, context: dict, notion_instance, enricher_maps=None) -> dict:
+    """`process` de `import_jobs.ImportQueue.run` : importe l'élément, traduit le résultat."""
+    success, message = await import_observation(
+        payload["row"], payload["obs"], notion_instance=notion_instance,
+        enricher_maps=enricher_maps, **context,
+    )
+    if success is None:
+        status = import_jobs.STATUS_SKIPPED if message == ALREADY_IMPORTED else import_jobs.STATUS_ERROR
+        return {"status": status, "message": message}
+    return {
+        "status": import_jobs.STATUS_DONE, "message": message,
+        "page_id": success["page_id"], "url": success["url"], "followup": success["followup"],
+    }
+
+
+async def apply_followup(notion_instance, page_id: str, props: dict, context: dict | None = None) -> None:
+    """`finalize` de `import_jobs` : QR code Notion, en priorité BULK."""
+    await notion_instance.update_page(page_id, props, priority=PRIORITY_BULK)
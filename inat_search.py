@@ -0,0 +1,524 @@
+"""inat_search.py — Recherche d'observations iNaturalist (sans dépendance Streamlit).
+
+Le mode « Multi-dates » enchaînait les appels `get_observations` date par
+date, page par page : un week-end de sorties = N × pages allers-retours
+séquentiels, chacun de 1 à 3 s.
+
+Ici, chaque date est une coroutine sur la boucle partagée (`aio_engine`) :
+les dates partent en parallèle et leurs pages s'enchaînent indépendamment.
+Le débit total reste celui recommandé par iNat (~1 req/s, `INAT_LIMITER`) ;
+on ne gagne que le temps de latence, plus celui des requêtes.
+
+Gros volumes (« Tout » = 10 000) : au-delà de `KEYSET_MIN_LIMIT`, la
+pagination `page` est remplacée par une pagination par clé (`order_by=id`,
+`id_below=<dernier id reçu>`) — iNat refuse les pages profondes (au-delà de
+10 000 résultats) et chaque page `page=N` lui coûte plus cher que la
+précédente ; par clé, chaque lot coûte pareil. `stream_search()` rend les
+lots au fil de l'eau pour afficher l'aperçu sans attendre la fin.
+
+Cache (`SEARCH_CACHE`) : une recherche relancée dans les minutes qui suivent
+(retour sur une requête, second clic) ne repagine pas tout. Les résultats
+sont gardés par requête normalisée (TTL + LRU) et seule la différence est
+demandée : `updated_since=<heure de la recherche précédente>`, en général
+une petite requête, fusionnée dans les résultats en cache.
+
+L'API `/v2/observations` est appelée directement (session `requests` poolée,
+comme `inat_validation`), avec une projection `fields` : seuls les ~15 champs
+lus par l'aperçu, l'import et les étiquettes sont transférés (`SEARCH_FIELDS`)
+— ni identifications, ni commentaires, ni métadonnées photo complètes. Chaque
+observation est gardée dans un `Observation` à `__slots__` plutôt qu'un dict
+imbriqué complet. Les valeurs sont normalisées comme le faisait
+`pyinaturalist` : horodatages en `datetime`, `location` en `[lat, lng]`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+import queue
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from aio_engine import get_engine
+from inat_validation import resolve_inat_identity
+from ratelimit import INAT_LIMITER, PRIORITY_INTERACTIVE, RETRYABLE_STATUSES
+
+INAT_API_URL = "https://api.inaturalist.org/v2"
+PER_PAGE = 200                 # maximum accepté par l'API
+# Volume demandé à partir duquel on pagine par clé (id) plutôt que par page.
+KEYSET_MIN_LIMIT = 1000
+DEFAULT_TIMEOUT = 30
+MAX_ATTEMPTS = 4
+_USER_AGENT = "MycosphaeraPortail/1.2 (info@mycosphaera.com)"
+# Clé du limiteur : un seul budget iNat pour tout le processus.
+_INAT_KEY = "inat"
+
+# Cache des recherches : durée de vie et nombre de requêtes gardées.
+SEARCH_CACHE_TTL = 15 * 60
+SEARCH_CACHE_SIZE = 16
+# Marge sur `updated_since` (horloges serveur/client, écritures en cours).
+_DELTA_OVERLAP = datetime.timedelta(minutes=2)
+
+_TIMESTAMP_FIELDS = ("time_observed_at", "observed_on", "created_at", "updated_at")
+
+# Champs demandés à l'API (notation pointée) : ceux lus par l'aperçu,
+# `importer.import_observation` et `labels.generate_label_pdf`.
+SEARCH_FIELDS = (
+    "id", "uri", "time_observed_at", "observed_on", "observed_on_string", "place_guess", "location",
+    "description", "tags", "taxon.id", "taxon.name", "user.login", "user.name",
+    "photos.id", "photos.url",
+)
+
+_SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _session() -> requests.Session:
+    """Session keep-alive partagée par toutes les recherches."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            _SESSION.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
+            _SESSION.headers.update({"User-Agent": _USER_AGENT, "Accept": "application/json"})
+        return _SESSION
+
+
+def api_params(params: dict) -> dict:
+    """Paramètres de recherche → query string iNat (listes jointes par virgules,
+    dates ISO, booléens en minuscules, valeurs vides retirées)."""
+    out = {}
+    for key, value in params.items():
+        if value is None or value == "" or value == []:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = ",".join(str(v) for v in value)
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+def rison_fields(fields) -> str:
+    """('id', 'taxon.id', 'taxon.name') → '(id:!t,taxon:(id:!t,name:!t))' (syntaxe `fields` de l'API v2)."""
+    tree: dict = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = None
+
+    def _encode(node: dict) -> str:
+        return "(" + ",".join(f"{k}:{'!t' if v is None else _encode(v)}" for k, v in node.items()) + ")"
+
+    return _encode(tree)
+
+
+_FIELDS_PARAM = rison_fields(SEARCH_FIELDS)
+
+
+class Observation:
+    """Observation iNat réduite aux champs de `SEARCH_FIELDS`.
+
+    Interface de lecture d'un dict (`obs['id']`, `obs.get('taxon', {})`) pour
+    rester interchangeable avec les observations brutes là où elles étaient
+    lues. `get()` rend le défaut pour un champ absent OU nul (un `taxon` nul
+    n'est donc plus un piège pour `obs.get('taxon', {}).get('name')`).
+    """
+
+    __slots__ = (
+        "id", "uri", "time_observed_at", "observed_on", "observed_on_string", "place_guess", "location",
+        "description", "tags", "taxon", "user", "photos",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_api(cls, raw: dict) -> "Observation":
+        """Observation brute (normalisée par `convert_observation`) → enregistrement compact."""
+        taxon = raw.get("taxon") or {}
+        user = raw.get("user") or {}
+        return cls(
+            id=raw.get("id"),
+            uri=raw.get("uri"),
+            time_observed_at=raw.get("time_observed_at"),
+            observed_on=raw.get("observed_on"),
+            observed_on_string=raw.get("observed_on_string"),
+            place_guess=raw.get("place_guess"),
+            location=raw.get("location"),
+            description=raw.get("description"),
+            tags=[t.get("tag", "") if isinstance(t, dict) else t for t in raw.get("tags") or []],
+            taxon={"id": taxon.get("id"), "name": taxon.get("name")} if taxon else None,
+            user={"login": user.get("login"), "name": user.get("name")} if user else None,
+            photos=[{"id": p.get("id"), "url": p.get("url")} for p in raw.get("photos") or []],
+        )
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__slots__ and getattr(self, key) is not None
+
+    def keys(self):
+        return [name for name in self.__slots__ if getattr(self, name) is not None]
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Observation) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Observation(id={self.id!r})"
+
+
+# Login (minuscules) → ID numérique iNat, partagé par toutes les sessions.
+_USER_IDS: dict[str, str] = {}
+
+
+async def user_params(params: dict, *, limiter=INAT_LIMITER, engine=None, session=None) -> dict:
+    """`user_id` (IDs numériques et/ou logins) → paramètres de l'API v2.
+
+    La v1 acceptait un login dans `user_id` ; la v2 y attend l'ID numérique
+    et prend les logins dans `user_login`. Les logins sont donc résolus en
+    ID (`users/autocomplete`, mémorisé ; une requête iNat par login au plus).
+    Un login introuvable passe en `user_login` s'il est seul en cause ;
+    mêlé à des IDs (les deux filtres se cumuleraient), il lève `ValueError`.
+    """
+    users = params.get("user_id")
+    if not users:
+        return params
+    if isinstance(users, (str, int)):
+        users = [users]
+    users = [str(u).strip() for u in users if str(u).strip()]
+    if all(u.isdigit() for u in users):
+        return params
+    engine = engine or get_engine()
+    ids, unresolved = [], []
+    for user in users:
+        uid = user if user.isdigit() else _USER_IDS.get(user.lower())
+        if uid is None:
+            await limiter.acquire_async(_INAT_KEY, PRIORITY_INTERACTIVE)
+            _login, uid, _err = await engine.to_thread(resolve_inat_identity, user, session=session or _session())
+            if uid:
+                _USER_IDS[user.lower()] = uid
+        if uid:
+            ids.append(uid)
+        else:
+            unresolved.append(user)
+    out = {k: v for k, v in params.items() if k != "user_id"}
+    if not unresolved:
+        out["user_id"] = ids
+    elif not ids:
+        out["user_login"] = unresolved
+    else:
+        raise ValueError(f"Pseudo iNaturalist introuvable : {', '.join(unresolved)}")
+    return out
+
+
+def _parse_timestamp(value):
+    if not isinstance(value, str) or not value:
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+
+
+def convert_observation(obs: dict) -> dict:
+    """Normalise une observation brute de l'API (en place) ; la retourne."""
+    for field in _TIMESTAMP_FIELDS:
+        if field in obs:
+            obs[field] = _parse_timestamp(obs[field])
+    location = obs.get("location")
+    if isinstance(location, str) and "," in location:
+        try:
+            obs["location"] = [float(x) for x in location.split(",", 1)]
+        except ValueError:
+            pass
+    return obs
+
+
+async def fetch_page(params: dict, *, priority: int = PRIORITY_INTERACTIVE,
+                     timeout: float = DEFAULT_TIMEOUT, limiter=INAT_LIMITER, engine=None,
+                     session=None) -> dict:
+    """Une page de `/observations` (`total_results`, `results` en `Observation`).
+
+    Seuls les champs `SEARCH_FIELDS` sont demandés ; les logins de `user_id`
+    sont convertis par `user_params`.
+
+    Attend un jeton iNat sans bloquer la boucle ; 429 / 5xx et erreurs réseau
+    sont retentés (le gel est imposé par le limiteur). Une réponse finale
+    non-2xx lève `requests.HTTPError` (ex. 422 sur un `user_id` invalide).
+    """
+    engine = engine or get_engine()
+    session = session or _session()
+    params = await user_params(params, limiter=limiter, engine=engine, session=session)
+    query = dict(api_params(params), fields=_FIELDS_PARAM)
+    resp = None
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            await limiter.acquire_async(_INAT_KEY, priority)
+            resp = await engine.to_thread(
+                session.get, f"{INAT_API_URL}/observations", params=query, timeout=timeout,
+            )
+        except requests.exceptions.RequestException:
+            if attempt < MAX_ATTEMPTS - 1:
+                await asyncio.sleep(2 ** attempt + random.random())
+                continue
+            raise
+        limiter.feedback(_INAT_KEY, resp.status_code, resp.headers.get("Retry-After"), attempt)
+        if resp.status_code not in RETRYABLE_STATUSES:
+            break
+    resp.raise_for_status()
+    data = resp.json()
+    data["results"] = [Observation.from_api(convert_observation(obs)) for obs in data.get("results") or []]
+    return data
+
+
+class _CacheEntry:
+    __slots__ = ("results", "total", "fetched_at", "stored")
+
+    def __init__(self, results: list, total: int, fetched_at: datetime.datetime, stored: float):
+        self.results = results
+        self.total = total
+        self.fetched_at = fetched_at
+        self.stored = stored
+
+
+class SearchCache:
+    """Résultats de recherche par requête normalisée — TTL + LRU, thread-safe.
+
+    Partagé par toutes les sessions (les observations iNat sont publiques).
+    Une entrée est valable `ttl` secondes après la recherche complète qui l'a
+    créée ; les rafraîchissements delta ne la prolongent pas, pour que les
+    observations supprimées ou sorties des filtres finissent par disparaître.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(params: dict, fetch_limit: int, dates=None) -> tuple:
+        """Clé stable : paramètres API normalisés (hors pagination), limite, dates."""
+        query = api_params({
+            k: sorted(str(x) for x in v) if isinstance(v, (list, tuple, set)) else v
+            for k, v in params.items() if k not in ("page", "per_page")
+        })
+        if dates:
+            query = {k: v for k, v in query.items() if k not in ("d1", "d2")}
+        return (
+            tuple(sorted((k, str(v)) for k, v in query.items())),
+            int(fetch_limit),
+            tuple(str(d) for d in dates or ()),
+        )
+
+    def get(self, key, now: float | None = None) -> _CacheEntry | None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry.stored > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, results: list, total: int, fetched_at: datetime.datetime,
+            now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries[key] = _CacheEntry(list(results), total, fetched_at, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def merge(self, key, entry: _CacheEntry, delta: list, fetched_at: datetime.datetime,
+              limit: int | None = None) -> tuple[list, int]:
+        """Fusionne les observations modifiées depuis `entry.fetched_at` → (résultats, total).
+
+        Une observation déjà en cache est remplacée sur place ; une nouvelle
+        passe en tête (les plus récentes d'abord) et augmente le total.
+
+        Recherche tronquée (le cache ne garde que les `len(results)` plus
+        récentes sur `total`) : une observation absente du cache peut être une
+        ancienne simplement modifiée (nouvelle identification…). Seules celles
+        plus récentes que la plus récente en cache (ID supérieur) sont alors
+        ajoutées ; les autres sont ignorées, sans toucher au total.
+        """
+        updated = {obs["id"]: obs for obs in delta}
+        known = {obs["id"] for obs in entry.results}
+        new = [obs for obs in updated.values() if obs["id"] not in known]
+        if entry.results and len(entry.results) < entry.total:
+            newest = max(known)
+            new = sorted((obs for obs in new if obs["id"] > newest), key=lambda obs: obs["id"], reverse=True)
+        results = new + [updated.get(obs["id"], obs) for obs in entry.results]
+        if limit is not None:
+            results = results[:limit]
+        merged = _CacheEntry(results, entry.total + len(new), fetched_at, entry.stored)
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = merged
+        return merged.results, merged.total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+SEARCH_CACHE = SearchCache()
+
+
+async def _collect(params: dict, fetch_limit: int, fetch, budget: dict, on_batch=None) -> tuple[list, int]:
+    """Pages successives d'une requête → (observations, total_results de la page 1).
+
+    `budget` est partagé entre requêtes concurrentes (lu et modifié sur la
+    seule boucle) : `collected` = observations reçues, `pending` = pages en
+    vol. La page 1 est toujours lue (pour son total) ; une page suivante ne
+    part que si les reçues + les pages en vol restent sous `fetch_limit`.
+
+    Au-delà de `KEYSET_MIN_LIMIT`, pagination par clé : tri par id
+    décroissant (même ordre que le tri par défaut d'iNat, la date de
+    création) et `id_below` = plus petit id du lot précédent.
+
+    `on_batch(batch, total)` est appelé sur la boucle à chaque lot reçu
+    (`total` = total_results pour le premier lot, None ensuite).
+    """
+    per_page = max(1, min(PER_PAGE, fetch_limit))
+    keyset = fetch_limit > KEYSET_MIN_LIMIT
+    if keyset:
+        params = dict(params, order_by="id", order="desc")
+    page, last_id, results, total = 1, None, [], 0
+    while True:
+        request = dict(params, per_page=per_page)
+        if not keyset:
+            request["page"] = page
+        elif last_id is not None:
+            request["id_below"] = last_id
+        budget["pending"] += 1
+        try:
+            resp = await fetch(request)
+        finally:
+            budget["pending"] -= 1
+        if page == 1:
+            total = resp.get("total_results", 0) or 0
+        batch = resp.get("results") or []
+        results.extend(batch)
+        budget["collected"] += len(batch)
+        if on_batch is not None:
+            on_batch(batch, total if page == 1 else None)
+        if len(batch) < per_page or budget["collected"] + budget["pending"] * per_page >= fetch_limit:
+            return results, total
+        last_id = min(obs["id"] for obs in batch)
+        page += 1
+
+
+async def search_observations(params: dict, fetch_limit: int, dates=None, fetch=None,
+                              on_batch=None) -> tuple[list, int]:
+    """Observations correspondant à `params` → (résultats bruts, total disponible).
+
+    Sans `dates` : une seule requête paginée, tronquée à `fetch_limit`.
+
+    Avec `dates` (mode « Multi-dates ») : une requête `on=<date>` par date
+    (`d1`/`d2` retirés), lancées en parallèle. Le total disponible est la
+    somme des `total_results` des pages 1 — aucune requête supplémentaire.
+    Les résultats sont concaténés dans l'ordre des dates ; le dédoublonnage
+    reste à la charge de l'appelant.
+
+    `fetch` : coroutine `params -> réponse` (défaut : `fetch_page`).
+    `on_batch` : cf. `_collect` (lots non tronqués).
+    """
+    fetch = fetch or fetch_page
+    budget = {"collected": 0, "pending": 0}
+    if not dates:
+        results, total = await _collect(dict(params), fetch_limit, fetch, budget, on_batch)
+        return results[:fetch_limit], total
+
+    def _for_date(d) -> dict:
+        p = dict(params, on=d)
+        p.pop("d1", None)
+        p.pop("d2", None)
+        return p
+
+    outcomes = await asyncio.gather(
+        *(_collect(_for_date(d), fetch_limit, fetch, budget, on_batch) for d in dates)
+    )
+    results = [obs for batch, _ in outcomes for obs in batch]
+    return results, sum(total for _, total in outcomes)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def stream_search(params: dict, fetch_limit: int, dates=None, fetch=None, engine=None,
+                  poll: float = 0.1, cache: SearchCache | None = None):
+    """`search_observations` vu depuis un thread de script : générateur de
+    `(lot, total_connu)` au fil des réponses.
+
+    La recherche tourne sur la boucle partagée ; les lots transitent par une
+    file thread-safe. `total_connu` cumule les `total_results` déjà reçus (il
+    est exact au dernier lot). Les lots sont tronqués pour que leur somme ne
+    dépasse pas `fetch_limit` hors multi-dates. Une erreur de la recherche est
+    levée par le générateur, après les lots déjà reçus.
+
+    Avec `cache` : une requête déjà en cache ne demande que les observations
+    modifiées depuis (`updated_since`) et rend un seul lot fusionné ; sinon
+    le résultat complet est mis en cache à la fin.
+    """
+    engine = engine or get_engine()
+    key = cache.key(params, fetch_limit, dates) if cache is not None else None
+    started = _utcnow()
+    entry = cache.get(key) if cache is not None else None
+    if entry is not None:
+        since = (entry.fetched_at - _DELTA_OVERLAP).isoformat()
+        delta, _ = engine.run(search_observations(
+            dict(params, updated_since=since), fetch_limit, dates=dates, fetch=fetch,
+        ))
+        yield cache.merge(key, entry, delta, started, limit=None if dates else fetch_limit)
+        return
+
+    batches: queue.Queue = queue.Queue()
+    future = engine.submit(search_observations(
+        params, fetch_limit, dates=dates, fetch=fetch,
+        on_batch=lambda batch, total: batches.put((batch, total)),
+    ))
+    known_total, remaining, received = 0, None if dates else fetch_limit, []
+    try:
+        while True:
+            try:
+                batch, total = batches.get(timeout=poll)
+            except queue.Empty:
+                if future.done() and batches.empty():
+                    break
+                continue
+            known_total += total or 0
+            if remaining is not None:
+                batch, remaining = batch[:remaining], max(0, remaining - len(batch))
+            received.extend(batch)
+            yield batch, known_total
+    finally:
+        future.cancel()  # appelant parti avant la fin : on arrête de paginer
+    future.result()  # propage l'erreur éventuelle
+    if cache is not None:
+        cache.put(key, received, known_total, started)
@@ -40,6 +40,8 @@ def create_label_flowables(obs, styles, options):
              date_str = str(obs_date)[:10]
     elif obs.get('observed_on_string'):
         date_str = str(obs.get('observed_on_string'))
+    elif obs.get('observed_on'):
+        date_str = str(obs.get('observed_on'))[:10]
         
     place = obs.get('place_guess', 'Lieu inconnu')
     
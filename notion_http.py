@@ -0,0 +1,338 @@
+"""notion_http.py — Client HTTP Notion unique, mutualisé pour tout le processus.
+
+Centralise ce qui était recopié dans chaque fonction de `app.py` et
+`enricher.py` : en-têtes (`Notion-Version`), timeouts, retries, pagination.
+
+  - **Pool keep-alive** : une `requests.Session` par token, partagée par toutes
+    les sessions Streamlit et tous les threads → la poignée de main TLS n'est
+    payée qu'une fois, plus à chaque rerun.
+  - **Retries** : 429 / 5xx passent par `ratelimit.NOTION_LIMITER` (attente
+    Retry-After, débit adaptatif) ; erreurs réseau → back-off exponentiel.
+  - **Pagination** : `iter_query()` parcourt les curseurs `start_cursor` /
+    `next_cursor` et renvoie les lots au fil de l'eau, avec une page d'avance
+    (la requête suivante part pendant que l'appelant traite le lot courant).
+  - **Asyncio** : `get_async_client()` expose les mêmes appels en coroutines,
+    sur la boucle partagée `aio_engine` — même session, même limiteur.
+
+Nommé `notion_http` (et non `notion_client`) pour ne pas masquer le paquet
+PyPI `notion-client` du même nom.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from aio_engine import get_engine
+from ratelimit import NOTION_LIMITER, PRIORITY_NORMAL, RETRYABLE_STATUSES
+
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+DEFAULT_TIMEOUT = 60
+MAX_ATTEMPTS = 5
+
+# Threads de préchargement partagés par toutes les paginations en cours.
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="notion-prefetch")
+
+
+class NotionAPIError(requests.exceptions.HTTPError):
+    """Réponse HTTP non-2xx de Notion — le message inclut le `code`/`message` renvoyé."""
+
+    def __init__(self, response: requests.Response):
+        detail = ""
+        try:
+            body = response.json()
+            detail = f"{body.get('code', '')}: {body.get('message', '')}".strip(": ")
+        except ValueError:
+            detail = (response.text or "")[:300]
+        super().__init__(f"Notion HTTP {response.status_code} — {detail}", response=response)
+        self.status = response.status_code
+
+
+def _filter_properties_qs(filter_properties: list[str] | None) -> str:
+    """Query string `filter_properties=…` — les IDs sont déjà encodés (ex. `NmF%3F`),
+    on ne passe donc PAS par `params=` (qui ré-encoderait le `%`).
+    """
+    if not filter_properties:
+        return ""
+    return "?" + "&".join(f"filter_properties={p}" for p in filter_properties)
+
+
+def _api_url(path: str) -> str:
+    return path if path.startswith("http") else f"{NOTION_API_URL}/{path.lstrip('/')}"
+
+
+def _create_page_body(database_id: str, properties: dict, children: list | None) -> dict:
+    body = {"parent": {"database_id": database_id, "type": "database_id"}, "properties": properties}
+    if children:
+        body["children"] = children
+    return body
+
+
+class NotionHTTPClient:
+    """Client Notion minimal au-dessus d'une session `requests` poolée."""
+
+    def __init__(self, token: str, pool_maxsize: int = 16, limiter=NOTION_LIMITER):
+        self.token = token
+        self.limiter = limiter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Notion-Version": NOTION_VERSION,
+            "Content-Type": "application/json",
+        })
+
+    # ── Requête unitaire ─────────────────────────────────────────────────────
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        json: dict | None = None,
+        priority: int = PRIORITY_NORMAL,
+        timeout: float = DEFAULT_TIMEOUT,
+        raise_for_status: bool = True,
+    ) -> requests.Response:
+        """Envoie `method path` (relatif à /v1) avec retry ; retourne la réponse.
+
+        429 / 5xx : re-tente jusqu'à `MAX_ATTEMPTS` fois (l'attente est imposée
+        par le limiteur). Erreur réseau : back-off exponentiel, puis re-raise.
+        Si `raise_for_status`, une réponse finale non-2xx lève `NotionAPIError`.
+        """
+        url = _api_url(path)
+        resp = None
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                self.limiter.acquire(self.token, priority)
+                resp = self.session.request(method, url, json=json, timeout=timeout)
+            except requests.exceptions.RequestException:
+                if attempt < MAX_ATTEMPTS - 1:
+                    time.sleep(2 ** attempt + random.random())
+                    continue
+                raise
+            self.limiter.feedback(self.token, resp.status_code, resp.headers.get("Retry-After"), attempt)
+            if resp.status_code not in RETRYABLE_STATUSES:
+                break
+        if raise_for_status and not (200 <= resp.status_code < 300):
+            raise NotionAPIError(resp)
+        return resp
+
+    # ── Raccourcis ───────────────────────────────────────────────────────────
+
+    def get_database(self, db_id: str, **kw) -> dict:
+        return self.request("GET", f"databases/{db_id}", **kw).json()
+
+    def get_page(self, page_id: str, **kw) -> dict:
+        return self.request("GET", f"pages/{page_id}", **kw).json()
+
+    def create_page(self, database_id: str, properties: dict, children: list | None = None, **kw) -> dict:
+        return self.request("POST", "pages", json=_create_page_body(database_id, properties, children), **kw).json()
+
+    def update_page(self, page_id: str, properties: dict, **kw) -> dict:
+        return self.request("PATCH", f"pages/{page_id}", json={"properties": properties}, **kw).json()
+
+    def query_database(
+        self,
+        db_id: str,
+        body: dict | None = None,
+        filter_properties: list[str] | None = None,
+        **kw,
+    ) -> dict:
+        """Une seule page de résultats (`results`, `has_more`, `next_cursor`)."""
+        path = f"databases/{db_id}/query{_filter_properties_qs(filter_properties)}"
+        return self.request("POST", path, json=dict(body or {}), **kw).json()
+
+    # ── Pagination ───────────────────────────────────────────────────────────
+
+    def iter_query(
+        self,
+        db_id: str,
+        body: dict | None = None,
+        filter_properties: list[str] | None = None,
+        limit: int | None = None,
+        prefetch: bool = True,
+        **kw,
+    ):
+        """Itère sur les lots (listes de pages, ≤ 100) d'une requête de DB.
+
+        `body` : filtre / tri Notion (non muté). `limit` : arrête après ce
+        nombre de pages au total (le `page_size` du dernier appel est ajusté).
+
+        `prefetch` : dès que `next_cursor` est connu, la requête suivante part
+        dans un thread pendant que l'appelant traite le lot courant (la
+        pagination Notion est séquentielle : c'est le seul recouvrement
+        possible). Une erreur de la requête préchargée est levée au moment où
+        son lot est demandé. Arrêter l'itération tôt gaspille au plus une requête.
+        """
+        payload = dict(body or {})
+        fetched = 0
+
+        def _next_payload(cursor):
+            page_size = 100 if limit is None else min(100, limit - fetched)
+            if page_size <= 0:
+                return None
+            nxt = dict(payload, page_size=page_size)
+            if cursor:
+                nxt["start_cursor"] = cursor
+            return nxt
+
+        request = _next_payload(None)
+        pending = None
+        while request is not None:
+            data = pending.result() if pending is not None else self.query_database(
+                db_id, request, filter_properties, **kw)
+            pending = None
+            batch = data.get("results", [])
+            fetched += len(batch)
+            request = None
+            if data.get("has_more") and data.get("next_cursor"):
+                request = _next_payload(data["next_cursor"])
+            if request is not None and prefetch:
+                pending = _PREFETCH_POOL.submit(self.query_database, db_id, request, filter_properties, **kw)
+            try:
+                yield batch
+            except GeneratorExit:
+                if pending is not None:
+                    pending.cancel()
+                raise
+
+
+class AsyncNotionHTTPClient:
+    """Mêmes appels que `NotionHTTPClient`, en coroutines (boucle `aio_engine`).
+
+    Partage la session poolée et le limiteur du client synchrone : l'attente
+    d'un jeton est asynchrone (`acquire_async`), seul l'aller-retour HTTP
+    occupe un thread du pool d'E/S.
+    """
+
+    def __init__(self, client: NotionHTTPClient, engine=None):
+        self.client = client
+        self.token = client.token
+        self.limiter = client.limiter
+        self.engine = engine or get_engine()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        json: dict | None = None,
+        priority: int = PRIORITY_NORMAL,
+        timeout: float = DEFAULT_TIMEOUT,
+        raise_for_status: bool = True,
+    ) -> requests.Response:
+        """Cf. `NotionHTTPClient.request` — mêmes retries, mêmes erreurs."""
+        url = _api_url(path)
+        resp = None
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                await self.limiter.acquire_async(self.token, priority)
+                resp = await self.engine.to_thread(
+                    self.client.session.request, method, url, json=json, timeout=timeout,
+                )
+            except requests.exceptions.RequestException:
+                if attempt < MAX_ATTEMPTS - 1:
+                    await asyncio.sleep(2 ** attempt + random.random())
+                    continue
+                raise
+            self.limiter.feedback(self.token, resp.status_code, resp.headers.get("Retry-After"), attempt)
+            if resp.status_code not in RETRYABLE_STATUSES:
+                break
+        if raise_for_status and not (200 <= resp.status_code < 300):
+            raise NotionAPIError(resp)
+        return resp
+
+    async def get_page(self, page_id: str, **kw) -> dict:
+        return (await self.request("GET", f"pages/{page_id}", **kw)).json()
+
+    async def create_page(self, database_id: str, properties: dict, children: list | None = None, **kw) -> dict:
+        body = _create_page_body(database_id, properties, children)
+        return (await self.request("POST", "pages", json=body, **kw)).json()
+
+    async def update_page(self, page_id: str, properties: dict, **kw) -> dict:
+        return (await self.request("PATCH", f"pages/{page_id}", json={"properties": properties}, **kw)).json()
+
+    async def query_database(
+        self,
+        db_id: str,
+        body: dict | None = None,
+        filter_properties: list[str] | None = None,
+        **kw,
+    ) -> dict:
+        path = f"databases/{db_id}/query{_filter_properties_qs(filter_properties)}"
+        return (await self.request("POST", path, json=dict(body or {}), **kw)).json()
+
+    async def iter_query(
+        self,
+        db_id: str,
+        body: dict | None = None,
+        filter_properties: list[str] | None = None,
+        limit: int | None = None,
+        **kw,
+    ):
+        """Générateur asynchrone de lots — cf. `NotionHTTPClient.iter_query`
+        (page suivante demandée pendant le traitement du lot courant)."""
+        payload = dict(body or {})
+        fetched = 0
+
+        def _next_payload(cursor):
+            page_size = 100 if limit is None else min(100, limit - fetched)
+            if page_size <= 0:
+                return None
+            nxt = dict(payload, page_size=page_size)
+            if cursor:
+                nxt["start_cursor"] = cursor
+            return nxt
+
+        request = _next_payload(None)
+        if request is None:
+            return
+        pending = asyncio.ensure_future(self.query_database(db_id, request, filter_properties, **kw))
+        try:
+            while pending is not None:
+                data = await pending
+                pending = None
+                batch = data.get("results", [])
+                fetched += len(batch)
+                if data.get("has_more") and data.get("next_cursor"):
+                    request = _next_payload(data["next_cursor"])
+                    if request is not None:
+                        pending = asyncio.ensure_future(
+                            self.query_database(db_id, request, filter_properties, **kw))
+                yield batch
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+
+_CLIENTS: dict[str, NotionHTTPClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+_ASYNC_CLIENTS: dict[str, AsyncNotionHTTPClient] = {}
+
+
+def get_client(token: str) -> NotionHTTPClient:
+    """Client partagé (un par token) — à utiliser partout plutôt que `requests` nu."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(token)
+        if client is None:
+            client = _CLIENTS[token] = NotionHTTPClient(token)
+        return client
+
+
+def get_async_client(token: str) -> AsyncNotionHTTPClient:
+    """Client asynchrone partagé (un par token), adossé à `get_client(token)`."""
+    client = get_client(token)
+    with _CLIENTS_LOCK:
+        aclient = _ASYNC_CLIENTS.get(token)
+        if aclient is None:
+            aclient = _ASYNC_CLIENTS[token] = AsyncNotionHTTPClient(client)
+        return aclient
@@ -0,0 +1,302 @@
+"""obs_index.py — Index local des observations iNat déjà importées dans Notion.
+
+La vérification des doublons interrogeait Notion par paquets de 100 IDs
+(filtre `or` de `url contains`) : sur une grosse recherche (« Tout » = 10 000
+obs), des centaines de requêtes → timeout → « ⚠️ Non vérifié ».
+
+Ici, on maintient une copie locale (SQLite, `.cache/`) de tous les IDs iNat
+présents dans la BD Observations, chargée en mémoire sous forme de `set` :
+le contrôle de 10 000 IDs devient une intersection d'ensembles.
+
+Tenue à jour :
+  - **import réussi** → `add()` immédiat (pas d'attente de la prochaine synchro) ;
+  - **synchro delta** → pages modifiées depuis la dernière synchro
+    (`last_edited_time`), quelques requêtes ; l'ancien ID d'une page dont
+    l'URL a changé est retiré ;
+  - **synchro complète** → liste de toutes les pages (propriétés URL et
+    Mycologue seules), qui purge aussi les pages supprimées/archivées. Faite à
+    la première utilisation puis une fois par jour, en arrière-plan.
+
+Limite : la requête Notion ne renvoie jamais les pages archivées ou à la
+corbeille, la synchro delta ne peut donc pas les voir disparaître. Une page
+archivée reste « déjà importée » jusqu'à la synchro complète suivante, au
+plus `FULL_SYNC_INTERVAL` (24 h) plus tard.
+
+L'index garde aussi le Mycologue de chaque page : le compteur du tableau de
+bord (« Notion (nom) ») devient un `COUNT(*)` local au lieu de paginer toutes
+les observations du membre.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from notion_http import get_client
+from ratelimit import PRIORITY_BULK
+
+DEFAULT_INDEX_DIR = ".cache"
+# Version du schéma SQLite : un changement force une resynchro complète.
+SCHEMA_VERSION = 2
+DELTA_SYNC_INTERVAL = 60            # s — au plus une synchro delta par minute
+FULL_SYNC_INTERVAL = 24 * 3600      # s — purge des pages supprimées
+# Notion arrondit `last_edited_time` à la minute : on recule le point de reprise.
+_SYNC_OVERLAP_SECONDS = 120
+
+_INAT_ID_RE = re.compile(r"/observations/(\d+)")
+
+
+def inat_id_from_url(url: str | None) -> int | None:
+    """'https://www.inaturalist.org/observations/123' → 123 (None si non reconnu)."""
+    if not url:
+        return None
+    match = _INAT_ID_RE.search(url)
+    return int(match.group(1)) if match else None
+
+
+def _notion_timestamp(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ts))
+
+
+def _drop_provisional(conn: sqlite3.Connection, rows) -> None:
+    """Supprime les clés provisoires `inat:N` des IDs portés par une vraie page de `rows`."""
+    conn.executemany(
+        "DELETE FROM pages WHERE page_id = ?",
+        [(f"inat:{r[1]}",) for r in rows if r[1] is not None and r[0] != f"inat:{r[1]}"],
+    )
+
+
+class ObservationIndex:
+    """Ensemble persistant des IDs iNat importés dans une BD Observations (thread-safe)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if self._meta.get("schema_version") != str(SCHEMA_VERSION):
+                # Ancien format (v1 : une ligne par ID iNat, sans page ni
+                # mycologue) → on repart de zéro ; la prochaine synchro est complète.
+                conn.execute("DROP TABLE IF EXISTS observations")
+                conn.execute("DROP TABLE IF EXISTS pages")
+                conn.execute("DELETE FROM meta")
+                self._meta = {}
+                self._set_meta(conn, "schema_version", SCHEMA_VERSION)
+            # Une ligne par page Notion : inat_id NULL pour une page sans URL
+            # iNat (saisie à la main) — elle compte quand même pour son mycologue.
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " page_id TEXT PRIMARY KEY, inat_id INTEGER, mycologue TEXT, added_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_inat_id ON pages (inat_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_mycologue ON pages (mycologue)")
+            self._ids: set[int] = {
+                row[0] for row in conn.execute("SELECT inat_id FROM pages WHERE inat_id IS NOT NULL")
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value) -> None:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+        self._meta[key] = str(value)
+
+    def _meta_float(self, key: str) -> float:
+        try:
+            return float(self._meta.get(key) or 0.0)
+        except ValueError:
+            return 0.0
+
+    # ── Lecture ──────────────────────────────────────────────────────────────
+
+    @property
+    def ready(self) -> bool:
+        """True une fois la première synchro complète terminée."""
+        return self._meta_float("full_synced_at") > 0
+
+    @property
+    def synced_at(self) -> float:
+        return self._meta_float("synced_at")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, inat_id) -> bool:
+        try:
+            return int(inat_id) in self._ids
+        except (TypeError, ValueError):
+            return False
+
+    def existing(self, ids) -> set[str]:
+        """Sous-ensemble de `ids` (str ou int) déjà présent dans Notion, en str."""
+        with self._lock:
+            return {str(i) for i in ids if i in self}
+
+    def count_by_mycologue(self, mycologue: str) -> int:
+        """Nombre de pages de la BD dont la colonne Mycologue vaut `mycologue`."""
+        with self._lock, self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM pages WHERE mycologue = ?", (mycologue,)).fetchone()[0]
+
+    def sync_due(self, now: float | None = None) -> str | None:
+        """'full', 'delta' ou None selon l'âge des dernières synchros."""
+        now = time.time() if now is None else now
+        if now - self._meta_float("full_synced_at") > FULL_SYNC_INTERVAL:
+            return "full"
+        if now - self.synced_at > DELTA_SYNC_INTERVAL:
+            return "delta"
+        return None
+
+    # ── Écriture ─────────────────────────────────────────────────────────────
+
+    def add(self, inat_id, page_id: str | None = None, mycologue: str | None = None) -> None:
+        """Enregistre un import réussi (appelé depuis les threads d'import).
+
+        Sans `page_id`, une clé provisoire est utilisée ; la vraie page
+        (import ou synchro suivante) la remplace.
+        """
+        self.add_many([(inat_id, page_id, mycologue)])
+
+    def add_many(self, rows) -> None:
+        """`rows` : itérable de (inat_id, page_id, mycologue).
+
+        Une clé provisoire n'est pas écrite si l'ID a déjà une vraie page, et
+        une vraie page supprime la clé provisoire de son ID : une observation
+        ne compte qu'une fois pour son mycologue.
+        """
+        now = time.time()
+        rows = [
+            (p or f"inat:{int(i)}", int(i) if i is not None else None, m, now)
+            for i, p, m in rows
+        ]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            for row in rows:
+                if row[1] is not None and row[0] == f"inat:{row[1]}" and conn.execute(
+                    "SELECT 1 FROM pages WHERE inat_id = ? AND page_id != ? LIMIT 1", (row[1], row[0])
+                ).fetchone():
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO pages (page_id, inat_id, mycologue, added_at) VALUES (?, ?, ?, ?)", row
+                )
+            _drop_provisional(conn, rows)
+            self._ids.update(r[1] for r in rows if r[1] is not None)
+
+    # ── Synchronisation avec Notion ──────────────────────────────────────────
+
+    def sync(
+        self,
+        token: str,
+        db_id: str,
+        url_property: str,
+        url_property_id: str | None = None,
+        full: bool = False,
+        mycologue_property: str = "Mycologue",
+        mycologue_property_id: str | None = None,
+    ) -> int:
+        """Synchronise l'index avec la BD Observations. Retourne le nombre de pages lues.
+
+        Delta (défaut, si une synchro complète a déjà eu lieu) : pages modifiées
+        depuis la dernière synchro (les pages archivées / supprimées, absentes
+        des réponses Notion, ne sont purgées qu'à la synchro complète
+        suivante — cf. docstring du module). Complète (`full=True` ou
+        index jamais synchronisé) : toutes les pages ; les pages absentes sont
+        purgées, sauf celles ajoutées par `add()` pendant la synchro.
+
+        Si les IDs encodés des colonnes URL et Mycologue (lus dans le schéma)
+        sont tous deux fournis, la réponse est limitée à ces deux propriétés.
+        Les erreurs réseau/HTTP remontent à l'appelant ; l'index reste alors
+        inchangé.
+        """
+        with self._sync_lock:
+            started_at = time.time()
+            full = full or not self.ready
+            body = None
+            if not full:
+                since = _notion_timestamp(self.synced_at - _SYNC_OVERLAP_SECONDS)
+                body = {"filter": {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}}
+
+            rows = []
+            filter_properties = None
+            if url_property_id and mycologue_property_id:
+                filter_properties = [url_property_id, mycologue_property_id]
+            for batch in get_client(token).iter_query(
+                db_id, body, filter_properties=filter_properties, priority=PRIORITY_BULK,
+            ):
+                for page in batch:
+                    props = page.get("properties", {})
+                    inat_id = inat_id_from_url(props.get(url_property, {}).get("url"))
+                    mycologue = (props.get(mycologue_property, {}).get("select") or {}).get("name")
+                    rows.append((page["id"], inat_id, mycologue, started_at))
+            n_pages = len(rows)
+
+            with self._lock, self._connect() as conn:
+                # Clés provisoires de `add()` remplacées par les vraies pages
+                # (y compris celles ajoutées pendant une synchro complète).
+                _drop_provisional(conn, rows)
+                if full:
+                    conn.execute("DELETE FROM pages WHERE added_at < ?", (started_at,))
+                else:
+                    # IDs iNat portés jusqu'ici par les pages relues (leur URL a pu
+                    # changer) : à revérifier après écriture.
+                    stale = set()
+                    for page_id in (r[0] for r in rows):
+                        row = conn.execute("SELECT inat_id FROM pages WHERE page_id = ?", (page_id,)).fetchone()
+                        if row and row[0] is not None:
+                            stale.add(row[0])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pages (page_id, inat_id, mycologue, added_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                if full:
+                    self._ids = {
+                        row[0] for row in conn.execute("SELECT inat_id FROM pages WHERE inat_id IS NOT NULL")
+                    }
+                    self._set_meta(conn, "full_synced_at", started_at)
+                else:
+                    self._ids.update(r[1] for r in rows if r[1] is not None)
+                    for inat_id in stale:
+                        if conn.execute("SELECT 1 FROM pages WHERE inat_id = ? LIMIT 1", (inat_id,)).fetchone() is None:
+                            self._ids.discard(inat_id)
+                self._set_meta(conn, "synced_at", started_at)
+
+            print(f"[ObsIndex] Synchro {'complète' if full else 'delta'} : "
+                  f"{n_pages} page(s) lue(s), {len(self._ids)} obs indexées "
+                  f"en {time.time() - started_at:.1f}s")
+            return n_pages
+
+    def sync_async(self, *args, **kwargs) -> threading.Thread | None:
+        """`sync()` dans un thread daemon ; None si une synchro est déjà en cours."""
+        if self._sync_lock.locked():
+            return None
+
+        def _run():
+            try:
+                self.sync(*args, **kwargs)
+            except Exception as e:
+                print(f"[ObsIndex] Synchro en arrière-plan échouée : {e}")
+
+        thread = threading.Thread(target=_run, name="obs-index-sync", daemon=True)
+        thread.start()
+        return thread
+
+
+_INDEXES: dict[str, ObservationIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_index(db_id: str, directory: str = DEFAULT_INDEX_DIR) -> ObservationIndex:
+    """Index partagé (un par BD Observations) pour tout le processus."""
+    key = (db_id or "").replace("-", "").lower()
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            path = os.path.join(directory, f"obs_index_{key[:12] or 'default'}.sqlite")
+            index = _INDEXES[key] = ObservationIndex(path)
+        return index
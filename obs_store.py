@@ -0,0 +1,193 @@
+"""obs_store.py — Magasin d'observations de la session (sans dépendance Streamlit).
+
+Après une recherche, les observations vivaient en double : la liste
+`search_results` (objets iNat) et le DataFrame `main_import_df` (colonnes de
+l'aperçu). Chaque rerun recopiait le DataFrame (`df_main.copy()`, deux fois)
+et chaque import ou impression reconstruisait `obs_map = {id: obs}`.
+
+Ici, UN DataFrame indexé par l'ID iNat porte tout :
+
+  - les colonnes de l'aperçu (affichées, éditables ou non) ;
+  - la colonne technique `_obs` : l'observation iNat elle-même
+    (`inat_search.Observation`), lue par l'import et les étiquettes.
+
+La recherche d'une observation par ID est un accès d'index, les filtres de
+l'aperçu rendent un index (pas une copie), et seules les lignes visibles sont
+copiées pour le `st.data_editor`.
+"""
+
+from __future__ import annotations
+
+import pandas as pd
+
+# Colonnes du tableau d'aperçu, dans l'ordre d'affichage.
+PREVIEW_COLUMNS = (
+    "Import?", "Déjà importé", "ID", "Taxon", "Date", "Lieu", "Mycologue", "Tags", "GPS",
+    "Description", "Collection", "No° Fongarium", "Identificateur", "Lien", "_is_new",
+)
+OBS_COLUMN = "_obs"
+
+
+def _tags_text(tags) -> str:
+    tag_list = []
+    for t in tags or []:
+        if isinstance(t, dict):
+            tag_list.append(t.get("tag", ""))
+        elif isinstance(t, str):
+            tag_list.append(t)
+        else:
+            tag_list.append(str(t))
+    return ", ".join(tag_list)
+
+
+def _gps_text(loc) -> str:
+    # location est une chaîne "lat,lon" ou une liste [lat, lon]
+    if not loc:
+        return ""
+    try:
+        if isinstance(loc, str):
+            return loc
+        if isinstance(loc, (list, tuple)):
+            return f"{loc[0]}, {loc[1]}"
+    except (IndexError, TypeError):
+        return "Oui"
+    return ""
+
+
+def preview_row(obs, existing_ids: set, dedup_check_failed: bool = False) -> dict:
+    """Ligne de l'aperçu d'import pour une observation iNat.
+
+    `existing_ids` : IDs (str) déjà présents dans Notion. Si la vérification
+    des doublons a échoué, la case « Import? » est décochée par défaut et le
+    statut vaut « ⚠️ Non vérifié » pour forcer une décision manuelle.
+    """
+    d_val = obs.get("time_observed_at")
+    date_str = str(d_val)[:10] if d_val else (str(obs.get("observed_on") or "")[:10] or "Inconnue")
+    obs_id_str = str(obs["id"])
+    is_new = obs_id_str not in existing_ids
+    if dedup_check_failed:
+        default_import, statut = False, "⚠️ Non vérifié"
+    else:
+        default_import, statut = is_new, ("🔴 Oui" if not is_new else "🟢 Non")
+    return {
+        "Import?": default_import,
+        "Déjà importé": statut,
+        "ID": obs_id_str,
+        "Taxon": (obs.get("taxon") or {}).get("name") or "Inconnu",
+        "Date": date_str,
+        "Lieu": obs.get("place_guess") or "Inconnu",
+        "Mycologue": (obs.get("user") or {}).get("login") or "Inconnu",
+        "Tags": _tags_text(obs.get("tags", [])),
+        "GPS": _gps_text(obs.get("location")),
+        "Description": obs.get("description", "") or "",
+        "Collection": False,
+        "No° Fongarium": "",
+        "Identificateur": "",
+        "Lien": obs.get("uri") or f"https://www.inaturalist.org/observations/{obs['id']}",
+        "_is_new": is_new,  # Colonne technique pour un filtrage robuste
+    }
+
+
+class ObservationStore:
+    """Observations d'une recherche + état d'édition de l'aperçu, indexés par ID iNat."""
+
+    def __init__(self, frame: pd.DataFrame | None = None):
+        if frame is None:
+            frame = pd.DataFrame(columns=[*PREVIEW_COLUMNS, OBS_COLUMN])
+        self.frame = frame
+
+    @classmethod
+    def from_search(cls, observations, existing_ids=(), dedup_check_failed: bool = False) -> "ObservationStore":
+        """Magasin construit à partir des résultats (dédoublonnés) d'une recherche."""
+        existing_ids = set(existing_ids)
+        rows, ids = [], []
+        for obs in observations:
+            row = preview_row(obs, existing_ids, dedup_check_failed)
+            row[OBS_COLUMN] = obs
+            rows.append(row)
+            ids.append(int(obs["id"]))
+        frame = pd.DataFrame(rows, index=pd.Index(ids, name="inat_id"),
+                             columns=[*PREVIEW_COLUMNS, OBS_COLUMN])
+        return cls(frame)
+
+    # ── Lecture ──────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def empty(self) -> bool:
+        return self.frame.empty
+
+    def __contains__(self, inat_id) -> bool:
+        try:
+            return int(inat_id) in self.frame.index
+        except (TypeError, ValueError):
+            return False
+
+    def observation(self, inat_id):
+        """Observation iNat de l'ID (str ou int) — None si absente."""
+        if inat_id not in self:
+            return None
+        return self.frame.at[int(inat_id), OBS_COLUMN]
+
+    def observations(self, ids=None) -> list:
+        """Observations des `ids` présents (dans l'ordre demandé), ou toutes."""
+        if ids is None:
+            return self.frame[OBS_COLUMN].tolist()
+        return [self.frame.at[int(i), OBS_COLUMN] for i in ids if i in self]
+
+    def dates(self) -> list:
+        """Dates distinctes de l'aperçu, les plus récentes d'abord."""
+        return sorted(self.frame["Date"].unique().tolist(), reverse=True)
+
+    def view_index(self, dates=None, hide_imported: bool = False, limit=None) -> pd.Index:
+        """Index des lignes visibles selon les filtres de l'aperçu (aucune copie)."""
+        mask = pd.Series(True, index=self.frame.index)
+        if dates:
+            mask &= self.frame["Date"].isin(dates)
+        if hide_imported:
+            mask &= self.frame["_is_new"].astype(bool)
+        index = self.frame.index[mask.to_numpy()]
+        return index if limit is None else index[: int(limit)]
+
+    def editor_frame(self, index) -> pd.DataFrame:
+        """Lignes `index` pour `st.data_editor` (sans la colonne des observations)."""
+        return self.frame.loc[index, list(PREVIEW_COLUMNS)]
+
+    def selected_mask(self) -> pd.Series:
+        """Lignes cochées « Import? »."""
+        return self.frame["Import?"].eq(True).fillna(False)
+
+    def selected(self) -> pd.DataFrame:
+        """Lignes cochées « Import? » (avec leur observation en `_obs`)."""
+        return self.frame[self.selected_mask()]
+
+    # ── Écriture ─────────────────────────────────────────────────────────────
+
+    def apply_edits(self, view_index, edited_rows: dict) -> int:
+        """Reporte les `edited_rows` d'un `st.data_editor` (positions dans la
+        vue `view_index`) dans le magasin. Retourne le nombre de cellules écrites."""
+        n = 0
+        for row_pos, changes in (edited_rows or {}).items():
+            row_pos = int(row_pos)
+            if not 0 <= row_pos < len(view_index):
+                continue
+            label = view_index[row_pos]
+            for col, value in changes.items():
+                if col in PREVIEW_COLUMNS:
+                    self.frame.at[label, col] = value
+                    n += 1
+        return n
+
+    def set_column(self, rows, column: str, value) -> None:
+        """Affecte `value` à `column` pour `rows` (index ou masque booléen)."""
+        self.frame.loc[rows, column] = value
+
+    def restore_descriptions(self, rows) -> int:
+        """Remet la description iNat d'origine sur `rows` ; retourne le nombre de lignes modifiées."""
+        original = self.frame.loc[rows, OBS_COLUMN].map(lambda obs: obs.get("description") or "")
+        changed = original[self.frame.loc[rows, "Description"] != original]
+        if len(changed):
+            self.frame.loc[changed.index, "Description"] = changed
+        return len(changed)
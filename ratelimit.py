@@ -0,0 +1,334 @@
+"""Ordonnanceur token-bucket partagé par tout le processus (sans dépendance Streamlit).
+
+Notion limite chaque intégration à ~3 requêtes/s en moyenne. Streamlit fait
+tourner TOUTES les sessions dans un seul processus : sans coordination, chaque
+appelant (pool de dédup à 8 threads, import à 2 threads, batch_resolve,
+dashboard…) retente dans son coin et l'ensemble s'effondre en rafales de 429.
+
+Ce module centralise le débit :
+
+  - **Un seau par token** (`key`) : deux intégrations Notion distinctes ont
+    chacune leur budget.
+  - **Classes de priorité** : à jeton disponible, la requête INTERACTIVE
+    (lecture du tableau de bord) passe avant la requête BULK (écritures de
+    `batch_resolve`) — FIFO à priorité égale.
+  - **Back-off adaptatif** : un 429 gèle le seau pendant `Retry-After` et
+    réduit le débit (décroissance multiplicative) ; chaque succès le fait
+    remonter doucement vers le plafond (croissance additive).
+  - **Concurrence adaptative** : `AdaptiveConcurrency` règle le nombre de
+    tâches lancées en parallèle (import) d'après les 429/5xx et la latence.
+  - **iNaturalist** : `INAT_LIMITER` applique la même mécanique au budget
+    recommandé par iNat (~1 req/s) pour les recherches (`inat_search`).
+
+Usage typique :
+
+    from ratelimit import NOTION_LIMITER, PRIORITY_BULK
+    NOTION_LIMITER.acquire(token, priority=PRIORITY_BULK)
+    resp = session.post(...)
+    NOTION_LIMITER.feedback(token, resp.status_code, resp.headers.get("Retry-After"))
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Classes de priorité (plus petit = servi en premier).
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+# Intervalle de ré-examen d'une coroutine en attente derrière une autre requête.
+_ASYNC_POLL = 0.05
+
+# Codes HTTP qui signalent une surcharge → back-off.
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def retry_after_seconds(retry_after, attempt: int) -> float:
+    """Délai d'attente avant une nouvelle tentative.
+
+    Respecte l'en-tête `Retry-After` (en secondes) s'il est lisible, sinon
+    back-off exponentiel avec jitter (`2**attempt + [0, 1[`).
+    """
+    try:
+        if retry_after not in (None, ""):
+            return max(0.0, float(retry_after))
+    except (ValueError, TypeError):
+        pass
+    return 2 ** attempt + random.random()
+
+
+class _Bucket:
+    __slots__ = ("rate", "tokens", "updated", "blocked_until", "waiters", "throttled", "overloaded")
+
+    def __init__(self, rate: float, now: float):
+        self.rate = rate
+        self.tokens = 1.0
+        self.updated = now
+        self.blocked_until = 0.0
+        self.waiters: list = []
+        self.throttled = 0
+        self.overloaded = 0
+
+
+class TokenBucketScheduler:
+    """Seau à jetons multi-clé, à priorités et à débit adaptatif (thread-safe).
+
+    Args:
+        rate : débit plafond en requêtes/s par clé.
+        burst : taille maximale du seau (rafale tolérée après une pause).
+        min_rate : débit plancher après back-offs successifs.
+        decrease : facteur multiplicatif appliqué au débit sur un 429.
+        increase : incrément additif (req/s) appliqué à chaque succès.
+    """
+
+    def __init__(
+        self,
+        rate: float = 3.0,
+        burst: float = 3.0,
+        min_rate: float = 0.5,
+        decrease: float = 0.5,
+        increase: float = 0.05,
+    ):
+        self.max_rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.decrease = float(decrease)
+        self.increase = float(increase)
+        self._buckets: dict[str, _Bucket] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def _bucket(self, key: str, now: float) -> _Bucket:
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = _Bucket(self.max_rate, now)
+        return b
+
+    def _refill(self, b: _Bucket, now: float) -> None:
+        if now > b.updated:
+            b.tokens = min(self.burst, b.tokens + (now - b.updated) * b.rate)
+            b.updated = now
+
+    def acquire(self, key: str, priority: int = PRIORITY_NORMAL, timeout: float | None = None) -> bool:
+        """Bloque jusqu'à obtenir un jeton pour `key`. Retourne False si `timeout` expire."""
+        key = key or ""
+        ticket = (priority, next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            b = self._bucket(key, time.monotonic())
+            heapq.heappush(b.waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(b, now)
+                    if b.waiters[0] == ticket and now >= b.blocked_until and b.tokens >= 1.0:
+                        b.tokens -= 1.0
+                        return True
+                    if b.waiters[0] != ticket:
+                        wait = None  # réveillé par notify_all quand la tête change
+                    elif now < b.blocked_until:
+                        wait = b.blocked_until - now
+                    else:
+                        wait = (1.0 - b.tokens) / b.rate
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                b.waiters.remove(ticket)
+                heapq.heapify(b.waiters)
+                self._cond.notify_all()
+
+    async def acquire_async(self, key: str, priority: int = PRIORITY_NORMAL, timeout: float | None = None) -> bool:
+        """`acquire()` pour une coroutine : attend sans bloquer la boucle ni un thread.
+
+        Même file de priorité que les appels synchrones. Une coroutine n'est
+        pas réveillée par `notify_all` : elle se ré-examine au plus tous les
+        `_ASYNC_POLL` s (ou à l'échéance exacte du prochain jeton si elle est en
+        tête de file).
+        """
+        key = key or ""
+        ticket = (priority, next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(self._bucket(key, time.monotonic()).waiters, ticket)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    b = self._bucket(key, now)
+                    self._refill(b, now)
+                    if b.waiters[0] == ticket and now >= b.blocked_until and b.tokens >= 1.0:
+                        b.tokens -= 1.0
+                        return True
+                    if b.waiters[0] != ticket:
+                        wait = _ASYNC_POLL
+                    elif now < b.blocked_until:
+                        wait = b.blocked_until - now
+                    else:
+                        wait = (1.0 - b.tokens) / b.rate
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                b = self._buckets[key]
+                b.waiters.remove(ticket)
+                heapq.heapify(b.waiters)
+                self._cond.notify_all()
+
+    def feedback(self, key: str, status: int | None, retry_after=None, attempt: int = 0) -> float:
+        """Informe l'ordonnanceur du résultat d'une requête.
+
+        - succès (< 400) : croissance additive du débit vers le plafond ;
+        - 429 / 5xx : gel du seau (Retry-After ou back-off exponentiel) et
+          décroissance multiplicative du débit.
+
+        Retourne le délai de gel appliqué (0 si aucun) — l'appelant n'a PAS
+        besoin de dormir lui-même : le prochain `acquire` attendra.
+        """
+        key = key or ""
+        with self._cond:
+            now = time.monotonic()
+            b = self._bucket(key, now)
+            if status is not None and status in RETRYABLE_STATUSES:
+                wait = retry_after_seconds(retry_after, attempt)
+                self._refill(b, now)
+                b.blocked_until = max(b.blocked_until, now + wait)
+                b.tokens = 0.0
+                b.updated = max(now, b.blocked_until)
+                b.overloaded += 1
+                if status == 429:
+                    b.rate = max(self.min_rate, b.rate * self.decrease)
+                    b.throttled += 1
+                self._cond.notify_all()
+                return wait
+            if status is not None and status < 400 and b.rate < self.max_rate:
+                b.rate = min(self.max_rate, b.rate + self.increase)
+            return 0.0
+
+    def current_rate(self, key: str) -> float:
+        """Débit courant (req/s) de la clé — diagnostic / affichage."""
+        with self._cond:
+            b = self._buckets.get(key or "")
+            return b.rate if b else self.max_rate
+
+    def throttle_count(self, key: str) -> int:
+        """Nombre cumulé de 429 reçus pour la clé."""
+        with self._cond:
+            b = self._buckets.get(key or "")
+            return b.throttled if b else 0
+
+    def overload_count(self, key: str) -> int:
+        """Nombre cumulé de réponses de surcharge (429 et 5xx) pour la clé."""
+        with self._cond:
+            b = self._buckets.get(key or "")
+            return b.overloaded if b else 0
+
+
+class AdaptiveConcurrency:
+    """Nombre de tâches en vol ajusté en AIMD (à piloter depuis un seul thread).
+
+    Le seau à jetons plafonne le débit ; ce contrôleur règle combien de tâches
+    lancer en parallèle pour l'atteindre sans empiler d'attentes :
+
+      - **croissance additive** : +1 après `limit` tâches saines consécutives
+        (≈ une « fenêtre » complète) ;
+      - **décroissance multiplicative** : ×`decrease` dès que le limiteur a vu
+        de nouveaux 429/5xx — au plus une fois par fenêtre, les tâches déjà en
+        vol ayant subi la même surcharge ;
+      - **latence** : −1 quand une tâche dure plus de `latency_factor` fois la
+        latence de référence — moyenne mobile exponentielle (`smoothing`) des
+        durées observées, et non le minimum absolu, qu'une seule tâche
+        anormalement rapide (ligne ignorée…) fausserait pour tout le reste de
+        l'exécution (les tâches font la queue dans le seau : plus de
+        parallélisme n'y changera rien).
+
+    `record()` retourne la raison du changement (None si la limite ne bouge
+    pas) ; `limit` et `reason` servent à l'affichage.
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 8,
+        decrease: float = 0.5,
+        latency_factor: float = 3.0,
+        smoothing: float = 0.2,
+        limiter: TokenBucketScheduler | None = None,
+        key: str = "",
+    ):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = min(self.maximum, max(self.minimum, int(initial)))
+        self.decrease = float(decrease)
+        self.latency_factor = float(latency_factor)
+        self.smoothing = float(smoothing)
+        self.limiter = limiter
+        self.key = key
+        self.reason = "démarrage"
+        self._overloads_seen = limiter.overload_count(key) if limiter else 0
+        self._baseline: float | None = None
+        self._healthy = 0
+        self._since_decrease = self.limit
+
+    def record(self, latency: float) -> str | None:
+        """Enregistre la fin d'une tâche (durée en s) ; ajuste `limit`."""
+        overloads = 0
+        if self.limiter is not None:
+            total = self.limiter.overload_count(self.key)
+            overloads, self._overloads_seen = total - self._overloads_seen, total
+        self._since_decrease += 1
+
+        previous = self.limit
+        reason = None
+        if overloads:
+            self._healthy = 0
+            if self._since_decrease >= self.limit:
+                reason = f"{overloads} réponse(s) 429/5xx"
+                self._set_limit(int(self.limit * self.decrease))
+        elif self._baseline is not None and latency > self.latency_factor * self._baseline:
+            self._healthy = 0
+            if self._since_decrease >= self.limit:
+                reason = f"latence {latency:.1f}s"
+                self._set_limit(self.limit - 1)
+        else:
+            self._healthy += 1
+            if self._healthy >= self.limit and self.limit < self.maximum:
+                self._healthy = 0
+                self.limit += 1
+                reason = "requêtes saines"
+        if latency > 0:
+            self._baseline = latency if self._baseline is None else (
+                self._baseline + self.smoothing * (latency - self._baseline)
+            )
+
+        if self.limit == previous:
+            return None
+        self.reason = reason
+        return reason
+
+    def _set_limit(self, value: int) -> None:
+        self.limit = max(self.minimum, value)
+        self._since_decrease = 0
+
+
+# Instance unique pour tout le processus : toutes les sessions Streamlit et tous
+# les threads passent par elle. ~3 req/s = budget documenté d'une intégration.
+NOTION_LIMITER = TokenBucketScheduler(rate=3.0, burst=3.0)
+
+# API iNaturalist : ~1 requête/s recommandée (60/min), un seul budget pour tout
+# le processus (les sessions Streamlit partagent l'IP du serveur).
+INAT_LIMITER = TokenBucketScheduler(rate=1.0, burst=5.0)
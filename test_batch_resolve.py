@@ -0,0 +1,250 @@
+"""Tests de `enricher.batch_resolve` (pool de workers, reprise, annulation) —
+sans réseau : lecture de la DB (`_iter_query_db`) et PATCH Notion sont
+remplacés en mémoire.
+
+Lance : `pytest test_batch_resolve.py` OU `python test_batch_resolve.py`.
+"""
+
+import threading
+
+import enricher
+from enricher import batch_resolve, diff_properties, PROP_ESPECE, PROP_STATION
+
+MAPS = {"species_map": {"amanita muscaria": "pid_amanita"}}
+
+
+def _obs(pid, taxon="Amanita muscaria"):
+    title = [{"plain_text": taxon}] if taxon else []
+    return {"id": pid, "properties": {"Nom": {"type": "title", "title": title}}}
+
+
+class _Resp:
+    def __init__(self, status):
+        self.status_code = status
+        self.text = "" if status == 200 else "boom"
+
+
+class _FakeNotion:
+    def __init__(self, pages, fail_ids=()):
+        self.pages, self.fail_ids = pages, set(fail_ids)
+        self.patched = []
+        self._lock = threading.Lock()
+
+    def query(self, token, db_id, **kw):
+        yield list(self.pages)
+
+    def patch(self, token, page_id, properties, priority=None):
+        with self._lock:
+            self.patched.append(page_id)
+        return _Resp(500 if page_id in self.fail_ids else 200)
+
+
+def _run(fake, **kw):
+    orig = enricher._iter_query_db, enricher._notion_patch_with_retry
+    enricher._iter_query_db, enricher._notion_patch_with_retry = fake.query, fake.patch
+    try:
+        return batch_resolve("tok", "db_obs", MAPS, **kw)
+    finally:
+        enricher._iter_query_db, enricher._notion_patch_with_retry = orig
+
+
+def test_toutes_les_pages_traitees_en_parallele():
+    fake = _FakeNotion([_obs(f"p{i}") for i in range(25)] + [_obs("sans_nom", taxon="")])
+    progress = []
+    res = _run(fake, max_workers=4, progress_callback=lambda c, t: progress.append((c, t)))
+    assert res["success"] == 25 and res["skipped"] == 1 and not res["cancelled"]
+    assert sorted(fake.patched) == sorted(f"p{i}" for i in range(25))
+    assert progress[-1] == (26, 26)
+    assert [c for c, _ in progress] == list(range(1, 27))
+
+
+def test_reprise_saute_les_pages_deja_traitees_mais_retente_les_erreurs():
+    pages = [_obs("p1"), _obs("p2"), _obs("p3")]
+    done = set()
+    res = _run(_FakeNotion(pages, fail_ids={"p2"}), done_page_ids=done)
+    assert res["success"] == 2 and len(res["errors"]) == 1
+    assert done == {"p1", "p3"}
+    fake = _FakeNotion(pages)
+    res = _run(fake, done_page_ids=done)
+    assert fake.patched == ["p2"] and res["success"] == 1
+    assert done == {"p1", "p2", "p3"}
+
+
+def test_annulation_arrete_les_soumissions():
+    cancel = threading.Event()
+    fake = _FakeNotion([_obs(f"p{i}") for i in range(100)])
+
+    def _progress(current, total):
+        if current == 5:
+            cancel.set()
+
+    res = _run(fake, max_workers=2, cancel_event=cancel, progress_callback=_progress)
+    assert res["cancelled"] is True
+    # Au plus la fenêtre en vol (2 × workers) au-delà des 5 premières.
+    assert 5 <= len(fake.patched) <= 5 + 4
+
+
+def test_annulation_avant_depart():
+    cancel = threading.Event()
+    cancel.set()
+    fake = _FakeNotion([_obs("p1")])
+    res = _run(fake, cancel_event=cancel)
+    assert res["cancelled"] is True and fake.patched == []
+
+
+# ── PATCH différentiel ───────────────────────────────────────────────────────
+
+def test_diff_properties_relations_comparees_comme_ensembles():
+    props = {PROP_ESPECE: {"relation": [{"id": "aa-bb"}]},
+             PROP_STATION: {"relation": [{"id": "s1"}, {"id": "s2"}]},
+             "Fongarium": {"checkbox": True}}
+    current = {PROP_ESPECE: {"type": "relation", "relation": [{"id": "aabb"}]},
+               PROP_STATION: {"type": "relation", "relation": [{"id": "s2"}]},
+               "Fongarium": {"type": "checkbox", "checkbox": True}}
+    assert diff_properties(props, current) == {PROP_STATION: props[PROP_STATION]}
+    assert diff_properties(props, None) == props
+
+
+def test_page_deja_a_jour_non_patchee():
+    page = _obs("p1")
+    page["properties"][PROP_ESPECE] = {"type": "relation", "relation": [{"id": "pid_amanita"}]}
+    fake = _FakeNotion([page, _obs("p2")])
+    res = _run(fake, filter_unresolved=False)
+    assert fake.patched == ["p2"]
+    assert res["success"] == 1 and res["unchanged"] == 1 and res["skipped"] == 1
+
+
+def test_seules_les_proprietes_modifiees_sont_envoyees():
+    sent = []
+    page = _obs("p1")
+    page["properties"][PROP_ESPECE] = {"type": "relation", "relation": [{"id": "pid_amanita"}]}
+    page["properties"]["Description rapide"] = {"type": "rich_text", "rich_text": [{"plain_text": "#coll"}]}
+    fake = _FakeNotion([page])
+    fake.patch = lambda token, page_id, properties, priority=None: sent.append(properties) or _Resp(200)
+    _run(fake, filter_unresolved=False)
+    assert sent == [{"Fongarium": {"checkbox": True}}]
+
+
+# ── Pipeline résolution → écriture ───────────────────────────────────────────
+
+def _obs_desc(pid, description, taxon="Amanita muscaria"):
+    page = _obs(pid, taxon)
+    page["properties"]["Description rapide"] = {"type": "rich_text", "rich_text": [{"plain_text": description}]}
+    return page
+
+
+def test_resolution_memorisee_par_entree_distincte():
+    calls = {"codes": 0, "species": 0}
+    orig = enricher.parse_description_codes, enricher.resolve_species
+
+    def parse(*a, **kw):
+        calls["codes"] += 1
+        return orig[0](*a, **kw)
+
+    def match(*a, **kw):
+        calls["species"] += 1
+        return orig[1](*a, **kw)
+
+    enricher.parse_description_codes, enricher.resolve_species = parse, match
+    try:
+        pages = [_obs_desc(f"p{i}", "#coll" if i % 2 else "") for i in range(200)]
+        fake = _FakeNotion(pages + [_obs_desc("autre", "#coll", taxon="Russula emetica")])
+        res = _run(fake)
+    finally:
+        enricher.parse_description_codes, enricher.resolve_species = orig
+    assert res["success"] == 201
+    assert calls == {"codes": 2, "species": 2}
+
+
+def test_tout_le_lot_est_resolu_avant_la_premiere_ecriture():
+    planned, order = [], []
+    orig = enricher.plan_relation_update
+
+    def plan(page, *a, **kw):
+        planned.append(page["id"])
+        return orig(page, *a, **kw)
+
+    fake = _FakeNotion([_obs(f"p{i}") for i in range(10)] + [_obs("sans_nom", taxon="")])
+    fake.patch = lambda token, page_id, properties, priority=None: (
+        order.append(len(planned)) or _Resp(200))
+    enricher.plan_relation_update = plan
+    try:
+        res = _run(fake, max_workers=2)
+    finally:
+        enricher.plan_relation_update = orig
+    assert res["success"] == 10 and res["skipped"] == 1
+    assert set(order) == {11}   # chaque PATCH part une fois les 11 pages résolues
+
+
+def test_sans_filtre_chaque_lot_est_ecrit_avant_la_lecture_du_suivant():
+    events = []
+    fake = _FakeNotion([])
+
+    def query(token, db_id, **kw):
+        for b in range(3):
+            events.append(("lu", b))
+            yield [_obs(f"b{b}-{i}") for i in range(4)]
+
+    def patch(token, page_id, properties, priority=None):
+        events.append(("patch", page_id))
+        return _Resp(200)
+
+    fake.query, fake.patch = query, patch
+    progress = []
+    res = _run(fake, filter_unresolved=False, max_workers=2,
+               progress_callback=lambda c, t: progress.append((c, t)))
+    assert res["success"] == 12
+    reads = [i for i, e in enumerate(events) if e[0] == "lu"]
+    for b in range(3):
+        lot = [i for i, e in enumerate(events) if e[0] == "patch" and e[1].startswith(f"b{b}-")]
+        assert len(lot) == 4 and reads[b] < min(lot)
+        if b < 2:
+            assert max(lot) < reads[b + 1]
+    assert progress[3] == (4, 4) and progress[-1] == (12, 12)
+
+
+# ── Requête filtrée côté Notion ──────────────────────────────────────────────
+
+SCHEMA = {
+    "Nom": {"id": "title", "type": "title"},
+    "Description rapide": {"id": "d%3Fx", "type": "rich_text"},
+    "Inat Taxon ID": {"id": "NmF%3F", "type": "number"},
+    PROP_ESPECE: {"id": "esp1", "type": "relation"},
+    "Fongarium": {"id": "fg", "type": "checkbox"},
+    "Photo": {"id": "ph", "type": "files"},
+    "Mycologue": {"id": "my", "type": "select"},
+}
+
+
+def test_non_resolues_filtrees_par_notion_et_proprietes_projetees():
+    calls = []
+    fake = _FakeNotion([_obs("p1")])
+    fake.query = lambda token, db_id, **kw: calls.append(kw) or iter([[_obs("p1")]])
+    _run(fake, db_props_schema=SCHEMA)
+    kw = calls[0]
+    assert kw["body"] == {"filter": {"property": PROP_ESPECE, "relation": {"is_empty": True}}}
+    assert sorted(kw["filter_properties"]) == sorted(["title", "d%3Fx", "NmF%3F", "esp1", "fg"])
+
+
+def test_mode_force_sans_filtre_et_schema_inconnu():
+    calls = []
+    fake = _FakeNotion([])
+    fake.query = lambda token, db_id, **kw: calls.append(kw) or iter([])
+    _run(fake, filter_unresolved=False)
+    assert calls[0]["body"] is None and calls[0]["filter_properties"] is None
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
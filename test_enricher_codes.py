@@ -5,7 +5,11 @@ ont utilisé l'un ou l'autre). Lance : `pytest test_enricher_codes.py` OU
 `python test_enricher_codes.py`.
 """
 
-from enricher import parse_description_codes, lint_description_codes
+import pandas as pd
+
+from enricher import (
+    build_plant_trie, lint_description_codes, lint_descriptions, parse_description_codes, tokenize_description,
+)
 
 # Maps de test minimales (pas d'appel Notion).
 STATIONS = {"FSL01": "pid_station_fsl01"}
@@ -162,6 +166,95 @@ def test_lint_description_non_texte_ne_crashe_pas():
         assert r["at_warnings"] == []
 
 
+# ── Texte libre : noms de plantes (trie) ─────────────────────────────────────
+
+VEG_LATIN = {"betula alleghaniensis": "pid_boj", "acer saccharum": "pid_ers"}
+VEG_FR = {"bouleau jaune": "pid_boj", "bouleau": "pid_bou", "érable à sucre": "pid_ers",
+          "sapin baumier de la côte nord": "pid_sab"}
+VEG_EN = {"yellow birch": "pid_boj", "acer saccharum": "pid_en_ers"}
+
+
+def _parse_veg(desc, trie=None):
+    return parse_description_codes(
+        desc, STATIONS, HABITATS, SUBSTRATS, vegetation_map=VEG_LATIN,
+        vegetation_fr_map=VEG_FR, vegetation_en_map=VEG_EN, plant_trie=trie,
+    )["vegetation_page_ids"]
+
+
+def test_texte_libre_plus_long_nom_gagne():
+    # « bouleau jaune » (2 mots) l'emporte sur « bouleau » (1 mot).
+    assert _parse_veg("Sous un Bouleau jaune, sol humide") == ["pid_boj"]
+
+
+def test_texte_libre_sans_limite_de_mots():
+    # 6 mots : l'ancien scan s'arrêtait à 4.
+    assert _parse_veg("près d'un sapin baumier de la Côte Nord.") == ["pid_sab"]
+
+
+def test_texte_libre_plusieurs_noms_et_ponctuation():
+    assert _parse_veg("Érable à sucre; bouleau. Yellow birch") == ["pid_ers", "pid_bou", "pid_boj"]
+
+
+def test_texte_libre_latin_prioritaire_sur_en():
+    trie = build_plant_trie(VEG_LATIN, VEG_FR, VEG_EN)
+    assert _parse_veg("Acer saccharum", trie) == ["pid_ers"]
+
+
+def test_trie_precompile_equivaut_au_calcul_a_la_volee():
+    trie = build_plant_trie(VEG_LATIN, VEG_FR, VEG_EN)
+    desc = "*FSL01 bouleau jaune et érable à sucre"
+    assert _parse_veg(desc, trie) == _parse_veg(desc) == ["pid_boj", "pid_ers"]
+
+
+# ── Tokenizer partagé parse / lint ───────────────────────────────────────────
+
+
+def test_tokenizer_classe_chaque_token():
+    toks = tokenize_description("*fsl01, #coll ##boj !BOM $bmc. #Acer_saccharum @moi Bouleau! * !")
+    assert [(k, v) for _, k, v in toks] == [
+        ("station", "FSL01"), ("coll", "COLL"), ("hote", "BOJ"), ("habitat", "BOM"),
+        ("substrat", "BMC"), ("plante", "ACER_SACCHARUM"), ("at", "@moi"), ("bare", "Bouleau"),
+    ]
+
+
+def test_tokenizer_star_coll_et_raw_conserve():
+    toks = tokenize_description("*coll.")
+    assert toks == (("*coll.", "coll", "COLL"),)
+
+
+def test_tokenizer_memoise_par_description():
+    tokenize_description.cache_clear()
+    desc = "*FSL01 #coll sous un bouleau"
+    first = tokenize_description(desc)
+    assert tokenize_description(desc) is first
+    _parse(desc)
+    lint_description_codes(desc, LINT_MAPS)
+    info = tokenize_description.cache_info()
+    assert info.misses == 1 and info.hits == 3
+
+
+# ── Lint par colonne (aperçu d'import) ───────────────────────────────────────
+
+def test_lint_descriptions_resume_par_ligne():
+    s = pd.Series(["*FSL01 #coll", "*FSL99 @moi", float("nan"), "texte libre", "*FSL01 #coll"],
+                  index=[10, 11, 12, 13, 14])
+    df = lint_descriptions(s, LINT_MAPS)
+    assert list(df.index) == [10, 11, 12, 13, 14]
+    assert df["n_recognized"].tolist() == [2, 0, 0, 0, 2]
+    assert df["has_issues"].tolist() == [False, True, False, False, False]
+    assert df.at[11, "unrecognized"] == "*FSL99"
+    assert df.at[11, "at_warnings"] == "@moi"
+
+
+def test_lint_descriptions_equivaut_au_lint_ligne_a_ligne():
+    notes = ["!BOM $ZZZ", "##BOJ #ZZZ", "", "@x *coll"]
+    df = lint_descriptions(notes, LINT_MAPS)
+    for i, note in enumerate(notes):
+        r = lint_description_codes(note, LINT_MAPS)
+        assert df.at[i, "n_recognized"] == len(r["recognized"])
+        assert df.at[i, "has_issues"] == r["has_issues"]
+
+
 # ── Runner autonome (sans pytest) ────────────────────────────────────────────
 
 if __name__ == "__main__":
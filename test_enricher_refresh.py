@@ -0,0 +1,204 @@
+"""Tests du rafraîchissement incrémental (`enricher.refresh_lookup_maps`) —
+sans réseau : `_iter_query_db` est remplacé par une fausse BD en mémoire.
+
+Lance : `pytest test_enricher_refresh.py` OU `python test_enricher_refresh.py`.
+"""
+
+import time
+
+import requests
+
+import enricher
+from enricher import refresh_lookup_maps
+
+DB_IDS = {k: f"db_{k}" for k in ("mycoliste", "stations", "habitats", "substrats", "vegetation", "projets")}
+
+
+def _station(pid, code, title):
+    return {"id": pid, "properties": {
+        "Nom": {"type": "title", "title": [{"plain_text": title}]},
+        "Code de la station": {"type": "rich_text", "rich_text": [{"plain_text": code}]},
+    }}
+
+
+def _taxon(pid, name):
+    return {"id": pid, "properties": {"Nom": {"type": "title", "title": [{"plain_text": name}]}}}
+
+
+class _FakeNotion:
+    """`edited[db]` : pages renvoyées par le filtre last_edited_time ;
+    `live[db]` : toutes les pages courantes (liste titre-seul)."""
+    def __init__(self, edited, live):
+        self.edited, self.live, self.calls = edited, live, []
+
+    def __call__(self, token, db_id, filter_properties=None, priority=None, body=None, **kw):
+        self.calls.append((db_id, body))
+        key = db_id[3:]
+        yield self.edited.get(key, []) if body else self.live.get(key, [])
+
+
+def _with_fake(fake, fn):
+    orig = enricher._iter_query_db
+    enricher._iter_query_db = fake
+    try:
+        return fn()
+    finally:
+        enricher._iter_query_db = orig
+
+
+def _base_maps():
+    maps = enricher._empty_maps()
+    maps["station_map"] = {"FSL01": "p1", "FSL02": "p2"}
+    maps["station_names"] = {"FSL01": "Station 1", "FSL02": "Station 2"}
+    maps["species_map"] = {"amanita muscaria": "t1", "boletus edulis": "t2"}
+    maps["_synced_at"] = 1_700_000_000.0
+    maps["_full_swept_at"] = time.time()
+    return maps
+
+
+def test_page_modifiee_remplace_son_ancien_code():
+    live = {"stations": [_station("p1", "FSL01", "Station 1"), _station("p2", "FSL09", "Station 9")]}
+    fake = _FakeNotion({"stations": [_station("p2", "FSL09", "Station 9")]}, live)
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", _base_maps(), DB_IDS))
+    assert maps["station_map"] == {"FSL01": "p1", "FSL09": "p2"}
+    assert maps["station_names"]["FSL09"] == "Station 9"
+    assert maps["_errors"] == []
+    assert maps["_synced_at"] > 1_700_000_000.0
+
+
+def test_page_archivee_retiree_des_petites_bds():
+    fake = _FakeNotion({}, {"stations": [_station("p1", "FSL01", "Station 1")]})
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", _base_maps(), DB_IDS))
+    assert maps["station_map"] == {"FSL01": "p1"}
+
+
+def test_mycoliste_balayee_seulement_en_full_sweep():
+    fake = _FakeNotion({}, {"mycoliste": [_taxon("t1", "Amanita muscaria")], "stations": []})
+    base = _base_maps()
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", base, DB_IDS))
+    assert "boletus edulis" in maps["species_map"]
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", base, DB_IDS, full_sweep=True))
+    assert maps["species_map"] == {"amanita muscaria": "t1"}
+
+
+def test_balayage_complet_periodique():
+    fake = _FakeNotion({}, {"mycoliste": [_taxon("t1", "Amanita muscaria")], "stations": []})
+    base = _base_maps()
+    base["_full_swept_at"] = time.time() - enricher.FULL_SWEEP_INTERVAL - 1
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", base, DB_IDS))
+    assert maps["species_map"] == {"amanita muscaria": "t1"}
+    assert maps["_full_swept_at"] > base["_full_swept_at"]
+    # Balayage récent : le rafraîchissement suivant reste un simple delta.
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", dict(base, **{"_full_swept_at": time.time()}), DB_IDS))
+    assert "boletus edulis" in maps["species_map"]
+
+
+def test_chargement_initial_en_erreur_sans_point_de_reprise():
+    def flaky(token, db_id, body=None, **kw):
+        if db_id == "db_mycoliste" and not flaky.recovered:
+            raise RuntimeError("timeout")
+        yield [_taxon("t1", "Amanita muscaria")] if db_id == "db_mycoliste" else []
+    flaky.recovered = False
+    maps = _with_fake(flaky, lambda: enricher.build_lookup_maps("tok", DB_IDS))
+    assert maps["_errors"] and "_synced_at" not in maps
+    # Rafraîchissement suivant : chargement complet, la Mycoliste est relue.
+    flaky.recovered = True
+    maps = _with_fake(flaky, lambda: refresh_lookup_maps("tok", maps, DB_IDS))
+    assert maps["species_map"] == {"amanita muscaria": "t1"} and maps["_synced_at"]
+
+
+def test_filtre_last_edited_time_avec_recouvrement():
+    fake = _FakeNotion({}, {})
+    _with_fake(fake, lambda: refresh_lookup_maps("tok", _base_maps(), DB_IDS))
+    bodies = [b for _, b in fake.calls if b]
+    assert len(bodies) == len(DB_IDS)
+    since = bodies[0]["filter"]["last_edited_time"]["on_or_after"]
+    # 1_700_000_000 = 2023-11-14T22:13:20Z, moins 2 min de recouvrement.
+    assert since == "2023-11-14T22:11:20.000Z"
+
+
+def test_bd_en_erreur_garde_ses_maps_et_le_point_de_reprise():
+    def boom(token, db_id, body=None, **kw):
+        if db_id == "db_stations":
+            raise RuntimeError("HTTP 503")
+        yield []
+    base = _base_maps()
+    maps = _with_fake(boom, lambda: refresh_lookup_maps("tok", base, DB_IDS))
+    assert maps["station_map"] == base["station_map"]
+    assert maps["_synced_at"] == base["_synced_at"]
+    assert any("Stations" in e for e in maps["_errors"])
+
+
+def test_sans_point_de_reprise_chargement_complet():
+    fake = _FakeNotion({}, {"stations": [_station("p7", "ABC01", "Station 7")]})
+    base = _base_maps()
+    del base["_synced_at"]
+    maps = _with_fake(fake, lambda: refresh_lookup_maps("tok", base, DB_IDS))
+    assert maps["station_map"] == {"ABC01": "p7"}
+    assert all(body is None for _, body in fake.calls)
+
+
+# ── Pagination en flux (`_iter_query_db`) ────────────────────────────────────
+
+class _Resp400:
+    status_code = 400
+
+
+class _FakeClient:
+    """Lève un 400 dès qu'on passe filter_properties ; sinon 3 lots."""
+    def __init__(self):
+        self.calls = []
+
+    def iter_query(self, db_id, body=None, filter_properties=None, **kw):
+        self.calls.append(filter_properties)
+        if filter_properties:
+            raise requests.exceptions.HTTPError("validation_error", response=_Resp400())
+        for i in range(3):
+            yield [{"id": f"p{i}"}]
+
+
+def _with_client(client, fn):
+    orig = enricher.get_client
+    enricher.get_client = lambda token: client
+    try:
+        return fn()
+    finally:
+        enricher.get_client = orig
+
+
+def test_generateur_rend_les_lots_au_fil_de_l_eau():
+    # Générateur paresseux : le client doit rester remplacé pendant la consommation.
+    client = _FakeClient()
+    orig = enricher.get_client
+    enricher.get_client = lambda token: client
+    try:
+        gen = enricher._iter_query_db("tok", "db_x")
+        assert client.calls == []
+        assert next(gen) == [{"id": "p0"}]
+        assert client.calls == [None]
+        assert [b[0]["id"] for b in gen] == ["p1", "p2"]
+    finally:
+        enricher.get_client = orig
+
+
+def test_fallback_sans_filter_properties_sur_400():
+    client = _FakeClient()
+    pages = _with_client(client, lambda: enricher._query_db_all("tok", "db_x", filter_properties=["NmF%3F"]))
+    assert [p["id"] for p in pages] == ["p0", "p1", "p2"]
+    assert client.calls == [["NmF%3F"], None]
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
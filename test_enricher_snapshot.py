@@ -0,0 +1,102 @@
+"""Tests du snapshot disque des maps (`enricher.save_maps_snapshot` /
+`load_maps_snapshot`) — purs, sans réseau.
+
+Lance : `pytest test_enricher_snapshot.py` OU `python test_enricher_snapshot.py`.
+"""
+
+import gzip
+import json
+import os
+import tempfile
+
+import enricher
+from enricher import save_maps_snapshot, load_maps_snapshot
+
+DB_IDS = {"mycoliste": "db_myco", "stations": "db_st"}
+
+MAPS = {
+    "species_map": {"amanita muscaria": "pid_amanita"},
+    "taxon_id_map": {48715: "pid_amanita"},
+    "station_map": {"FSL01": "pid_fsl01"},
+    "station_names": {"FSL01": "Forêt Saint-Laurent 01"},
+    "_errors": [],
+    "_synced_at": 1_700_000_000.0,
+}
+
+
+def _path():
+    return os.path.join(tempfile.mkdtemp(), "sub", "maps.json.gz")
+
+
+def test_aller_retour_conserve_les_maps():
+    path = _path()
+    assert save_maps_snapshot(MAPS, path, DB_IDS) is True
+    maps = load_maps_snapshot(path, DB_IDS)
+    assert maps["species_map"] == MAPS["species_map"]
+    assert maps["station_names"] == MAPS["station_names"]
+    assert maps["_errors"] == []
+    assert maps["_snapshot_saved_at"] > 0
+    assert maps["_synced_at"] == 1_700_000_000.0
+
+
+def test_chaque_chargement_a_sa_version():
+    path = _path()
+    save_maps_snapshot(MAPS, path, DB_IDS)
+    first, second = load_maps_snapshot(path, DB_IDS), load_maps_snapshot(path, DB_IDS)
+    assert first["_version"] != second["_version"]
+    assert "_version" not in json.loads(gzip.open(path, "rt").read())["maps"]
+
+
+def test_taxon_id_map_retrouve_des_cles_entieres():
+    path = _path()
+    save_maps_snapshot(MAPS, path, DB_IDS)
+    assert load_maps_snapshot(path, DB_IDS)["taxon_id_map"] == {48715: "pid_amanita"}
+
+
+def test_fichier_absent_ou_corrompu():
+    path = _path()
+    assert load_maps_snapshot(path, DB_IDS) is None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"pas du gzip")
+    assert load_maps_snapshot(path, DB_IDS) is None
+
+
+def test_autres_db_ids_invalident():
+    path = _path()
+    save_maps_snapshot(MAPS, path, DB_IDS)
+    assert load_maps_snapshot(path, {**DB_IDS, "stations": "autre"}) is None
+
+
+def test_autre_version_invalide():
+    path = _path()
+    save_maps_snapshot(MAPS, path, DB_IDS)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        payload = json.load(f)
+    payload["version"] = enricher.SNAPSHOT_VERSION + 1
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(payload, f)
+    assert load_maps_snapshot(path, DB_IDS) is None
+
+
+def test_build_sans_db_ids_n_ecrit_pas_de_snapshot():
+    # Chargement en erreur (config manquante) → rien sur disque.
+    path = _path()
+    enricher.build_lookup_maps("tok", db_ids={"mycoliste": ""}, snapshot_path=path)
+    assert not os.path.exists(path)
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,116 @@
+"""Tests de la résolution des espèces (`enricher.SpeciesIndex`,
+`resolve_species`, `match_species`) — purs, sans réseau.
+
+Lance : `pytest test_enricher_species.py` OU `python test_enricher_species.py`.
+"""
+
+import os
+import pickle
+import tempfile
+
+import enricher
+from enricher import (
+    SpeciesIndex, match_species, resolve_species,
+    TIER_EXACT, TIER_GENUS_SPECIES, TIER_INFRASPECIFIC, TIER_SYNONYM, TIER_TAXON_ID,
+)
+
+SPECIES = {
+    "amanita muscaria": "pid_amanita",
+    "russula emetica": "pid_russula",
+    "cortinarius caperatus": "pid_cortinarius",
+}
+OLD_NAMES = {
+    "rozites caperatus": "pid_cortinarius",
+    "amanita muscaria": "pid_ancien",  # synonyme identique à un nom actuel : ignoré
+    "boletus edulis var. clavipes": "pid_clavipes",
+}
+
+
+def _maps():
+    return {"species_map": dict(SPECIES), "old_names_map": dict(OLD_NAMES),
+            "taxon_id_map": {48715: "pid_amanita"}}
+
+
+def test_niveaux_de_resolution():
+    maps = _maps()
+    assert resolve_species("Amanita muscaria", maps, 48715) == ("pid_amanita", TIER_TAXON_ID)
+    assert resolve_species("Amanita muscaria", maps) == ("pid_amanita", TIER_EXACT)
+    assert resolve_species("Rozites caperatus", maps) == ("pid_cortinarius", TIER_SYNONYM)
+    assert resolve_species("Amanita muscaria var. guessowii", maps) == ("pid_amanita", TIER_INFRASPECIFIC)
+    assert resolve_species("Russula cf. emetica", maps) == ("pid_russula", TIER_GENUS_SPECIES)
+    assert resolve_species("Lactarius inconnu", maps) == (None, None)
+    assert resolve_species("", maps) == (None, None)
+
+
+def test_index_construit_une_fois_et_memorise():
+    maps = enricher._finalize_maps(_maps())
+    index = maps["_species_index"]
+    assert isinstance(index, SpeciesIndex) and len(index) == 5
+    for _ in range(3):
+        resolve_species("Russula cf. emetica", maps)
+    resolve_species("Amanita muscaria", maps)
+    info = index.resolve.cache_info()
+    assert maps["_species_index"] is index
+    assert info.misses == 2 and info.hits == 2
+
+
+def test_maps_non_finalisees_non_modifiees():
+    maps = _maps()
+    assert resolve_species("Rozites caperatus", maps) == ("pid_cortinarius", TIER_SYNONYM)
+    assert "_species_index" not in maps
+
+
+def test_maps_finalisees_picklables():
+    maps = enricher._finalize_maps(_maps())
+    maps["_species_index"].resolve("Russula cf. emetica")
+    copy = pickle.loads(pickle.dumps(maps))
+    index = copy["_species_index"]
+    assert index.resolve.cache_info().currsize == 0  # cache recréé vide
+    assert index.resolve("Russula cf. emetica") == ("pid_russula", TIER_GENUS_SPECIES)
+    assert len(index) == 5
+
+
+def test_snapshot_recharge_picklable():
+    path = os.path.join(tempfile.mkdtemp(), "maps.json.gz")
+    assert enricher.save_maps_snapshot(_maps(), path)
+    loaded = enricher.load_maps_snapshot(path)
+    copy = pickle.loads(pickle.dumps(loaded))
+    assert resolve_species("Rozites caperatus", copy) == ("pid_cortinarius", TIER_SYNONYM)
+
+
+def test_equivalent_a_match_species():
+    maps = _maps()
+    names = ["Amanita muscaria", "AMANITA  MUSCARIA", "Rozites caperatus", "Rozites caperatus var. x",
+             "Boletus edulis var. clavipes", "Russula aff. emetica", "Russula", "Cortinarius sp.", ""]
+    for name in names:
+        expected = match_species(name, SPECIES, None, None, OLD_NAMES)
+        assert resolve_species(name, maps)[0] == expected, name
+
+
+def test_finalize_maps_pose_l_index():
+    maps = enricher._finalize_maps(_maps())
+    assert maps["_species_index"].resolve("Rozites caperatus") == ("pid_cortinarius", TIER_SYNONYM)
+
+
+def test_niveau_visible_dans_le_journal():
+    maps = _maps()
+    _, log = enricher.compute_relation_properties("Russula cf. emetica", "", maps)
+    assert f"Espèce→Russula cf. emetica ({TIER_GENUS_SPECIES})" in log
+    _, log = enricher.compute_relation_properties("Amanita muscaria", "", maps)
+    assert "Espèce→Amanita muscaria" in log
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
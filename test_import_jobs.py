@@ -0,0 +1,299 @@
+"""Tests de `import_jobs` (file d'imports persistante) — sans réseau : le
+traitement Notion est remplacé par des fonctions factices.
+
+Lance : `pytest test_import_jobs.py` OU `python test_import_jobs.py`.
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import threading
+
+import import_jobs
+import importer
+from import_jobs import ImportQueue
+
+
+def _queue():
+    return ImportQueue(os.path.join(tempfile.mkdtemp(), "jobs.sqlite"))
+
+
+def _payload(taxon):
+    return {"row": {"Taxon": taxon}, "obs": {}}
+
+
+def _ok(followup=None):
+    def process(payload, context):
+        return {"status": import_jobs.STATUS_DONE, "page_id": f"p-{payload['row']['Taxon']}",
+                "url": "https://notion.so/x", "followup": followup}
+    return process
+
+
+def _no_finalize(page_id, props, context):
+    raise AssertionError("aucune mise à jour différée attendue")
+
+
+def test_execution_et_statuts():
+    q = _queue()
+    job = q.submit([(1, _payload("A")), (2, _payload("B"))], {"fmt_db_id": "db"}, owner="u1")
+    seen = []
+
+    def process(payload, context):
+        seen.append((payload["row"]["Taxon"], context["fmt_db_id"]))
+        if payload["row"]["Taxon"] == "B":
+            raise RuntimeError("boum")
+        return {"status": import_jobs.STATUS_DONE, "page_id": "pA", "url": "https://notion.so/a"}
+
+    assert q.run(process, _no_finalize, max_in_flight=1) == 2
+    assert sorted(seen) == [("A", "db"), ("B", "db")]
+    items = {i["inat_id"]: i for i in q.job_items(job)}
+    assert items[1]["status"] == import_jobs.STATUS_DONE and items[1]["url"] == "https://notion.so/a"
+    assert items[2]["status"] == import_jobs.STATUS_ERROR and "boum" in items[2]["message"]
+    assert q.counts(job) == {"done": 1, "error": 1}
+    assert q.latest_job("u1") == job and q.latest_job("u2") is None
+    assert not q.has_work()
+
+
+def test_idempotent_par_observation():
+    q = _queue()
+    job1 = q.submit([(1, _payload("A")), (2, _payload("B"))], {})
+    calls = []
+
+    def process(payload, context):
+        calls.append(payload["row"]["Taxon"])
+        if payload["row"]["Taxon"] == "B" and calls.count("B") == 1:
+            return {"status": import_jobs.STATUS_ERROR, "message": "HTTP 502"}
+        return {"status": import_jobs.STATUS_DONE}
+
+    q.run(process, _no_finalize, max_in_flight=1)
+    # Re-soumission : A (importée) n'est pas retraitée, B (en erreur) l'est.
+    job2 = q.submit([(1, _payload("A")), (2, _payload("B2"))], {})
+    q.run(process, _no_finalize, max_in_flight=1)
+    assert sorted(calls) == ["A", "B", "B2"]
+    # A reste dans son job d'origine ; seule B (reprise) passe dans job2.
+    assert q.counts(job1) == {"done": 1} and q.counts(job2) == {"done": 1}
+
+
+def test_soumission_ne_vole_pas_un_element_en_cours():
+    q = _queue()
+    job1 = q.submit([(1, _payload("A")), (2, _payload("B"))], {}, owner="u1")
+    assert q._claim()["inat_id"] == 1              # A en cours pour u1
+    job2 = q.submit([(1, _payload("A2")), (2, _payload("B2")), (3, _payload("C"))], {}, owner="u2")
+    assert [i["inat_id"] for i in q.job_items(job1)] == [1, 2]
+    assert [i["inat_id"] for i in q.job_items(job2)] == [3]
+    assert q.job_items(job1)[1]["payload"] == _payload("B")
+
+
+def test_mises_a_jour_differees_apres_les_creations():
+    q = _queue()
+    q.submit([(i, _payload(str(i))) for i in range(4)], {"k": "v"})
+    order = []
+    lock = threading.Lock()
+
+    def process(payload, context):
+        with lock:
+            order.append(("create", payload["row"]["Taxon"]))
+        return {"status": import_jobs.STATUS_DONE, "page_id": f"p{payload['row']['Taxon']}",
+                "followup": {"QR": {"files": []}}}
+
+    def finalize(page_id, props, context):
+        assert props == {"QR": {"files": []}} and context == {"k": "v"}
+        with lock:
+            order.append(("qr", page_id))
+
+    q.run(process, finalize, max_in_flight=1)
+    assert [kind for kind, _ in order] == ["create"] * 4 + ["qr"] * 4
+    assert not q.has_work()
+
+
+def test_reprise_apres_arret_brutal():
+    q = _queue()
+    job = q.submit([(1, _payload("A")), (2, _payload("B"))], {})
+    # Simule un arrêt en plein import : un élément pris, un autre créé sans QR.
+    assert q._claim()["inat_id"] == 1
+    q._complete(2, import_jobs.STATUS_CREATED, page_id="pB", followup={"QR": {}})
+
+    reopened = ImportQueue(q.path)
+    assert reopened.has_work()
+    finalized = []
+    reopened.run(_ok(), lambda page_id, props, ctx: finalized.append(page_id), max_in_flight=1)
+    assert finalized == ["pB"]
+    assert reopened.counts(job) == {"done": 2}
+
+
+def test_echec_mise_a_jour_differee_reste_importee():
+    q = _queue()
+    job = q.submit([(1, _payload("A"))], {})
+
+    def finalize(page_id, props, context):
+        raise RuntimeError("HTTP 500")
+
+    q.run(_ok(followup={"QR": {}}), finalize, max_in_flight=1)
+    item = q.job_items(job)[0]
+    assert item["status"] == import_jobs.STATUS_DONE
+    assert "HTTP 500" in item["message"]
+
+
+def test_start_une_seule_execution():
+    q = _queue()
+    q.submit([(1, _payload("A"))], {})
+    gate = threading.Event()
+
+    async def process(payload, context):
+        while not gate.is_set():
+            await asyncio.sleep(0.01)
+        return {"status": import_jobs.STATUS_DONE}
+
+    future = q.start(process, _no_finalize, max_in_flight=1)
+    assert future is not None and q.active
+    assert q.start(process, _no_finalize) is None
+    gate.set()
+    assert future.result(5) == 1
+    assert not q.active and not q.has_work()
+
+
+def test_soumission_pendant_la_fin_du_worker():
+    q = _queue()
+    q.submit([(1, _payload("A"))], {})
+    seen, restarted = [], []
+    claim = q._claim
+
+    async def process(payload, context):
+        seen.append(payload["row"]["Taxon"])
+        return {"status": import_jobs.STATUS_DONE}
+
+    def claim_then_submit(stop_if_idle=False):
+        item = claim(stop_if_idle)
+        if item is None and stop_if_idle and not restarted:
+            # Soumission juste après le dernier `_claim` vide du worker,
+            # avant que son Future ne soit terminé (cf. `ensure_import_worker`).
+            q.submit([(2, _payload("B"))], {})
+            restarted.append(q.start(process, _no_finalize, max_in_flight=1) if not q.active else None)
+        return item
+
+    q._claim = claim_then_submit
+    first = q.start(process, _no_finalize, max_in_flight=1)
+    assert first.result(5) == 1
+    assert restarted and restarted[0] is not None
+    assert restarted[0].result(5) == 1
+    assert seen == ["A", "B"] and not q.has_work() and not q.active
+
+
+def test_sqlite_hors_de_la_boucle():
+    q = _queue()
+    q.submit([(1, _payload("A")), (2, _payload("B"))], {})
+    threads = {"loop": set(), "sqlite": set()}
+    claim, complete = q._claim, q._complete
+
+    def spy(fn):
+        def wrapper(*args):
+            threads["sqlite"].add(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    async def process(payload, context):
+        threads["loop"].add(threading.get_ident())
+        return {"status": import_jobs.STATUS_DONE}
+
+    q._claim, q._complete = spy(claim), spy(complete)
+    assert q.run(process, _no_finalize, max_in_flight=1) == 2
+    assert threads["loop"] and not threads["loop"] & threads["sqlite"]
+
+
+# ── importer : payload ───────────────────────────────────────────────────────
+
+def test_job_payload_serialisable():
+    obs = {
+        "id": 42,
+        "user": {"login": "myco", "name": "ignoré"},
+        "time_observed_at": datetime.datetime(2024, 9, 1, 10, 30),
+        "observed_on": datetime.date(2024, 9, 1),
+        "uri": "https://www.inaturalist.org/observations/42",
+        "photos": [{"id": 7, "url": "https://x/square.jpg", "attribution": "ignoré"}],
+        "taxon": {"id": 99, "name": "Amanita"},
+        "location": (45.5, -73.6),
+    }
+    row = {"Taxon": "Amanita", "ID": 42, "Collection": True, "Identificateur": float("nan")}
+    payload = json.loads(json.dumps(importer.job_payload(row, obs)))
+    assert payload["row"] == {"Taxon": "Amanita", "ID": 42, "Collection": True, "Identificateur": None}
+    assert payload["obs"]["time_observed_at"] == "2024-09-01T10:30:00"
+    assert payload["obs"]["location"] == [45.5, -73.6]
+    assert payload["obs"]["photos"] == [{"id": 7, "url": "https://x/square.jpg"}]
+
+
+class _FakeAsyncNotion:
+    """Client Notion asynchrone factice : enregistre les créations et mises à jour."""
+    def __init__(self):
+        self.created, self.updated, self.in_flight, self.max_in_flight = [], [], 0, 0
+
+    async def create_page(self, db_id, props, children=None, **kw):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        self.created.append(props)
+        n = len(self.created)
+        return {"id": f"page{n}", "url": f"https://www.notion.so/page{n}"}
+
+    async def update_page(self, page_id, props, **kw):
+        self.updated.append((page_id, kw.get("priority")))
+        return {}
+
+
+def test_pipeline_asynchrone_de_bout_en_bout():
+    import obs_index
+
+    idx = obs_index.ObservationIndex(os.path.join(tempfile.mkdtemp(), "idx.sqlite"))
+    orig = obs_index.get_index
+    obs_index.get_index = lambda db_id, directory=None: idx
+    try:
+        q = _queue()
+        schema = {"Code QR (Notion)": {"type": "files"}, "Code QR (Inat)": {"type": "files"}}
+        context = {"current_inat": "me", "real_name_notion": "Moi", "fmt_db_id": "db",
+                   "db_props_schema": schema, "fong_col_name": "No° fongarium",
+                   "current_user_portail_page_id": None}
+        items = []
+        for i in range(1, 7):
+            obs = {"id": i, "user": {"login": "me"}, "observed_on": datetime.date(2024, 9, i),
+                   "uri": f"https://www.inaturalist.org/observations/{i}", "taxon": {"id": i}}
+            items.append((i, importer.job_payload({"Taxon": f"Taxon {i}", "ID": i, "No° Fongarium": ""}, obs)))
+        job = q.submit(items, context)
+        client = _FakeAsyncNotion()
+
+        async def process(payload, ctx):
+            return await importer.process_job_item(payload, ctx, client)
+
+        async def finalize(page_id, props, ctx):
+            await importer.apply_followup(client, page_id, props, ctx)
+
+        assert q.run(process, finalize, max_in_flight=8) == 12
+        assert q.counts(job) == {"done": 6}
+        assert client.max_in_flight > 1  # créations concurrentes sur la boucle
+        assert all("Code QR (Inat)" in props and props["Mycologue"]["select"]["name"] == "Moi"
+                   for props in client.created)
+        assert len(client.updated) == 6 and {prio for _, prio in client.updated} == {2}
+        assert idx.existing(range(1, 7)) == {str(i) for i in range(1, 7)}
+        # Re-soumises : rien n'est recréé.
+        q.submit(items, context)
+        assert q.run(process, finalize) == 0
+        assert len(client.created) == 6
+    finally:
+        obs_index.get_index = orig
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
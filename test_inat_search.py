@@ -0,0 +1,307 @@
+"""Tests de `inat_search` — sans réseau (API iNat simulée).
+
+Lance avec `pytest test_inat_search.py` OU `python test_inat_search.py`.
+"""
+
+import asyncio
+import datetime
+
+import pytest
+import requests
+
+import inat_search
+from aio_engine import IOEngine
+from ratelimit import TokenBucketScheduler
+
+
+# ── Doublures de test ────────────────────────────────────────────────────────
+
+class _FakeResp:
+    def __init__(self, payload, status=200, headers=None):
+        self._payload = payload
+        self.status_code = status
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Client Error: Unprocessable Entity")
+
+
+class _FakeSession:
+    def __init__(self, responses):
+        self._responses = list(responses)
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        self.calls.append((url, dict(params or {})))
+        return self._responses.pop(0)
+
+
+def _fetch(session, users=("1", "2")):
+    return inat_search.fetch_page(
+        {"user_id": list(users), "d1": datetime.date(2024, 9, 1), "taxon_id": None},
+        limiter=TokenBucketScheduler(rate=1000.0, burst=1000.0),
+        engine=IOEngine(io_threads=1), session=session,
+    )
+
+
+class _FakeAPI:
+    """`fetch` factice : `per_date[on]` observations par date, pagination par page."""
+    def __init__(self, per_date, delay=0.02):
+        self.per_date = per_date
+        self.delay = delay
+        self.calls, self.in_flight, self.max_in_flight = [], 0, 0
+
+    async def __call__(self, params):
+        self.calls.append(dict(params))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        n = self.per_date[params.get("on")]
+        start = (params["page"] - 1) * params["per_page"]
+        ids = range(start, min(n, start + params["per_page"]))
+        return {"total_results": n, "results": [{"id": f"{params.get('on')}-{i}"} for i in ids]}
+
+
+# ── Paramètres et normalisation ──────────────────────────────────────────────
+
+def test_api_params():
+    assert inat_search.api_params({
+        "user_id": ["a", 12], "d1": datetime.date(2024, 9, 1), "taxon_id": None,
+        "place_id": "", "verifiable": True, "per_page": 200,
+    }) == {"user_id": "a,12", "d1": "2024-09-01", "verifiable": "true", "per_page": 200}
+
+
+def test_convert_observation():
+    obs = inat_search.convert_observation({
+        "time_observed_at": "2024-09-01T10:30:00-04:00", "observed_on": "2024-09-01",
+        "location": "45.5,-73.6", "created_at": None,
+    })
+    assert obs["time_observed_at"] == datetime.datetime(
+        2024, 9, 1, 10, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=-4)))
+    assert obs["observed_on"] == datetime.datetime(2024, 9, 1)
+    assert obs["location"] == [45.5, -73.6]
+    assert obs["created_at"] is None
+
+
+def test_projection_des_champs():
+    assert inat_search.rison_fields(["id", "taxon.id", "taxon.name", "user.login"]) == (
+        "(id:!t,taxon:(id:!t,name:!t),user:(login:!t))"
+    )
+
+
+def test_observation_compacte_se_lit_comme_un_dict():
+    obs = inat_search.Observation.from_api({
+        "id": 42, "uri": "https://www.inaturalist.org/observations/42",
+        "taxon": {"id": 99, "name": "Amanita", "ancestors": ["ignoré"]},
+        "user": {"login": "myco", "name": "Myco"},
+        "photos": [{"id": 7, "url": "https://x/square.jpg", "attribution": "ignoré"}],
+        "tags": ["coll", {"tag": "FSL01"}], "place_guess": None,
+        "identifications": [{"id": 1}],
+    })
+    assert not hasattr(obs, "__dict__")
+    assert obs["id"] == 42 and "id" in obs and "place_guess" not in obs
+    assert obs.get("taxon", {}).get("name") == "Amanita" and obs.get("taxon")["id"] == 99
+    assert obs.get("place_guess", "Lieu inconnu") == "Lieu inconnu"
+    assert obs.get("identifications") is None and obs.get("user", {}).get("name") == "Myco"
+    assert obs["photos"] == [{"id": 7, "url": "https://x/square.jpg"}]
+    assert obs["tags"] == ["coll", "FSL01"]
+    date_seule = inat_search.Observation.from_api({"id": 2, "observed_on_string": "2024-09-01"})
+    assert date_seule.get("time_observed_at") is None and date_seule["observed_on_string"] == "2024-09-01"
+    assert "observed_on_string" in inat_search.SEARCH_FIELDS  # lu par labels.py (date seule)
+    sans_taxon = inat_search.Observation.from_api({"id": 1, "taxon": None})
+    assert sans_taxon.get("taxon", {}).get("name") is None
+
+
+def test_fetch_page_retry_puis_normalise():
+    session = _FakeSession([
+        _FakeResp({}, status=429, headers={"Retry-After": "0"}),
+        _FakeResp({"total_results": 1, "results": [{"id": 1, "location": "1.0,2.0"}]}),
+    ])
+    data = asyncio.run(_fetch(session))
+    assert data["total_results"] == 1 and data["results"][0]["location"] == [1.0, 2.0]
+    url, params = session.calls[1]
+    assert url == "https://api.inaturalist.org/v2/observations"
+    assert params == {"user_id": "1,2", "d1": "2024-09-01", "fields": inat_search._FIELDS_PARAM}
+    assert isinstance(data["results"][0], inat_search.Observation)
+
+
+def _autocomplete(login, uid=None):
+    return _FakeResp({"results": [{"login": login, "id": uid}] if uid else []})
+
+
+def test_logins_resolus_en_ids_pour_l_api_v2():
+    inat_search._USER_IDS.clear()
+    page = {"total_results": 0, "results": []}
+    session = _FakeSession([_autocomplete("Myco", 11), _FakeResp(page), _FakeResp(page)])
+    asyncio.run(_fetch(session, users=["myco", "2"]))
+    asyncio.run(_fetch(session, users=["MYCO"]))  # login déjà résolu : pas de 2e autocomplete
+    urls = [url for url, _ in session.calls]
+    assert urls[0].endswith("/users/autocomplete") and session.calls[0][1]["q"] == "myco"
+    assert urls[1:] == ["https://api.inaturalist.org/v2/observations"] * 2
+    assert session.calls[1][1] == {"user_id": "11,2", "d1": "2024-09-01", "fields": inat_search._FIELDS_PARAM}
+    assert session.calls[2][1]["user_id"] == "11"
+
+
+def test_login_introuvable():
+    inat_search._USER_IDS.clear()
+    session = _FakeSession([_autocomplete("x"), _FakeResp({"total_results": 0, "results": []})])
+    asyncio.run(_fetch(session, users=["inconnu"]))
+    params = session.calls[1][1]
+    assert "user_id" not in params and params["user_login"] == "inconnu"
+    with pytest.raises(ValueError, match="inconnu"):
+        asyncio.run(_fetch(_FakeSession([_autocomplete("x")]), users=["inconnu", "2"]))
+
+
+def test_fetch_page_422_leve():
+    session = _FakeSession([_FakeResp({"error": "bad"}, status=422)])
+    with pytest.raises(requests.HTTPError, match="422"):
+        asyncio.run(_fetch(session))
+
+
+# ── Recherche ────────────────────────────────────────────────────────────────
+
+def test_recherche_standard_tronquee_a_la_limite():
+    api = _FakeAPI({None: 450})
+    results, total = asyncio.run(inat_search.search_observations({"d1": "x"}, 300, fetch=api))
+    assert total == 450 and len(results) == 300
+    assert [c["page"] for c in api.calls] == [1, 2] and {c["per_page"] for c in api.calls} == {200}
+
+
+def test_multi_dates_en_parallele():
+    dates = ["2024-09-01", "2024-09-02", "2024-09-03"]
+    api = _FakeAPI({"2024-09-01": 250, "2024-09-02": 10, "2024-09-03": 0})
+    params = {"user_id": ["me"], "d1": "a", "d2": "b", "per_page": 200}
+    results, total = asyncio.run(inat_search.search_observations(params, 1000, dates=dates, fetch=api))
+    assert api.max_in_flight == 3                      # les dates partent ensemble
+    assert total == 260 and len(results) == 260        # total = somme des pages 1
+    assert len(api.calls) == 4                         # 3 pages 1 + page 2 du 1er
+    assert all("d1" not in c and "d2" not in c for c in api.calls)
+    assert results[0]["id"] == "2024-09-01-0" and results[-1]["id"] == "2024-09-02-9"
+
+
+def test_multi_dates_limite_partagee():
+    api = _FakeAPI({"d1": 1000, "d2": 1000})
+    results, total = asyncio.run(inat_search.search_observations({}, 300, dates=["d1", "d2"], fetch=api))
+    # Pages 1 des deux dates (pour leur total), puis plus rien : la limite est atteinte.
+    assert total == 2000 and len(results) == 400 and len(api.calls) == 2
+
+
+class _KeysetAPI:
+    """`fetch` factice sur `n` observations d'ids 1..n, avec `order_by=id` + `id_below`."""
+    def __init__(self, n):
+        self.ids = list(range(n, 0, -1))
+        self.calls = []
+
+    async def __call__(self, params):
+        self.calls.append(dict(params))
+        assert "page" not in params and params["order_by"] == "id" and params["order"] == "desc"
+        ids = [i for i in self.ids if i < params.get("id_below", float("inf"))]
+        return {"total_results": len(ids), "results": [{"id": i} for i in ids[:params["per_page"]]]}
+
+
+def test_pagination_par_cle_pour_gros_volume():
+    api = _KeysetAPI(2500)
+    results, total = asyncio.run(inat_search.search_observations({"user_id": "me"}, 10000, fetch=api))
+    assert total == 2500 and [r["id"] for r in results] == list(range(2500, 0, -1))
+    assert len(api.calls) == 13 and "id_below" not in api.calls[0]
+    assert [c["id_below"] for c in api.calls[1:3]] == [2301, 2101]
+
+
+def test_petit_volume_reste_en_pagination_par_page():
+    api = _FakeAPI({None: 50})
+    asyncio.run(inat_search.search_observations({}, inat_search.KEYSET_MIN_LIMIT, fetch=api))
+    assert api.calls[0]["page"] == 1 and "order_by" not in api.calls[0]
+
+
+def test_stream_search_rend_les_lots_au_fil_de_l_eau():
+    api = _FakeAPI({None: 450})
+    streamed = list(inat_search.stream_search({}, 300, fetch=api, engine=IOEngine(io_threads=1)))
+    assert [len(batch) for batch, _ in streamed] == [200, 100]   # dernier lot tronqué
+    assert [total for _, total in streamed] == [450, 450]
+
+
+def test_stream_search_propage_l_erreur():
+    async def boom(params):
+        raise requests.HTTPError("422 Client Error")
+
+    with pytest.raises(requests.HTTPError):
+        list(inat_search.stream_search({}, 10, fetch=boom, engine=IOEngine(io_threads=1)))
+
+
+# ── Cache des recherches ─────────────────────────────────────────────────────
+
+def test_cle_de_cache_normalisee():
+    key = inat_search.SearchCache.key
+    a = key({"user_id": ["b", "a"], "d1": datetime.date(2024, 9, 1), "taxon_id": None, "page": 3}, 200)
+    b = key({"d1": "2024-09-01", "user_id": ["a", "b"], "per_page": 200}, 200)
+    assert a == b
+    assert a != key({"user_id": ["a", "b"], "d1": "2024-09-01"}, 500)
+    # Multi-dates : d1/d2 ne comptent pas, les dates si.
+    assert key({"d1": "x"}, 10, dates=["2024-09-01"]) == key({"d1": "y"}, 10, dates=["2024-09-01"])
+
+
+def test_cache_ttl_et_lru():
+    cache = inat_search.SearchCache(max_entries=2, ttl=60)
+    t0 = datetime.datetime(2024, 9, 1, tzinfo=datetime.timezone.utc)
+    cache.put("a", [{"id": 1}], 1, t0, now=0)
+    cache.put("b", [{"id": 2}], 1, t0, now=0)
+    assert cache.get("a", now=10) is not None      # « a » redevient le plus récent
+    cache.put("c", [{"id": 3}], 1, t0, now=10)     # → « b » est évincé
+    assert cache.get("b", now=10) is None and cache.get("c", now=10) is not None
+    assert cache.get("a", now=61) is None          # expiré
+
+
+def test_recherche_repetee_ne_demande_que_le_delta():
+    cache = inat_search.SearchCache()
+    engine = IOEngine(io_threads=1)
+    calls = []
+
+    async def fetch(params):
+        calls.append(dict(params))
+        if "updated_since" in params:
+            return {"total_results": 2, "results": [{"id": 3, "v": "new"}, {"id": 1, "v": "edited"}]}
+        return {"total_results": 2, "results": [{"id": 2}, {"id": 1}]}
+
+    def run():
+        return list(inat_search.stream_search({"user_id": "me"}, 200, fetch=fetch, engine=engine, cache=cache))
+
+    first = run()
+    assert [[o["id"] for o in batch] for batch, _ in first] == [[2, 1]]
+    (results, total), = run()
+    assert len(calls) == 2 and calls[1]["updated_since"]
+    assert [o["id"] for o in results] == [3, 2, 1] and results[2]["v"] == "edited"
+    assert total == 3
+
+
+def test_fusion_d_une_recherche_tronquee():
+    cache = inat_search.SearchCache()
+    t0 = datetime.datetime(2024, 9, 1, tzinfo=datetime.timezone.utc)
+    cached = [{"id": i} for i in range(300, 100, -1)]     # les 200 plus récentes sur 5000
+    cache.put("k", cached, 5000, t0)
+    entry = cache.get("k")
+    delta = [{"id": 42, "v": "ancienne modifiée"}, {"id": 150, "v": "edited"}, {"id": 301}]
+    results, total = cache.merge("k", entry, delta, t0, limit=200)
+    assert [o["id"] for o in results[:2]] == [301, 300] and total == 5001
+    assert 42 not in {o["id"] for o in results}
+    assert next(o for o in results if o["id"] == 150)["v"] == "edited"
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,190 @@
+"""Tests de `notion_http` — sans réseau (session HTTP simulée).
+
+Lance avec `pytest test_notion_http.py` OU `python test_notion_http.py`.
+"""
+
+import asyncio
+
+import pytest
+
+from aio_engine import IOEngine
+from notion_http import AsyncNotionHTTPClient, NotionHTTPClient, NotionAPIError
+from ratelimit import TokenBucketScheduler
+
+
+# ── Doublures de test (pas d'appel réseau réel) ──────────────────────────────
+
+class _FakeResp:
+    def __init__(self, payload, status=200, headers=None):
+        self._payload = payload
+        self.status_code = status
+        self.headers = headers or {}
+        self.text = str(payload)
+
+    def json(self):
+        return self._payload
+
+
+class _FakeSession:
+    """Rejoue une liste de réponses ; enregistre (méthode, url, json) de chaque appel."""
+    def __init__(self, responses):
+        self._responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, json=None, timeout=None):
+        self.calls.append((method, url, dict(json) if json else None))
+        return self._responses.pop(0)
+
+
+def _client(responses):
+    c = NotionHTTPClient("tok", limiter=TokenBucketScheduler(rate=1000.0, burst=1000.0))
+    c.session = _FakeSession(responses)
+    return c
+
+
+def test_iter_query_suit_les_curseurs():
+    c = _client([
+        _FakeResp({"results": [{"id": "a"}, {"id": "b"}], "has_more": True, "next_cursor": "c1"}),
+        _FakeResp({"results": [{"id": "c"}], "has_more": False, "next_cursor": None}),
+    ])
+    batches = list(c.iter_query("db1", {"filter": {"x": 1}}))
+    assert [p["id"] for b in batches for p in b] == ["a", "b", "c"]
+    assert c.session.calls[1][2]["start_cursor"] == "c1"
+    assert c.session.calls[0][2]["filter"] == {"x": 1}
+
+
+def test_iter_query_respecte_limit():
+    c = _client([
+        _FakeResp({"results": [{"id": str(i)} for i in range(100)], "has_more": True, "next_cursor": "c1"}),
+        _FakeResp({"results": [{"id": "x"}] * 20, "has_more": True, "next_cursor": "c2"}),
+    ])
+    batches = list(c.iter_query("db1", limit=120))
+    assert sum(len(b) for b in batches) == 120
+    assert c.session.calls[1][2]["page_size"] == 20
+    assert len(c.session.calls) == 2
+
+
+def test_filter_properties_non_reencode():
+    c = _client([_FakeResp({"results": [], "has_more": False})])
+    list(c.iter_query("db1", filter_properties=["title", "NmF%3F"]))
+    url = c.session.calls[0][1]
+    assert url.endswith("/databases/db1/query?filter_properties=title&filter_properties=NmF%3F")
+
+
+def test_retry_sur_429_puis_succes():
+    c = _client([
+        _FakeResp({}, status=429, headers={"Retry-After": "0"}),
+        _FakeResp({"id": "page"}, status=200),
+    ])
+    assert c.get_page("page")["id"] == "page"
+    assert len(c.session.calls) == 2
+
+
+def test_erreur_4xx_leve_avec_message_notion():
+    c = _client([_FakeResp({"code": "validation_error", "message": "bad prop"}, status=400)])
+    with pytest.raises(NotionAPIError) as exc:
+        c.update_page("p1", {"X": {}})
+    assert "validation_error" in str(exc.value)
+    assert exc.value.status == 400
+
+
+def test_raise_for_status_false_renvoie_la_reponse():
+    c = _client([_FakeResp({"code": "object_not_found"}, status=404)])
+    resp = c.request("GET", "pages/p1", raise_for_status=False)
+    assert resp.status_code == 404
+
+
+def test_prefetch_lance_la_page_suivante_pendant_le_traitement():
+    import threading
+    second_started = threading.Event()
+
+    class _SignalSession(_FakeSession):
+        def request(self, method, url, json=None, timeout=None):
+            if json and json.get("start_cursor") == "c1":
+                second_started.set()
+            return super().request(method, url, json=json, timeout=timeout)
+
+    c = _client([])
+    c.session = _SignalSession([
+        _FakeResp({"results": [{"id": "a"}], "has_more": True, "next_cursor": "c1"}),
+        _FakeResp({"results": [{"id": "b"}], "has_more": False}),
+    ])
+    it = c.iter_query("db1")
+    assert next(it) == [{"id": "a"}]
+    # Le lot « a » est entre les mains de l'appelant : la page 2 est déjà partie.
+    assert second_started.wait(timeout=2)
+    assert next(it) == [{"id": "b"}]
+    assert list(it) == []
+
+
+def test_sans_prefetch_requete_a_la_demande():
+    c = _client([
+        _FakeResp({"results": [{"id": "a"}], "has_more": True, "next_cursor": "c1"}),
+        _FakeResp({"results": [{"id": "b"}], "has_more": False}),
+    ])
+    it = c.iter_query("db1", prefetch=False)
+    next(it)
+    assert len(c.session.calls) == 1
+    assert next(it) == [{"id": "b"}]
+
+
+# ── Client asynchrone ────────────────────────────────────────────────────────
+
+def _async_client(responses):
+    return AsyncNotionHTTPClient(_client(responses), engine=IOEngine(io_threads=2))
+
+
+def test_async_retry_sur_429_puis_creation():
+    c = _async_client([
+        _FakeResp({}, status=429, headers={"Retry-After": "0"}),
+        _FakeResp({"id": "page"}, status=200),
+    ])
+    page = asyncio.run(c.create_page("db1", {"Titre": {}}))
+    assert page["id"] == "page"
+    method, url, body = c.client.session.calls[1]
+    assert (method, url) == ("POST", "https://api.notion.com/v1/pages")
+    assert body["parent"]["database_id"] == "db1" and "children" not in body
+
+
+def test_async_erreur_4xx_leve():
+    c = _async_client([_FakeResp({"code": "validation_error", "message": "bad"}, status=400)])
+    with pytest.raises(NotionAPIError):
+        asyncio.run(c.update_page("p1", {"X": {}}))
+
+
+def test_async_iter_query_suit_les_curseurs():
+    c = _async_client([
+        _FakeResp({"results": [{"id": "a"}], "has_more": True, "next_cursor": "c1"}),
+        _FakeResp({"results": [{"id": "b"}], "has_more": False}),
+    ])
+
+    async def _collect():
+        return [batch async for batch in c.iter_query("db1", {"filter": {}})]
+
+    assert asyncio.run(_collect()) == [[{"id": "a"}], [{"id": "b"}]]
+    assert c.client.session.calls[1][2]["start_cursor"] == "c1"
+
+
+def test_engine_partage_execute_depuis_un_autre_thread():
+    engine = IOEngine(io_threads=1)
+
+    async def _double(x):
+        return await engine.to_thread(lambda: x * 2)
+
+    assert engine.run(_double(21), timeout=2) == 42
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
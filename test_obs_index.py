@@ -0,0 +1,175 @@
+"""Tests de `obs_index` (index local des IDs iNat importés) — sans réseau :
+le client Notion est remplacé par une fausse BD en mémoire.
+
+Lance : `pytest test_obs_index.py` OU `python test_obs_index.py`.
+"""
+
+import os
+import tempfile
+
+import obs_index
+from obs_index import ObservationIndex, inat_id_from_url
+
+URL_PROP = "URL Inaturalist"
+
+
+def _page(pid, inat_id, mycologue=None):
+    url = f"https://www.inaturalist.org/observations/{inat_id}" if inat_id else None
+    select = {"name": mycologue} if mycologue else None
+    return {"id": pid, "properties": {URL_PROP: {"type": "url", "url": url},
+                                      "Mycologue": {"type": "select", "select": select}}}
+
+
+class _FakeClient:
+    def __init__(self, pages, edited=None):
+        self.pages, self.edited, self.calls = pages, edited or [], []
+
+    def iter_query(self, db_id, body=None, filter_properties=None, **kw):
+        self.calls.append((body, filter_properties))
+        yield list(self.edited if body else self.pages)
+
+
+def _with_client(client, fn):
+    orig = obs_index.get_client
+    obs_index.get_client = lambda token: client
+    try:
+        return fn()
+    finally:
+        obs_index.get_client = orig
+
+
+def _index():
+    return ObservationIndex(os.path.join(tempfile.mkdtemp(), "idx.sqlite"))
+
+
+def test_inat_id_from_url():
+    assert inat_id_from_url("https://www.inaturalist.org/observations/12345") == 12345
+    assert inat_id_from_url("https://inaturalist.ca/observations/987?x=1") == 987
+    assert inat_id_from_url("") is None
+    assert inat_id_from_url("https://example.org/pas-d-id") is None
+    assert inat_id_from_url("https://inaturalist-open-data.s3.amazonaws.com/photos/4567/medium.jpg") is None
+
+
+def test_add_puis_existing_et_persistance():
+    idx = _index()
+    assert not idx.ready
+    idx.add("101", "p1")
+    idx.add(102)
+    assert idx.existing(["101", "102", "103"]) == {"101", "102"}
+    assert ObservationIndex(idx.path).existing([101, 103]) == {"101"}
+
+
+def test_premiere_synchro_est_complete():
+    idx = _index()
+    client = _FakeClient([_page("p1", 1), _page("p2", 2), _page("p3", None)])
+    n = _with_client(client, lambda: idx.sync("tok", "db", URL_PROP, "ab%3Fc", mycologue_property_id="my"))
+    assert n == 3
+    assert idx.ready and len(idx) == 2
+    assert client.calls == [(None, ["ab%3Fc", "my"])]
+
+
+def test_synchro_delta_ajoute_sans_purger():
+    idx = _index()
+    _with_client(_FakeClient([_page("p1", 1)]), lambda: idx.sync("tok", "db", URL_PROP))
+    client = _FakeClient([], edited=[_page("p9", 9)])
+    _with_client(client, lambda: idx.sync("tok", "db", URL_PROP))
+    assert idx.existing(["1", "9"]) == {"1", "9"}
+    body = client.calls[0][0]
+    assert body["filter"]["timestamp"] == "last_edited_time"
+
+
+def test_synchro_delta_retire_l_ancien_id_d_une_url_corrigee():
+    idx = _index()
+    pages = [_page("p2", 2, "Alice"), _page("p3", 3)]
+    _with_client(_FakeClient(pages), lambda: idx.sync("tok", "db", URL_PROP))
+    # p3 corrigée pour pointer vers l'observation 33.
+    _with_client(_FakeClient([], edited=[_page("p3", 33)]), lambda: idx.sync("tok", "db", URL_PROP))
+    assert idx.existing(["2", "3", "33"]) == {"2", "33"}
+    assert ObservationIndex(idx.path).existing(["2", "3", "33"]) == {"2", "33"}
+
+
+def test_synchro_complete_purge_les_pages_supprimees():
+    idx = _index()
+    _with_client(_FakeClient([_page("p1", 1), _page("p2", 2)]), lambda: idx.sync("tok", "db", URL_PROP))
+    _with_client(_FakeClient([_page("p2", 2)]), lambda: idx.sync("tok", "db", URL_PROP, full=True))
+    assert idx.existing(["1", "2"]) == {"2"}
+    assert ObservationIndex(idx.path).existing(["1", "2"]) == {"2"}
+
+
+def test_sync_due():
+    idx = _index()
+    assert idx.sync_due() == "full"
+    _with_client(_FakeClient([]), lambda: idx.sync("tok", "db", URL_PROP))
+    assert idx.sync_due() is None
+    assert idx.sync_due(now=idx.synced_at + obs_index.DELTA_SYNC_INTERVAL + 1) == "delta"
+    assert idx.sync_due(now=idx.synced_at + obs_index.FULL_SYNC_INTERVAL + 1) == "full"
+
+
+def test_comptage_par_mycologue():
+    idx = _index()
+    pages = [_page("p1", 1, "Alice"), _page("p2", 2, "Alice"), _page("p3", None, "Alice"), _page("p4", 4, "Bob")]
+    _with_client(_FakeClient(pages), lambda: idx.sync("tok", "db", URL_PROP))
+    # p3 (sans URL iNat) compte pour Alice mais n'entre pas dans les IDs.
+    assert idx.count_by_mycologue("Alice") == 3
+    assert len(idx) == 3
+    idx.add(5, "p5", mycologue="Bob")
+    assert idx.count_by_mycologue("Bob") == 2
+
+
+def test_cle_provisoire_remplacee_par_la_synchro():
+    idx = _index()
+    _with_client(_FakeClient([]), lambda: idx.sync("tok", "db", URL_PROP))
+    idx.add(7, mycologue="Alice")
+    _with_client(_FakeClient([], edited=[_page("p7", 7, "Alice")]), lambda: idx.sync("tok", "db", URL_PROP))
+    assert idx.count_by_mycologue("Alice") == 1
+
+
+def test_import_puis_synchro_delta_compte_une_fois():
+    idx = _index()
+    _with_client(_FakeClient([]), lambda: idx.sync("tok", "db", URL_PROP))
+    idx.add(7, mycologue="Alice")          # import sans page connue
+    idx.add(7, "p7", mycologue="Alice")    # puis avec la page créée
+    idx.add(7, mycologue="Alice")          # une clé provisoire ne double pas la page
+    assert idx.count_by_mycologue("Alice") == 1
+    _with_client(_FakeClient([], edited=[_page("p7", 7, "Alice")]), lambda: idx.sync("tok", "db", URL_PROP))
+    assert idx.count_by_mycologue("Alice") == 1 and idx.existing(["7"]) == {"7"}
+
+
+def test_cle_provisoire_pendant_la_synchro_complete():
+    idx = _index()
+
+    class _ImportDuringSync(_FakeClient):
+        def iter_query(self, db_id, body=None, filter_properties=None, **kw):
+            idx.add(8, mycologue="Bob")    # import terminé pendant la synchro
+            yield from super().iter_query(db_id, body, filter_properties, **kw)
+
+    _with_client(_ImportDuringSync([_page("p8", 8, "Bob")]), lambda: idx.sync("tok", "db", URL_PROP, full=True))
+    assert idx.count_by_mycologue("Bob") == 1 and idx.existing(["8"]) == {"8"}
+
+
+def test_ancien_format_force_une_resynchro():
+    import sqlite3
+    path = os.path.join(tempfile.mkdtemp(), "idx.sqlite")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE observations (inat_id INTEGER PRIMARY KEY, page_id TEXT, added_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("INSERT INTO observations VALUES (1, 'p1', 0)")
+        conn.execute("INSERT INTO meta VALUES ('full_synced_at', '123')")
+    idx = ObservationIndex(path)
+    assert not idx.ready and len(idx) == 0
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
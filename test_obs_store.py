@@ -0,0 +1,104 @@
+"""Tests de `obs_store` (magasin d'observations de la session) — sans réseau.
+
+Lance : `pytest test_obs_store.py` OU `python test_obs_store.py`.
+"""
+
+import datetime
+
+import importer
+from inat_search import Observation
+from obs_store import OBS_COLUMN, ObservationStore
+
+
+def _obs(i, day, description="", taxon="Amanita"):
+    return Observation.from_api({
+        "id": i, "time_observed_at": datetime.datetime(2024, 9, day, 10),
+        "taxon": {"id": 99, "name": taxon}, "user": {"login": "me"},
+        "place_guess": "Forêt", "location": [45.5, -73.6], "tags": ["coll"],
+        "description": description, "photos": [{"id": 7, "url": "https://x/square.jpg"}],
+    })
+
+
+def _store(dedup_check_failed=False):
+    observations = [_obs(3, 3, "#BOJ"), _obs(2, 2), _obs(1, 1, "*FSL01")]
+    return ObservationStore.from_search(observations, existing_ids={"2"}, dedup_check_failed=dedup_check_failed)
+
+
+def test_lignes_de_l_apercu():
+    store = _store()
+    assert list(store.frame.index) == [3, 2, 1]
+    row = store.frame.loc[3]
+    assert (row["ID"], row["Taxon"], row["Date"], row["GPS"], row["Tags"]) == (
+        "3", "Amanita", "2024-09-03", "45.5, -73.6", "coll")
+    assert row["Lien"] == "https://www.inaturalist.org/observations/3"
+    assert store.frame["Import?"].tolist() == [True, False, True]
+    assert store.frame["Déjà importé"].tolist() == ["🟢 Non", "🔴 Oui", "🟢 Non"]
+    assert OBS_COLUMN not in store.editor_frame(store.view_index()).columns
+
+
+def test_doublons_non_verifies():
+    store = _store(dedup_check_failed=True)
+    assert not store.frame["Import?"].any()
+    assert set(store.frame["Déjà importé"]) == {"⚠️ Non vérifié"}
+
+
+def test_acces_par_id():
+    store = _store()
+    assert store.observation("2")["id"] == 2 and store.observation(2) is store.observation("2")
+    assert store.observation("42") is None and store.observation(None) is None
+    assert [o["id"] for o in store.observations([1, "3", 42])] == [1, 3]
+
+
+def test_filtres_de_la_vue():
+    store = _store()
+    assert store.dates() == ["2024-09-03", "2024-09-02", "2024-09-01"]
+    assert list(store.view_index(dates=["2024-09-01", "2024-09-03"])) == [3, 1]
+    assert list(store.view_index(hide_imported=True)) == [3, 1]
+    assert list(store.view_index(hide_imported=True, limit=1)) == [3]
+
+
+def test_editions_de_la_vue_filtree():
+    store = _store()
+    view = store.view_index(hide_imported=True)        # [3, 1]
+    n = store.apply_edits(view, {"1": {"Collection": True, "No° Fongarium": "MRD0001"}, "9": {"Collection": True}})
+    assert n == 2
+    assert store.frame.at[1, "Collection"] and store.frame.at[1, "No° Fongarium"] == "MRD0001"
+    assert not store.frame.at[3, "Collection"]
+
+
+def test_restaurer_les_descriptions():
+    store = _store()
+    store.set_column(store.frame.index, "Description", "modifié")
+    assert store.restore_descriptions(store.selected_mask()) == 2
+    assert store.frame["Description"].tolist() == ["#BOJ", "modifié", "*FSL01"]
+
+
+def test_payload_d_import_depuis_le_magasin():
+    store = _store()
+    store.set_column([1], "Identificateur", "Moi")
+    items = [(int(i), importer.job_payload(row, row[OBS_COLUMN])) for i, row in store.selected().iterrows()]
+    assert [i for i, _ in items] == [3, 1]
+    payload = items[1][1]
+    assert payload["row"]["Identificateur"] == "Moi" and payload["row"]["Description"] == "*FSL01"
+    assert payload["obs"]["photos"] == [{"id": 7, "url": "https://x/square.jpg"}]
+
+
+def test_magasin_vide():
+    store = ObservationStore()
+    assert store.empty and len(store) == 0 and store.observation(1) is None
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,189 @@
+"""Tests de `ratelimit` — ordonnanceur token-bucket, sans réseau.
+
+Lance avec `pytest test_ratelimit.py` OU `python test_ratelimit.py`.
+"""
+
+import asyncio
+import threading
+import time
+
+from ratelimit import (
+    AdaptiveConcurrency,
+    TokenBucketScheduler,
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+    retry_after_seconds,
+)
+
+
+def test_retry_after_respecte_l_entete():
+    assert retry_after_seconds("2", 0) == 2.0
+    assert retry_after_seconds("0.5", 3) == 0.5
+
+
+def test_retry_after_illisible_repli_exponentiel():
+    w = retry_after_seconds("demain", 2)
+    assert 4.0 <= w < 5.0
+    w = retry_after_seconds(None, 0)
+    assert 1.0 <= w < 2.0
+
+
+def test_rafale_puis_debit_limite():
+    lim = TokenBucketScheduler(rate=20.0, burst=2.0)
+    t0 = time.monotonic()
+    for _ in range(4):
+        lim.acquire("tok")
+    # 1 jeton initial, puis ~3 jetons à 20/s → au moins ~0.1 s.
+    assert time.monotonic() - t0 >= 0.1
+
+
+def test_budgets_independants_par_token():
+    lim = TokenBucketScheduler(rate=1.0, burst=1.0)
+    lim.acquire("a")
+    # Le seau de "b" est plein même si "a" est vide.
+    assert lim.acquire("b", timeout=0.05) is True
+    assert lim.acquire("a", timeout=0.05) is False
+
+
+def test_429_gele_et_ralentit():
+    lim = TokenBucketScheduler(rate=10.0, burst=1.0, min_rate=1.0)
+    wait = lim.feedback("tok", 429, "0.2")
+    assert wait == 0.2
+    assert lim.current_rate("tok") == 5.0
+    assert lim.throttle_count("tok") == 1
+    assert lim.acquire("tok", timeout=0.05) is False  # encore gelé
+
+
+def test_succes_fait_remonter_le_debit():
+    lim = TokenBucketScheduler(rate=4.0, burst=1.0, increase=1.0)
+    lim.feedback("tok", 429, "0")
+    assert lim.current_rate("tok") == 2.0
+    lim.feedback("tok", 200)
+    lim.feedback("tok", 200)
+    lim.feedback("tok", 200)
+    assert lim.current_rate("tok") == 4.0  # plafonné
+
+
+def test_priorite_interactive_servie_avant_bulk():
+    lim = TokenBucketScheduler(rate=10.0, burst=1.0)
+    lim.acquire("tok")  # vide le seau : les suivants doivent attendre
+    order = []
+
+    def _take(name, prio):
+        lim.acquire("tok", priority=prio)
+        order.append(name)
+
+    bulk = threading.Thread(target=_take, args=("bulk", PRIORITY_BULK))
+    bulk.start()
+    time.sleep(0.01)
+    inter = threading.Thread(target=_take, args=("inter", PRIORITY_INTERACTIVE))
+    inter.start()
+    bulk.join(2)
+    inter.join(2)
+    assert order == ["inter", "bulk"]
+
+
+def test_acquire_async_debit_et_timeout():
+    lim = TokenBucketScheduler(rate=20.0, burst=1.0)
+
+    async def _main():
+        t0 = time.monotonic()
+        for _ in range(3):
+            assert await lim.acquire_async("tok")
+        elapsed = time.monotonic() - t0
+        assert await lim.acquire_async("tok", timeout=0.01) is False
+        return elapsed
+
+    # 1 jeton initial, puis 2 jetons à 20/s → au moins ~0.1 s.
+    assert asyncio.run(_main()) >= 0.09
+
+
+def test_acquire_async_partage_la_file_de_priorite():
+    lim = TokenBucketScheduler(rate=10.0, burst=1.0)
+    lim.acquire("tok")
+    order = []
+
+    async def _take(name, prio, delay):
+        await asyncio.sleep(delay)
+        await lim.acquire_async("tok", priority=prio)
+        order.append(name)
+
+    async def _main():
+        await asyncio.gather(_take("bulk", PRIORITY_BULK, 0), _take("inter", PRIORITY_INTERACTIVE, 0.01))
+
+    asyncio.run(_main())
+    assert order == ["inter", "bulk"]
+    assert lim._buckets["tok"].waiters == []
+
+
+def test_surcharge_compte_429_et_5xx():
+    lim = TokenBucketScheduler(rate=10.0)
+    lim.feedback("tok", 429, "0")
+    lim.feedback("tok", 503, "0")
+    lim.feedback("tok", 200)
+    assert lim.throttle_count("tok") == 1
+    assert lim.overload_count("tok") == 2
+
+
+# ── AdaptiveConcurrency ──────────────────────────────────────────────────────
+
+def test_concurrence_croit_si_sain():
+    ctl = AdaptiveConcurrency(initial=2, maximum=4)
+    reasons = [ctl.record(1.0) for _ in range(5)]
+    # +1 après 2 tâches saines (limite 2), puis après 3 (limite 3).
+    assert ctl.limit == 4
+    assert reasons.count("requêtes saines") == 2
+    for _ in range(10):
+        ctl.record(1.0)
+    assert ctl.limit == 4  # plafond
+
+
+def test_concurrence_divisee_sur_429():
+    lim = TokenBucketScheduler(rate=10.0)
+    ctl = AdaptiveConcurrency(initial=6, minimum=1, maximum=8, limiter=lim, key="tok")
+    lim.feedback("tok", 429, "0")
+    assert ctl.record(1.0) == "1 réponse(s) 429/5xx"
+    assert ctl.limit == 3
+    # Nouvelle surcharge dans la même fenêtre : pas de seconde division.
+    lim.feedback("tok", 503, "0")
+    assert ctl.record(1.0) is None
+    assert ctl.limit == 3
+    assert ctl.reason == "1 réponse(s) 429/5xx"
+
+
+def test_concurrence_reduite_si_latence_explose():
+    ctl = AdaptiveConcurrency(initial=1, maximum=8, latency_factor=3.0)
+    for _ in range(3):
+        ctl.record(0.5)
+    assert ctl.limit == 3
+    assert ctl.record(1.2) is None  # < 3 × meilleure latence
+    assert ctl.record(5.0) == "latence 5.0s"
+    assert ctl.limit == 2
+
+
+def test_tache_tres_rapide_ne_fige_pas_la_reference():
+    ctl = AdaptiveConcurrency(initial=2, maximum=32)
+    ctl.record(0.005)   # ex. ligne déjà importée, ignorée sans appel Notion
+    for _ in range(40):
+        ctl.record(1.0)
+    assert ctl.limit > 1
+    ref = AdaptiveConcurrency(initial=2, maximum=32)
+    for _ in range(41):
+        ref.record(1.0)
+    assert ctl.limit == ref.limit
+
+
+# ── Runner autonome (sans pytest) ────────────────────────────────────────────
+
+if __name__ == "__main__":
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_")]
+    failures = 0
+    for t in tests:
+        try:
+            t()
+            print(f"  [OK]   {t.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"  [FAIL] {t.__name__} -- {e!r}")
+    print(f"\n{len(tests) - failures}/{len(tests)} tests OK")
+    raise SystemExit(1 if failures else 0)